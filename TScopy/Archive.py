@@ -0,0 +1,225 @@
+"""
+Tar and zip containers for the copied files.
+
+Instead of rebuilding the source tree under the output directory, with a makedirs
+and a new output file for every file and alternate data stream, every stream is
+streamed straight into one archive. The archive is one large sequential write which
+is what slow USB and SMB targets want. Member names keep the source path and the
+<file>_ADS_<name> naming of the directory output.
+
+With compression a tar file is compressed as a whole, .tar.gz or .tar.zst, and the
+members of a zip file are deflated. Both go through Compress.CompressingWriter. The
+suffix of the compression is added to a tar file name without it.
+"""
+import os
+import time
+import tarfile
+import zipfile
+import threading
+from binascii import crc32
+from Compress import SequentialWriter, CompressingWriter, COMPRESSION_SUFFIX
+
+# Short names of the compressed tar files, kept as they are
+TAR_SUFFIXES = { 'gzip': '.tgz', 'zstd': '.tzst' }
+
+####################################################################################
+# ArchiveEntry: File like object for one member of the archive. The size is declared
+#       up front. See Compress.SequentialWriter for seek() and truncate().
+#       close() pads a short member with zeros so the archive stays valid when a read
+#       failed and hands the archive to the next writer
+####################################################################################
+class ArchiveEntry( SequentialWriter ):
+    def __init__( self, archive, name, size ):
+        self._archive = archive
+        self.name = name
+        self.size = size
+        self.written = 0
+
+    def write( self, buf ):
+        if self.written + len(buf) > self.size:
+            raise Exception( "ARCHIVE", "Member %s is larger than %d bytes" % ( self.name, self.size ))
+        self._archive._write_data( self, buf )
+        self.written += len(buf)
+
+    def close( self ):
+        if self._archive == None:
+            return
+        try:
+            self.truncate( self.size )
+            self._archive._end_entry( self )
+        finally:
+            archive, self._archive = self._archive, None
+            archive._lock.release()
+
+####################################################################################
+# Archive: Base class of the archive writers. Only one member is written at a time,
+#       open_entry() blocks until the member being written by another thread is closed
+#       compression: None, or a method of Compress.CompressingWriter run on pool
+#       open_entry: Returns the ArchiveEntry of a new member of size bytes
+#       add_bytes: Adds a member holding the string data
+#   Subclasses define, called with the lock held by the entry:
+#       _start_entry( entry ): Writes the header of the member
+#       _write_data( entry, buf ): Writes the next data of the member
+#       _end_entry( entry ): Ends the member once its size bytes are written
+#   and close(), which takes the lock and finishes the archive file
+####################################################################################
+class Archive( object ):
+    def __init__( self, filename, compression=None, pool=None ):
+        self.filename = filename
+        self.compression = compression
+        self._pool = pool
+        self._lock = threading.Lock()
+
+    def open_entry( self, name, size ):
+        self._lock.acquire()
+        try:
+            entry = ArchiveEntry( self, name.replace( os.sep, '/' ).lstrip( '/' ), size )
+            self._start_entry( entry )
+        except:
+            self._lock.release()
+            raise
+        return entry
+
+    def add_bytes( self, name, data ):
+        entry = self.open_entry( name, len(data) )
+        try:
+            entry.write( data )
+        finally:
+            entry.close()
+
+    def __repr__( self ):
+        return "%s(%r)" % ( self.__class__.__name__, self.filename )
+
+####################################################################################
+# TarArchive: POSIX pax tar file. Does what TarFile.addfile does with the data written
+#       as it is read instead of pulled from a file object
+####################################################################################
+class TarArchive( Archive ):
+    def __init__( self, filename, compression=None, pool=None ):
+        super(TarArchive, self).__init__( filename, compression, pool )
+        self._fd = None
+        if compression == None:
+            self._tar = tarfile.open( filename, 'w', format=tarfile.PAX_FORMAT )
+        else:
+            self._fd = CompressingWriter( open( filename, 'wb' ), compression, pool )
+            self._tar = tarfile.open( mode='w', fileobj=self._fd, format=tarfile.PAX_FORMAT )
+
+    def _start_entry( self, entry ):
+        tarinfo = tarfile.TarInfo( entry.name )
+        tarinfo.size = entry.size
+        tarinfo.mtime = time.time()
+        tarinfo.mode = 0644
+        buf = tarinfo.tobuf( self._tar.format, self._tar.encoding, self._tar.errors )
+        self._tar.fileobj.write( buf )
+        self._tar.offset += len(buf)
+        self._tar.members.append( tarinfo )
+
+    def _write_data( self, entry, buf ):
+        self._tar.fileobj.write( buf )
+
+    def _end_entry( self, entry ):
+        blocks, remainder = divmod( entry.size, tarfile.BLOCKSIZE )
+        if remainder > 0:
+            self._tar.fileobj.write( tarfile.NUL * (tarfile.BLOCKSIZE - remainder) )
+            blocks += 1
+        self._tar.offset += blocks * tarfile.BLOCKSIZE
+
+    def close( self ):
+        with self._lock:
+            self._tar.close()
+            if not self._fd == None:
+                self._fd.close()
+
+####################################################################################
+# ZipArchive: Zip file with ZIP64 extensions. Does what ZipFile.write does, the local
+#       header is written first and rewritten with the CRC and sizes once the data is in.
+#       With compression the members are ZIP_DEFLATED, zip has no zstd support
+####################################################################################
+class ZipArchive( Archive ):
+    def __init__( self, filename, compression=None, pool=None ):
+        if not compression in ( None, 'gzip' ):
+            raise Exception( "ARCHIVE", "Zip archives can not be compressed with %s" % compression )
+        super(ZipArchive, self).__init__( filename, compression, pool )
+        self._zip = zipfile.ZipFile( filename, 'w', zipfile.ZIP_STORED, allowZip64=True )
+
+    def _start_entry( self, entry ):
+        zinfo = zipfile.ZipInfo( entry.name, time.localtime()[0:6] )
+        zinfo.external_attr = 0644 << 16L
+        zinfo.compress_type = zipfile.ZIP_STORED
+        zinfo.file_size = entry.size
+        zinfo.compress_size = 0
+        zinfo.CRC = 0
+        zinfo.header_offset = self._zip.fp.tell()
+        entry.zinfo = zinfo
+        entry.zip64 = entry.size > zipfile.ZIP64_LIMIT
+        entry.crc = 0
+        entry.data = _MemberData( self._zip.fp )
+        entry.fd_out = entry.data
+        if not self.compression == None:
+            # Compressed size can be larger than uncompressed size
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            entry.zip64 = entry.size * 1.05 > zipfile.ZIP64_LIMIT
+            entry.fd_out = CompressingWriter( entry.data, 'deflate', self._pool )
+        self._zip._didModify = True
+        self._zip.fp.write( zinfo.FileHeader( entry.zip64 ))
+
+    def _write_data( self, entry, buf ):
+        entry.crc = crc32( buf, entry.crc ) & 0xffffffff
+        entry.fd_out.write( buf )
+
+    def _end_entry( self, entry ):
+        entry.fd_out.close()
+        zinfo = entry.zinfo
+        zinfo.CRC = entry.crc
+        zinfo.compress_size = entry.data.size
+        if entry.zip64 == False and zinfo.compress_size > zipfile.ZIP64_LIMIT:
+            raise Exception( "ARCHIVE", "Compressed size of %s larger than uncompressed size" % entry.name )
+        position = self._zip.fp.tell()
+        self._zip.fp.seek( zinfo.header_offset, 0 )
+        self._zip.fp.write( zinfo.FileHeader( entry.zip64 ))
+        self._zip.fp.seek( position, 0 )
+        self._zip.filelist.append( zinfo )
+        self._zip.NameToInfo[zinfo.filename] = zinfo
+
+    def close( self ):
+        with self._lock:
+            self._zip.close()
+
+####################################################################################
+# _MemberData: Counts the bytes of a zip member written to the zip file. close() 
+#       leaves the zip file open
+####################################################################################
+class _MemberData( object ):
+    def __init__( self, fp ):
+        self._fp = fp
+        self.size = 0
+
+    def write( self, buf ):
+        self._fp.write( buf )
+        self.size += len(buf)
+
+    def close( self ):
+        pass
+
+####################################################################################
+# archive_filename: The name the archive filename is written to. A compressed tar file
+#       gets the suffix of the compression, out.tar is written as out.tar.gz
+####################################################################################
+def archive_filename( filename, compression=None ):
+    name = filename.lower()
+    if compression == None or name.endswith( '.zip' ):
+        return filename
+    if name.endswith( COMPRESSION_SUFFIX[compression] ) or name.endswith( TAR_SUFFIXES[compression] ):
+        return filename
+    return filename + COMPRESSION_SUFFIX[compression]
+
+####################################################################################
+# open_archive: Returns the archive writer for filename. Names ending in .zip are
+#       written as zip files, everything else as tar. The file written is the
+#       filename attribute of the writer, see archive_filename
+#       compression, pool: See Archive
+####################################################################################
+def open_archive( filename, compression=None, pool=None ):
+    if filename.lower().endswith( '.zip' ):
+        return ZipArchive( filename, compression, pool )
+    return TarArchive( archive_filename( filename, compression ), compression, pool )
@@ -22,6 +22,7 @@ import sys
 import types
 import struct
 import logging
+import operator
 import cPickle
 from datetime import datetime
 
@@ -385,11 +386,156 @@ def read_dword(buf, offset):
         raise OverrunBufferException(offset, len(buf))
 
 
+# struct format characters of the types a Layout can hold. filetime is
+#  unpacked as a qword and converted by the accessor.
+LAYOUT_FORMATS = {
+    "byte": "B",
+    "int8": "b",
+    "word": "H",
+    "int16": "h",
+    "dword": "I",
+    "int32": "i",
+    "qword": "Q",
+    "int64": "q",
+    "float": "f",
+    "double": "d",
+    "filetime": "Q",
+}
+
+
+class Layout(object):
+    """
+    A fixed run of fields, declared once on the Block subclass and compiled
+    into a single struct.Struct.
+
+    Where `declare_field` builds handler closures on every instance, a Layout
+    is turned into accessor methods on the class when the class is created
+    (see BlockType). `Block.apply_layout` then unpacks every field with one
+    struct call and keeps the tuple in a slot of the instance.
+
+    Fields are (type, name[, offset[, length]]) like the arguments of
+    `declare_field`. Types are the LAYOUT_FORMATS keys or "binary" with a
+    length. Offsets default to the end of the previous field and must not
+    go backwards. Nested blocks and variable length fields stay methods of
+    the class that read the buffer when they are called.
+
+    Layouts whose presence depends on the data, like the resident and
+    non resident parts of an attribute header, are separate Layouts
+    applied as needed. Accessors of a layout that was not applied raise
+    AttributeError, as for a field that was never declared.
+    """
+    def __init__(self, *fields):
+        """
+        Constructor.
+        Arguments:
+        - `fields`: The fields, in increasing offset order.
+        """
+        super(Layout, self).__init__()
+        self.fields = []
+        fmt = "<"
+        start = None
+        position = None
+        for field in fields:
+            type_, name = field[0], field[1]
+            offset = field[2] if len(field) > 2 else None
+            length = field[3] if len(field) > 3 else None
+            if offset is None:
+                offset = position or 0
+            if type_ == "binary":
+                code = "%ds" % length
+            elif type_ in LAYOUT_FORMATS:
+                code = LAYOUT_FORMATS[type_]
+            else:
+                raise ParseException("Type %s can not be part of a layout" % type_)
+            if start is None:
+                start = position = offset
+            if offset < position:
+                raise ParseException("Field %s overlaps the previous field" % name)
+            if offset > position:
+                fmt += "%dx" % (offset - position)
+            fmt += code
+            position = offset + struct.calcsize("<" + code)
+            self.fields.append((type_, name, offset, length))
+        self.start = start or 0
+        self.end = position or 0
+        self.struct = struct.Struct(fmt)
+        # Set by BlockType once the owning class exists
+        self.slot = None
+        self.set_values = None
+
+    def accessors(self, slot):
+        """
+        Returns {name: method} of the accessors of the fields, reading the
+          unpacked values from `slot`.
+        """
+        get_values = operator.attrgetter(slot)
+        ret = {}
+        for index, (type_, name, offset, length) in enumerate(self.fields):
+            ret[name] = _layout_accessor(get_values, index,
+                                         parse_filetime if type_ == "filetime" else None)
+        return ret
+
+    def declared_fields(self):
+        """
+        The fields in the format of `Block._declared_fields`.
+        """
+        return [{"offset": offset, "type": type_, "name": name,
+                 "length": length, "count": 1}
+                for type_, name, offset, length in self.fields]
+
+
+def _layout_accessor(get_values, index, convert):
+    if convert is None:
+        def accessor(self):
+            return get_values(self)[index]
+    else:
+        def accessor(self):
+            return convert(get_values(self)[index])
+    return accessor
+
+
+class BlockType(type):
+    """
+    Metaclass of Block. Every Layout in the body of a class gets a slot,
+    named after the class and the layout, that holds its unpacked values,
+    an accessor method per field and an `_off_<name>` class attribute.
+    Like the handlers of `declare_field`, the accessors take precedence
+    over methods of the same name in the class body.
+    """
+    def __new__(mcs, name, bases, attrs):
+        layouts = sorted((key, value) for key, value in attrs.items()
+                         if isinstance(value, Layout))
+        if len(layouts) == 0:
+            return super(BlockType, mcs).__new__(mcs, name, bases, attrs)
+        slots = list(attrs.get("__slots__", ()))
+        for key, layout in layouts:
+            if layout.slot is not None:
+                raise ParseException("Layout %s is already used by another class" % key)
+            layout.slot = "_%s_%s" % (name.lstrip("_"), key)
+            slots.append(layout.slot)
+            attrs.update(layout.accessors(layout.slot))
+            for type_, field, offset, length in layout.fields:
+                attrs["_off_" + field] = offset
+        attrs["__slots__"] = tuple(slots)
+        cls = super(BlockType, mcs).__new__(mcs, name, bases, attrs)
+        for key, layout in layouts:
+            descriptor = cls.__dict__[layout.slot]
+            layout.set_values = descriptor.__set__
+        cls._block_layouts = tuple(getattr(cls, "_block_layouts", ())) + \
+            tuple(layout for key, layout in layouts)
+        return cls
+
+
 class Block(object):
     """
     Base class for structure blocks in binary parsing.
     A block is associated with a offset into a byte-string.
     """
+    __metaclass__ = BlockType
+    __slots__ = ("_buf", "_offset", "_implicit_offset", "_declared_fields",
+                 "__dict__", "__weakref__")
+    _block_layouts = ()
+
     def __init__(self, buf, offset):
         """
         Constructor.
@@ -407,6 +553,23 @@ class Block(object):
     def __repr__(self):
         return "Block(buf=%r, offset=%r)" % (self._buf, self._offset)
 
+    def apply_layout(self, layout):
+        """
+        Unpacks every field of a Layout of this class in one struct call.
+        The fields declared after it with no offset follow its last field.
+        Arguments:
+        - `layout`: A Layout declared in the body of this class or of one
+            of its bases.
+        Throws:
+        - `OverrunBufferException`
+        """
+        o = self._offset + layout.start
+        try:
+            layout.set_values(self, layout.struct.unpack_from(self._buf, o))
+        except struct.error:
+            raise OverrunBufferException(o, len(self._buf))
+        self._implicit_offset = layout.end
+
     def declare_field(self, type_, name, offset=None, length=None, count=None):
         """
         Declaratively add fields to this block.
@@ -596,7 +759,11 @@ class Block(object):
         @return A nicely formatted string that describes this structure.
         """
         ret = ""
-        for field in self._declared_fields:
+        fields = []
+        for layout in self._block_layouts:
+            if hasattr(self, layout.slot):
+                fields.extend(layout.declared_fields())
+        for field in fields + self._declared_fields:
             v = getattr(self, field["name"])()
             if isinstance(v, Block):
                 if hasattr(v, "string"):
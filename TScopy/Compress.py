@@ -0,0 +1,161 @@
+"""
+Compression stage between the volume reads and the output writer.
+
+The data of a stream is cut into COMPRESS_CHUNK blocks which are compressed on a
+shared thread pool while the next blocks are being read, so the output link is no
+longer the limit when collecting over slow targets. zlib and zstandard release the
+GIL while compressing. The blocks are written back in order:
+    gzip: One gzip member. Every block is a raw deflate stream ended with a sync
+          flush, the last one with a final block, which concatenate to one deflate
+          stream (the pigz layout without the shared dictionary)
+    deflate: The same without the gzip header, for ZIP_DEFLATED zip members
+    zstd: One zstd frame per block. Concatenated frames are a valid .zst file.
+          Needs the zstandard module
+"""
+import zlib
+import struct
+import collections
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Size of the blocks compressed independently on the pool
+COMPRESS_CHUNK = 0x100000
+# Blocks of one stream queued on the pool before the writer waits for the oldest
+COMPRESS_INFLIGHT = 8
+# Largest block of zeros written at once for holes
+ZERO_CHUNK = 0x100000
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+# Output file suffix of every method usable for files
+COMPRESSION_SUFFIX = { 'gzip': '.gz', 'zstd': '.zst' }
+# gzip header: deflate, no flags, no mtime, unknown OS
+GZIP_HEADER = '\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+####################################################################################
+# compression_methods: Methods that can be used on this host
+####################################################################################
+def compression_methods( ):
+    return sorted( [ x for x in COMPRESSION_SUFFIX if not ( x == 'zstd' and zstandard == None ) ] )
+
+####################################################################################
+# compression_pool: Thread pool the blocks are compressed on
+#       workers: Number of threads. None uses one per CPU
+####################################################################################
+def compression_pool( workers=None ):
+    if workers == None or workers < 1:
+        workers = cpu_count()
+    return ThreadPool( workers )
+
+####################################################################################
+# _compress_chunk: Runs on the pool. Compresses one block
+#       last: True for the final block of the stream
+####################################################################################
+def _compress_chunk( method, buf, last ):
+    if method == 'zstd':
+        return zstandard.ZstdCompressor( level=ZSTD_LEVEL ).compress( buf )
+    compressor = zlib.compressobj( ZLIB_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS )
+    if last == True:
+        return compressor.compress( buf ) + compressor.flush( zlib.Z_FINISH )
+    return compressor.compress( buf ) + compressor.flush( zlib.Z_SYNC_FLUSH )
+
+####################################################################################
+# SequentialWriter: Base class of the outputs that can only be written front to back.
+#       tell() is the number of bytes written, seek() only moves forward and fills the
+#       gap with zeros and truncate() pads with zeros. This is how the sparse ranges
+#       of a stream are written
+#       Subclasses define write( buf ), which adds len(buf) to written
+####################################################################################
+class SequentialWriter( object ):
+    written = 0
+
+    def seek( self, offset, whence=0 ):
+        if whence == 0:
+            offset -= self.written
+        elif not whence == 1:
+            raise Exception( "COMPRESS", "%s can not seek from the end" % self.__class__.__name__ )
+        if offset < 0:
+            raise Exception( "COMPRESS", "%s can not seek backwards" % self.__class__.__name__ )
+        self._zeros( offset )
+
+    def tell( self ):
+        return self.written
+
+    def truncate( self, size=None ):
+        if size == None:
+            size = self.written
+        self._zeros( size - self.written )
+
+    def _zeros( self, size ):
+        while size > 0:
+            step = min( size, ZERO_CHUNK )
+            self.write( '\x00' * step )
+            size -= step
+
+####################################################################################
+# CompressingWriter: Compresses everything written to it onto fd_out. Used as the
+#       fd_output of the volume readers. close() writes the blocks still on the pool
+#       and closes fd_out
+#       method: 'gzip', 'deflate' or 'zstd'
+#       pool: See compression_pool
+####################################################################################
+class CompressingWriter( SequentialWriter ):
+    def __init__( self, fd_out, method, pool ):
+        if method == 'zstd' and zstandard == None:
+            raise Exception( "COMPRESS", "zstd compression needs the zstandard module" )
+        self._fd_out = fd_out
+        self._method = method
+        self._pool = pool
+        self._buf = []
+        self._buf_size = 0
+        self._results = collections.deque()
+        self._crc = 0
+        self.written = 0
+        self.name = getattr( fd_out, 'name', None )
+        if method == 'gzip':
+            fd_out.write( GZIP_HEADER )
+
+    def write( self, buf ):
+        if len(buf) == 0:
+            return
+        if self._method == 'gzip':
+            self._crc = zlib.crc32( buf, self._crc )
+        self.written += len(buf)
+        offset = 0
+        if self._buf_size > 0:
+            offset = COMPRESS_CHUNK - self._buf_size
+            self._buf.append( buf[:offset] )
+            self._buf_size += min( offset, len(buf) )
+            if self._buf_size < COMPRESS_CHUNK:
+                return
+            self.__submit( ''.join( self._buf ), False )
+            self._buf = []
+            self._buf_size = 0
+        while len(buf) - offset >= COMPRESS_CHUNK:
+            self.__submit( buf[offset:offset+COMPRESS_CHUNK], False )
+            offset += COMPRESS_CHUNK
+        if offset < len(buf):
+            self._buf.append( buf[offset:] )
+            self._buf_size = len(buf) - offset
+
+    def __submit( self, buf, last ):
+        self._results.append( self._pool.apply_async( _compress_chunk, ( self._method, buf, last )))
+        while len(self._results) > COMPRESS_INFLIGHT:
+            self._fd_out.write( self._results.popleft().get() )
+
+    def close( self ):
+        if self._results == None:
+            return
+        try:
+            self.__submit( ''.join( self._buf ), True )
+            while len(self._results) > 0:
+                self._fd_out.write( self._results.popleft().get() )
+            if self._method == 'gzip':
+                self._fd_out.write( struct.pack( '<II', self._crc & 0xffffffff, self.written & 0xffffffff ))
+        finally:
+            self._results = None
+            self._fd_out.close()
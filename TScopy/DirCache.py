@@ -0,0 +1,62 @@
+"""
+Least recently used cache of parsed directory listings.
+
+Wildcards, recursive copies and lookups of paths sharing a parent all list the same
+directories, and every listing reads and fixes up all the INDX blocks of the
+directory. The listings are kept here keyed by (volume, MFT record number, sequence
+number of the record). A record freed and reused for another directory gets a new
+sequence number, so a stale listing is never returned for it.
+    maxsize: Number of directories kept, the least recently used is dropped first.
+          0 disables the cache
+"""
+import threading
+import collections
+
+####################################################################################
+# DirectoryCache: The cache shared by the callers of __getChildIndex. Thread safe.
+#       The hits and misses are counted by the caller in its PerfStats
+####################################################################################
+class DirectoryCache( object ):
+    def __init__( self, maxsize=1024 ):
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self.maxsize = maxsize
+
+    def __len__( self ):
+        return len(self._entries)
+
+    ####################################################################################
+    # get: The listing cached for key, None if there is none. A hit makes the key the
+    #       most recently used
+    ####################################################################################
+    def get( self, key ):
+        with self._lock:
+            listing = self._entries.pop( key, None )
+            if not listing == None:
+                self._entries[key] = listing
+            return listing
+
+    ####################################################################################
+    # put: Caches the listing of key, dropping the least recently used listings past
+    #       maxsize
+    ####################################################################################
+    def put( self, key, listing ):
+        if self.maxsize < 1:
+            return
+        with self._lock:
+            self._entries.pop( key, None )
+            self._entries[key] = listing
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem( last=False )
+
+    ####################################################################################
+    # drop: Forgets the listings of a volume, once it is closed
+    ####################################################################################
+    def drop( self, volume ):
+        with self._lock:
+            for key in [ key for key in self._entries if key[0] == volume ]:
+                del self._entries[key]
+
+    def clear( self ):
+        with self._lock:
+            self._entries.clear()
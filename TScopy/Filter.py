@@ -0,0 +1,111 @@
+"""
+Selection of the files to copy from their MFT metadata, before any of their data
+is read.
+
+A FileFilter is checked for every file a copy reaches, the single files, the
+wildcard matches and the files of the directories copied. The extension is
+checked on the name found in the directory, the times and the size on the MFT
+record of the file. Only the files matching every condition set are copied:
+    extensions: The file extensions, '.evtx' or 'evtx'
+    modified_after, modified_before: Unix times compared with the modified time of
+          $STANDARD_INFORMATION, the $FILE_NAME one when the record has none
+    min_size, max_size: Bytes compared with the size of the unnamed $DATA stream
+The $FILE_NAME copies held by the directory indexes are not used, Windows only
+updates their times and sizes now and then.
+"""
+import re
+import time
+import calendar
+
+from Timeline import EPOCH_DIFFERENCE, record_times
+import MFTBatch
+
+SIZE_UNITS = { '': 1, 'b': 1, 'k': 1 << 10, 'kb': 1 << 10, 'm': 1 << 20, 'mb': 1 << 20,
+               'g': 1 << 30, 'gb': 1 << 30, 't': 1 << 40, 'tb': 1 << 40 }
+AGE_UNITS = { 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800 }
+SIZE_FORMAT = re.compile( r'^\s*(\d+)\s*([a-z]*)\s*$' )
+AGE_FORMAT = re.compile( r'^\s*(\d+)\s*([smhdw]?)\s*$' )
+
+####################################################################################
+# parse_size: Bytes of a size such as 500MB, 4k or 1024. Units are powers of 1024
+####################################################################################
+def parse_size( text ):
+    match = SIZE_FORMAT.match( text.lower() )
+    if match == None or not match.group(2) in SIZE_UNITS:
+        raise Exception( "FILTER", "Invalid size %s" % text )
+    return int( match.group(1) ) * SIZE_UNITS[ match.group(2) ]
+
+####################################################################################
+# parse_age: Seconds of a duration such as 7d, 12h or 30m. Days without a unit
+####################################################################################
+def parse_age( text ):
+    match = AGE_FORMAT.match( text.lower() )
+    if match == None:
+        raise Exception( "FILTER", "Invalid duration %s" % text )
+    return int( match.group(1) ) * AGE_UNITS[ match.group(2) or 'd' ]
+
+####################################################################################
+# parse_date: Unix time of a YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS UTC date
+####################################################################################
+def parse_date( text ):
+    for fmt in ( '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S' ):
+        try:
+            return calendar.timegm( time.strptime( text.strip(), fmt ))
+        except ValueError:
+            pass
+    raise Exception( "FILTER", "Invalid date %s" % text )
+
+####################################################################################
+# FileFilter: The conditions a file has to match to be copied, None when not checked
+#       match_name: Checks the name of a file found in its directory
+#       needs_record: True if match_record has to be called, a time or size is set
+#       match_record: Checks the MFT record of a file as read from the volume, the
+#           fixups are applied here
+####################################################################################
+class FileFilter( object ):
+    def __init__( self, extensions=None, modified_after=None, modified_before=None, min_size=None, max_size=None ):
+        self.extensions = None
+        if not extensions == None:
+            self.extensions = tuple( '.' + x.strip().lower().lstrip( '.' ) for x in extensions if not x.strip() == '' )
+        self.modified_after = self.__filetime( modified_after )
+        self.modified_before = self.__filetime( modified_before )
+        self.min_size = min_size
+        self.max_size = max_size
+
+    def match_name( self, name ):
+        if self.extensions == None:
+            return True
+        return name.lower().endswith( self.extensions )
+
+    def needs_record( self ):
+        return not ( self.modified_after == None and self.modified_before == None and
+                     self.min_size == None and self.max_size == None )
+
+    def match_record( self, buf, record_size ):
+        batch = MFTBatch.decode_records( buf, 1, record_size, useNumpy=False )
+        if not batch.fixup_ok[0]:
+            return False
+        times = record_times( batch.record( 0 ), batch.attrs_offset[0], batch.bytes_in_use[0] )
+        if not self.min_size == None and times.size < self.min_size:
+            return False
+        if not self.max_size == None and times.size > self.max_size:
+            return False
+        if self.modified_after == None and self.modified_before == None:
+            return True
+        if not times.si_times == None:
+            modified = times.si_times[1]
+        elif len(times.names) > 0:
+            modified = times.names[0][3][1]
+        else:
+            return False
+        if not self.modified_after == None and modified < self.modified_after:
+            return False
+        if not self.modified_before == None and modified > self.modified_before:
+            return False
+        return True
+
+    # FILETIME of a Unix time
+    def __filetime( self, value ):
+        if value == None:
+            return None
+        return int( value * 10000000 ) + EPOCH_DIFFERENCE
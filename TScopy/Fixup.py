@@ -0,0 +1,112 @@
+"""
+Update sequence fixups of MFT records and INDX blocks.
+
+NTFS protects every multi sector structure by writing the update sequence number
+over the last two bytes of each stride of the structure and keeping the bytes it
+replaced in the update sequence array of the header. The stride is the size of the
+structure divided by the number of entries in the array, 512 bytes on every volume
+Windows formats, 4Kn disks included, so the same code handles 1K and 4K MFT
+records and index blocks of any size.
+
+The fixups are written in place into a bytearray or a writable memoryview, of a
+bytearray or of a uint8 NumPy array. Callers copy read only data (mmap views, strings)
+once into a bytearray, a whole $MFT chunk or INDX run at a time, and fix every
+structure in it with apply_fixups_batch.
+"""
+import struct
+
+# Offset of usa_offset and usa_count in the FILE and INDX headers
+USA_HEADER = struct.Struct( '<HH' )
+USA_HEADER_OFFSET = 0x4
+MAGIC = struct.Struct( '<I' )
+
+####################################################################################
+# valid_usa: True if the update sequence array fits in the structure and its strides
+#       tile the structure exactly
+####################################################################################
+def valid_usa( usa_offset, usa_count, size ):
+    if usa_count < 2 or usa_offset % 2 == 1:
+        return False
+    if usa_offset + 2*usa_count > size:
+        return False
+    return size % (usa_count - 1) == 0 and ( size // (usa_count - 1)) % 2 == 0
+
+####################################################################################
+# apply_fixups: Puts the original bytes back at the end of every stride of the size
+#       bytes at offset in raw.
+#       usa_offset, usa_count: Read from the header when None
+#       Returns False if the array is not valid, nothing is changed then, or if a
+#       stride did not end with the update sequence number. Those strides are left
+#       as read, the others are fixed.
+####################################################################################
+def apply_fixups( raw, offset, size, usa_offset=None, usa_count=None ):
+    if offset + size > len(raw):
+        return False
+    if usa_offset == None:
+        usa_offset, usa_count = USA_HEADER.unpack_from( raw, offset + USA_HEADER_OFFSET )
+    if not valid_usa( usa_offset, usa_count, size ):
+        return False
+    stride = size // (usa_count - 1)
+    usa = offset + usa_offset
+    usn = raw[usa:usa+2]
+    ok = True
+    src = usa + 2
+    for end in xrange( offset + stride - 2, offset + size, stride ):
+        if raw[end:end+2] == usn:
+            raw[end:end+2] = raw[src:src+2]
+        else:
+            ok = False
+        src += 2
+    return ok
+
+####################################################################################
+# apply_fixups_batch: Fixes count structures of size bytes laid out back to back
+#       from offset, the records of a $MFT chunk or the blocks of an INDX run.
+#       magic: When set, structures not starting with it are skipped
+#       Returns one boolean per structure, see apply_fixups
+#       When raw is a bytearray and every structure has the same magic and update
+#       sequence array, the usual case, each stride end of all the structures is
+#       checked and fixed with one extended slice instead of one structure at a time
+####################################################################################
+def apply_fixups_batch( raw, count, size, offset=0, magic=None ):
+    if count > 0 and isinstance( raw, bytearray ) and _apply_uniform( raw, count, size, offset, magic ):
+        return [ True ] * count
+    ret = []
+    for i in xrange( count ):
+        start = offset + i*size
+        if not magic == None and not MAGIC.unpack_from( raw, start )[0] == magic:
+            ret.append( False )
+            continue
+        ret.append( apply_fixups( raw, start, size ))
+    return ret
+
+####################################################################################
+# _apply_uniform: The extended slice path of apply_fixups_batch. Returns False without
+#       changing anything when the structures differ or a stride does not end with
+#       the update sequence number
+####################################################################################
+def _apply_uniform( raw, count, size, offset, magic ):
+    stop = offset + count*size
+    if stop > len(raw):
+        return False
+    if not magic == None and not MAGIC.unpack_from( raw, offset )[0] == magic:
+        return False
+    # Magic, usa_offset and usa_count of every structure equal to the first one
+    for n in xrange( 8 ):
+        if not raw[offset+n:stop:size] == raw[offset+n:offset+n+1] * count:
+            return False
+    usa_offset, usa_count = USA_HEADER.unpack_from( raw, offset + USA_HEADER_OFFSET )
+    if not valid_usa( usa_offset, usa_count, size ):
+        return False
+    stride = size // (usa_count - 1)
+    usa = offset + usa_offset
+    ends = xrange( offset + stride - 2, offset + size, stride )
+    for end in ends:
+        if not ( raw[end:stop:size] == raw[usa:stop:size] and raw[end+1:stop:size] == raw[usa+1:stop:size] ):
+            return False
+    src = usa + 2
+    for end in ends:
+        raw[end:stop:size] = raw[src:stop:size]
+        raw[end+1:stop:size] = raw[src+1:stop:size]
+        src += 2
+    return True
@@ -0,0 +1,133 @@
+"""
+Glob patterns matched against the directory tree of a volume in one walk.
+
+Every pattern of a collection is split on the path separator and added to a
+GlobTrie, so patterns sharing their first directories share the trie nodes. The
+walk of the volume keeps the set of trie nodes the current directory matches and
+lists every directory at most once, whatever the number of patterns going through
+it. Directories only reached through plain names are not listed at all, the names
+are looked up.
+    *: Any number of characters of one name
+    ?: One character
+    [abc], [a-z], [!abc]: One character of the class, or not of it
+    **: A whole path component matching zero or more directories. At the end of a
+        pattern it matches every file below the directory
+A '[' without its ']' is a plain character, '[[]' is a literal '['. Names are
+matched without case, the patterns and the names are lower cased by the callers.
+"""
+import re
+import fnmatch
+
+RECURSIVE = '**'
+GLOB_CHARS = re.compile( r'[*?]|\[[^\]]+\]' )
+
+####################################################################################
+# is_glob: True if the name or path has a wildcard
+####################################################################################
+def is_glob( name ):
+    return not GLOB_CHARS.search( name ) == None
+
+####################################################################################
+# GlobNode: One path component of the patterns added to a GlobTrie
+#       literals: {name: GlobNode} of the plain names that can follow
+#       patterns: {wildcard: (compiled wildcard, GlobNode)}
+#       recursive: The GlobNode of a following '**' component, None if there is none
+#       is_recursive: True for the node of a '**' component, it matches any number of
+#           directories so the walk stays in it
+#       tags: The tags of the patterns ending at this node
+####################################################################################
+class GlobNode( object ):
+    __slots__ = ( 'literals', 'patterns', 'recursive', 'is_recursive', 'tags' )
+
+    def __init__( self, is_recursive=False ):
+        self.literals = {}
+        self.patterns = {}
+        self.recursive = None
+        self.is_recursive = is_recursive
+        self.tags = []
+
+    # True if a name below the node can still match
+    def has_children( self ):
+        return len(self.literals) > 0 or len(self.patterns) > 0 or self.is_recursive
+
+####################################################################################
+# GlobTrie: The patterns of a collection, compiled once
+#       add: Adds the components of a pattern. tag is returned with the names it matches
+#       start: The state of the root directory. A state is the frozenset of the nodes
+#           a directory matches
+#       step: The state of the child name of a directory in state
+#       literal_names: The names to look up in a directory in state, None if the
+#           directory has to be listed because a wildcard can match in it
+#       matches: The tags of the patterns matching a name in state. The patterns ending
+#           with '**' only match files
+####################################################################################
+class GlobTrie( object ):
+    def __init__( self ):
+        self.root = GlobNode()
+
+    def add( self, components, tag ):
+        node = self.root
+        for component in components:
+            if component == RECURSIVE:
+                if node.is_recursive == True:
+                    continue
+                if node.recursive == None:
+                    node.recursive = GlobNode( is_recursive=True )
+                node = node.recursive
+            elif is_glob( component ):
+                if not component in node.patterns:
+                    node.patterns[component] = ( re.compile( fnmatch.translate( component )), GlobNode() )
+                node = node.patterns[component][1]
+            else:
+                node = node.literals.setdefault( component, GlobNode() )
+        node.tags.append( tag )
+
+    def start( self ):
+        return self.__closure( [ self.root ] )
+
+    def step( self, state, name ):
+        nodes = []
+        for node in state:
+            child = node.literals.get( name )
+            if not child == None:
+                nodes.append( child )
+            for regex, child in node.patterns.itervalues():
+                if not regex.match( name ) == None:
+                    nodes.append( child )
+            if node.is_recursive == True:
+                nodes.append( node )
+        return self.__closure( nodes )
+
+    def literal_names( self, state ):
+        names = set()
+        for node in state:
+            if len(node.patterns) > 0 or node.is_recursive == True:
+                return None
+            names.update( node.literals )
+        return sorted( names )
+
+    def matches( self, state, is_directory ):
+        tags = []
+        for node in state:
+            if node.is_recursive == True and is_directory == True:
+                continue
+            tags.extend( node.tags )
+        return tags
+
+    def has_children( self, state ):
+        for node in state:
+            if node.has_children():
+                return True
+        return False
+
+    # Adds the '**' nodes, they also match zero directories
+    def __closure( self, nodes ):
+        ret = set()
+        while len(nodes) > 0:
+            node = nodes.pop()
+            if node in ret:
+                continue
+            ret.add( node )
+            if not node.recursive == None:
+                nodes.append( node.recursive )
+        return frozenset( ret )
@@ -0,0 +1,126 @@
+"""
+Inline hashing of the copied streams and the JSON lines manifest.
+
+The data is hashed while it is written to the output file so the evidence does
+not have to be read a second time. Sparse and uninitialized ranges, which are
+left as holes in the output, are hashed as the zeros they read as.
+"""
+import json
+import hashlib
+import threading
+
+HASH_ALGORITHMS = ( 'md5', 'sha1', 'sha256' )
+# Largest block of zeros hashed at once for holes
+ZERO_CHUNK = 0x100000
+# Block size used when a stream has to be hashed from the output file
+READ_CHUNK = 0x100000
+
+####################################################################################
+# StreamHash: MD5, SHA-1 and SHA-256 of one stream, fed in file order.
+#       holes: {file offset: size} of the ranges that are not written. They are hashed
+#              as zeros as soon as the data before them has been hashed
+#       update_at() accepts the data with its file offset. Data that does not start
+#       where the hash is makes the hash out of order, see complete()
+####################################################################################
+class StreamHash( object ):
+    def __init__( self, holes=None ):
+        self._hashes = [ ( name, hashlib.new( name )) for name in HASH_ALGORITHMS ]
+        self._holes = holes or {}
+        self._lock = threading.Lock()
+        self.size = 0
+        self.in_order = True
+        self.__skip_holes()
+
+    def update( self, buf ):
+        for name, h in self._hashes:
+            h.update( buf )
+        self.size += len( buf )
+
+    def zeros( self, size ):
+        while size > 0:
+            step = min( size, ZERO_CHUNK )
+            self.update( '\x00' * step )
+            size -= step
+
+    def update_at( self, offset, buf ):
+        with self._lock:
+            if self.in_order == False:
+                return
+            if not offset == self.size:
+                self.in_order = False
+                return
+            self.update( buf )
+            self.__skip_holes()
+
+    def __skip_holes( self ):
+        while self.size in self._holes:
+            self.zeros( self._holes.pop( self.size ))
+
+    # True if every byte of a stream of size bytes went through the hash in order
+    def complete( self, size ):
+        return self.in_order == True and self.size == size
+
+    def hexdigests( self ):
+        return dict( ( name, h.hexdigest() ) for name, h in self._hashes )
+
+    ####################################################################################
+    # from_file: Hashes an output file. Used for the streams whose data was written out
+    #       of order by the disk order plan. The file was just written so it is read
+    #       back from the file cache, not the evidence
+    ####################################################################################
+    @classmethod
+    def from_file( cls, filename ):
+        ret = cls()
+        with open( filename, 'rb' ) as fd:
+            while True:
+                buf = fd.read( READ_CHUNK )
+                if len(buf) == 0:
+                    break
+                ret.update( buf )
+        return ret
+
+####################################################################################
+# HashingWriter: Output file wrapper that hashes everything written through it. Used
+#       as the fd_output of the volume readers.
+#       offset: File offset of the first write. None appends to the hash in call order,
+#               otherwise the writes go through StreamHash.update_at
+####################################################################################
+class HashingWriter( object ):
+    def __init__( self, fd_out, stream_hash, offset=None ):
+        self._fd_out = fd_out
+        self._hash = stream_hash
+        self._offset = offset
+
+    def write( self, buf ):
+        if self._offset == None:
+            self._hash.update( buf )
+        else:
+            self._hash.update_at( self._offset, buf )
+            self._offset += len( buf )
+        self._fd_out.write( buf )
+
+    def __getattr__( self, name ):
+        return getattr( self._fd_out, name )
+
+####################################################################################
+# Manifest: JSON lines file with one entry per copied stream. Entries are flushed as
+#       they are added so an interrupted run keeps the hashes of what was copied.
+#       Safe to use from the worker threads
+####################################################################################
+class Manifest( object ):
+    def __init__( self, filename ):
+        self.filename = filename
+        self._fd = open( filename, 'a' )
+        self._lock = threading.Lock()
+
+    def add( self, path, record, size, hashes, stream='' ):
+        entry = { 'path': path, 'record': record, 'stream': stream, 'size': size }
+        entry.update( hashes )
+        line = json.dumps( entry, sort_keys=True )
+        with self._lock:
+            self._fd.write( line + '\n' )
+            self._fd.flush()
+
+    def close( self ):
+        with self._lock:
+            self._fd.close()
@@ -0,0 +1,116 @@
+"""
+Directed lookups in the $I30 directory indexes.
+
+The entries of a directory index are kept in a B+-tree sorted by the $FILE_NAME
+collation: the names are compared UTF-16 code unit by code unit after every unit is
+mapped through the $UpCase table of the volume, a shorter name sorting first when
+one is the start of the other. The root node is in the $INDEX_ROOT attribute of the
+directory and the other nodes are the INDX blocks of its $INDEX_ALLOCATION. An entry
+with a child node holds the VCN of the block of the names sorting before it, the
+last (end) entry of a node the VCN of the block of the names sorting after all of
+them. Looking one name up only reads the blocks on the way from the root to the
+node holding it, instead of every block of the directory.
+    UpCase: The $UpCase table of a volume and the collation keys of names
+    node_entries: The entries of one node
+    find_entry: Looks a key up in one node
+"""
+import sys
+import array
+import struct
+
+# mft reference, entry length, key length, flags
+ENTRY_HEADER = struct.Struct( '<QHHH' )
+# entries offset, index length, allocated size. Offsets relative to the node header
+NODE_HEADER = struct.Struct( '<III' )
+VCN = struct.Struct( '<Q' )
+
+INDEX_ENTRY_NODE = 0x1
+INDEX_ENTRY_END = 0x2
+
+# Offset of the node header in the $INDEX_ROOT value and in an INDX block
+ROOT_NODE_OFFSET = 0x10
+INDX_NODE_OFFSET = 0x18
+# Size of the index blocks in the $INDEX_ROOT value
+ROOT_BLOCK_SIZE_OFFSET = 0x8
+# The key of an $I30 entry is a $FILE_NAME value starting at 0x10
+ENTRY_NAME_LENGTH_OFFSET = 0x50
+ENTRY_NAME_OFFSET = 0x52
+
+####################################################################################
+# IndexLookupError: The index is not laid out as expected. The callers fall back to
+#       enumerating the whole directory
+####################################################################################
+class IndexLookupError( Exception ):
+    pass
+
+def _units( raw ):
+    units = array.array( 'H' )
+    units.fromstring( raw )
+    if sys.byteorder == 'big':
+        units.byteswap()
+    return units
+
+####################################################################################
+# UpCase: The $UpCase table, one upper case UTF-16 code unit per code unit
+#       data: The unnamed $DATA stream of $UpCase (MFT record 10). Units past the end
+#       of a short table map to themselves
+####################################################################################
+class UpCase( object ):
+    def __init__( self, data ):
+        data = str( data[:0x20000] )
+        self.table = _units( data[:len(data) & ~1] )
+        if len(self.table) < 0x10000:
+            self.table.extend( xrange( len(self.table), 0x10000 ))
+
+    # Collation key of a unicode name
+    def key( self, name ):
+        return self.key_raw( name.encode( 'utf-16le' ))
+
+    # Collation key of a UTF-16LE name as stored in the index
+    def key_raw( self, raw ):
+        table = self.table
+        return [ table[u] for u in _units( raw ) ]
+
+####################################################################################
+# node_entries: Yields (mft reference, flags, UTF-16LE name, child VCN) for every entry
+#       of the node whose header starts at node in buf. The name is None for the end
+#       entry and the child VCN is None when the entry has no child node
+####################################################################################
+def node_entries( buf, node ):
+    entries_offset, index_length, allocated_size = NODE_HEADER.unpack_from( buf, node )
+    offset = node + entries_offset
+    end = node + index_length
+    if end > len(buf):
+        raise IndexLookupError( "Index node ends past its buffer" )
+    while offset + ENTRY_HEADER.size <= end:
+        reference, length, key_length, flags = ENTRY_HEADER.unpack_from( buf, offset )
+        if length < 0x10 or offset + length > end:
+            raise IndexLookupError( "Bad index entry length 0x%x" % length )
+        child = None
+        if flags & INDEX_ENTRY_NODE:
+            child = VCN.unpack_from( buf, offset + length - 8 )[0]
+        if flags & INDEX_ENTRY_END:
+            yield reference, flags, None, child
+            return
+        name_length = struct.unpack_from( '<B', buf, offset + ENTRY_NAME_LENGTH_OFFSET )[0]
+        name_end = offset + ENTRY_NAME_OFFSET + 2*name_length
+        if name_end > offset + length:
+            raise IndexLookupError( "Index entry name overruns the entry" )
+        yield reference, flags, str( buf[offset + ENTRY_NAME_OFFSET:name_end] ), child
+        offset += length
+    raise IndexLookupError( "Index node without an end entry" )
+
+####################################################################################
+# find_entry: Looks the collation key up in one node. Returns (mft reference, None)
+#       when an entry has the name, (None, child VCN) when the name can only be in
+#       that child node and (None, None) when the name is not in the index
+####################################################################################
+def find_entry( buf, node, key, upcase ):
+    for reference, flags, name, child in node_entries( buf, node ):
+        if not name == None:
+            entry_key = upcase.key_raw( name )
+            if entry_key == key:
+                return reference, None
+            if entry_key < key:
+                continue
+        return None, child
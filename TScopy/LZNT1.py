@@ -0,0 +1,184 @@
+"""
+LZNT1, the compression of NTFS compressed attributes.
+
+A compressed attribute is cut into compression units of 2**compression_unit
+clusters, 16 clusters normally. A unit whose clusters are all allocated is stored
+as is, a unit that is entirely sparse reads as zeros and a unit with fewer
+allocated clusters, followed by a sparse run filling the unit, holds LZNT1 data.
+The LZNT1 data is a list of chunks of up to 4096 bytes of output, each with a two
+byte header:
+    bits 0-11: Size of the chunk, header included, minus 3
+    bits 12-14: Signature, 3
+    bit 15: Set if the chunk is compressed, otherwise it holds 4096 raw bytes
+A chunk giving less than 4096 bytes before the end of the data is followed by
+zeros up to the next 4096 byte boundary, as RtlDecompressBuffer does.
+A compressed chunk is groups of a flag byte followed by 8 tokens. Clear bits are
+literal bytes, set bits a 16 bit back reference whose split between offset and
+length depends on how much of the chunk has been written.
+
+On Windows decompress() uses RtlDecompressBuffer from ntdll. Elsewhere it is done
+in Python, where runs of literals and non overlapping references are copied as
+slices.
+"""
+import os
+import struct
+
+CHUNK_SIZE = 0x1000
+CHUNK_SIGNATURE = 0x3000
+CHUNK_COMPRESSED = 0x8000
+COMPRESSION_FORMAT_LZNT1 = 2
+
+_rtl_decompress = None
+if os.name == "nt":
+    try:
+        import ctypes
+        _rtl_decompress = ctypes.windll.ntdll.RtlDecompressBuffer
+    except:
+        _rtl_decompress = None
+
+####################################################################################
+# _token_split: (length mask, offset shift) of the back references for every number
+#       of bytes already written in the chunk. The offset gets the bits needed to
+#       reach back to the start of the chunk, at least 4, the length the rest
+####################################################################################
+def _token_split( ):
+    ret = [ (0xfff, 12) ]
+    for written in xrange( 1, CHUNK_SIZE + 1 ):
+        length_mask, offset_shift = 0xfff, 12
+        n = written - 1
+        while n >= 0x10:
+            length_mask >>= 1
+            offset_shift -= 1
+            n >>= 1
+        ret.append( (length_mask, offset_shift) )
+    return ret
+TOKEN_SPLIT = _token_split()
+
+####################################################################################
+# decompress: Decompresses one compression unit
+#       buf: The LZNT1 data, the allocated clusters of the unit
+#       size: Size of the unit. The output is padded with zeros to it, chunks past it
+#             are ignored
+####################################################################################
+def decompress( buf, size ):
+    if not _rtl_decompress == None:
+        return _decompress_rtl( buf, size )
+    return _decompress_python( buf, size )
+
+def _decompress_rtl( buf, size ):
+    buf = str( buf )
+    out = ctypes.create_string_buffer( size )
+    final = ctypes.c_ulong( 0 )
+    status = _rtl_decompress( COMPRESSION_FORMAT_LZNT1, out, size, buf, len(buf), ctypes.byref( final ))
+    if not status == 0:
+        raise Exception( "LZNT1", "RtlDecompressBuffer failed 0x%08x" % ( status & 0xffffffff ))
+    return out.raw[:final.value] + '\x00' * ( size - final.value )
+
+def _decompress_python( buf, size ):
+    buf = bytearray( buf )
+    out = bytearray()
+    split = TOKEN_SPLIT
+    pos = 0
+    end = len(buf)
+    while pos + 2 <= end and len(out) < size:
+        header = buf[pos] | buf[pos+1] << 8
+        if header == 0:
+            break
+        chunk_end = min( pos + 3 + (header & 0xfff), end )
+        pos += 2
+        # A chunk decoding to fewer than 4096 bytes is padded with zeros, every chunk
+        #   starts on a 4096 byte boundary of the unit
+        if len(out) % CHUNK_SIZE > 0:
+            out += '\x00' * ( CHUNK_SIZE - len(out) % CHUNK_SIZE )
+        if not header & CHUNK_COMPRESSED:
+            out += buf[pos:chunk_end]
+            pos = chunk_end
+            continue
+        start = len(out)
+        written = 0
+        while pos < chunk_end:
+            flags = buf[pos]
+            pos += 1
+            if flags == 0:
+                literals = buf[pos:min( pos + 8, chunk_end )]
+                out += literals
+                written += len(literals)
+                pos += 8
+                continue
+            for bit in ( 1, 2, 4, 8, 16, 32, 64, 128 ):
+                if pos >= chunk_end:
+                    break
+                if not flags & bit:
+                    out.append( buf[pos] )
+                    pos += 1
+                    written += 1
+                    continue
+                if pos + 2 > chunk_end:
+                    raise Exception( "LZNT1", "Truncated back reference at %d" % pos )
+                token = buf[pos] | buf[pos+1] << 8
+                pos += 2
+                length_mask, offset_shift = split[written]
+                length = (token & length_mask) + 3
+                offset = (token >> offset_shift) + 1
+                if offset > written:
+                    raise Exception( "LZNT1", "Back reference before the start of the chunk at %d" % pos )
+                src = start + written - offset
+                if offset >= length:
+                    out += out[src:src+length]
+                else:
+                    # Overlapping reference, the last offset bytes repeat
+                    out += ( out[src:src+offset] * ( length // offset + 1 ))[:length]
+                written += length
+        pos = chunk_end
+    if len(out) < size:
+        out += '\x00' * ( size - len(out) )
+    return str( out[:size] )
+
+####################################################################################
+# compress: LZNT1 compresses buf. A greedy matcher keeping the last position of every
+#       3 byte prefix, good enough to build test volumes and benchmarks. Chunks that
+#       do not shrink are stored raw
+####################################################################################
+def compress( buf ):
+    buf = bytearray( buf )
+    ret = []
+    for chunk_start in xrange( 0, len(buf), CHUNK_SIZE ):
+        chunk = buf[chunk_start:chunk_start+CHUNK_SIZE]
+        data = _compress_chunk( chunk )
+        if len(data) >= len(chunk):
+            ret.append( struct.pack( '<H', CHUNK_SIGNATURE | ( len(chunk) + 2 - 3 )))
+            ret.append( str( chunk ))
+        else:
+            ret.append( struct.pack( '<H', CHUNK_COMPRESSED | CHUNK_SIGNATURE | ( len(data) + 2 - 3 )))
+            ret.append( data )
+    return ''.join( ret )
+
+def _compress_chunk( chunk ):
+    out = bytearray()
+    last = {}
+    pos = 0
+    while pos < len(chunk):
+        flag_pos = len(out)
+        out.append( 0 )
+        for bit in xrange( 8 ):
+            if pos >= len(chunk):
+                break
+            key = str( chunk[pos:pos+3] )
+            match = last.get( key )
+            last[key] = pos
+            length_mask, offset_shift = TOKEN_SPLIT[pos]
+            if match == None or len(key) < 3 or pos - match > ( 0xffff >> offset_shift ) + 1:
+                out.append( chunk[pos] )
+                pos += 1
+                continue
+            length = 3
+            limit = min( length_mask + 3, len(chunk) - pos )
+            while length < limit and chunk[match+length] == chunk[pos+length]:
+                length += 1
+            token = ( (pos - match - 1) << offset_shift ) | ( length - 3 )
+            out += struct.pack( '<H', token )
+            out[flag_pos] |= 1 << bit
+            for n in xrange( pos + 1, min( pos + length, len(chunk) - 2 )):
+                last[ str( chunk[n:n+3] ) ] = n
+            pos += length
+    return str( out )
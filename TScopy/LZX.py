@@ -0,0 +1,246 @@
+"""
+LZX as used by WIM files and the WOF LZX format, 32K chunks compressed on their own.
+
+A chunk is a bitstream of 16 bit little endian words read most significant bit
+first, cut into blocks. Each block starts with a 3 bit type and its size, a set bit
+for 32768 bytes or 16 bits holding it:
+    verbatim: Code lengths of the main and length Huffman codes, each coded as the
+          difference to the lengths of the previous block with a 20 symbol precode,
+          then the main symbols. A main symbol below 256 is a literal, above it holds
+          the offset slot and the match length, the length code extending lengths
+          of 9 and more
+    aligned: The same with an 8 symbol code for the low 3 bits of large offsets
+    uncompressed: Padding to the next word, the three recent offsets and raw bytes
+Offset slots 0 to 2 reuse the three most recent offsets. The last step undoes the
+E8 translation of the x86 CALL targets done by the compressor.
+
+The bit reader follows the buffering of wimlib, the alignment before an uncompressed
+block drops every bit already buffered.
+"""
+import struct
+from XPRESS import decode_table
+
+WINDOW_SIZE = 0x8000
+NUM_CHARS = 256
+NUM_OFFSET_SLOTS = 30
+NUM_MAIN_SYMBOLS = NUM_CHARS + 8 * NUM_OFFSET_SLOTS
+NUM_LEN_SYMBOLS = 249
+NUM_ALIGNED_SYMBOLS = 8
+NUM_PRECODE_SYMBOLS = 20
+NUM_PRIMARY_LENS = 7
+NUM_RECENT_OFFSETS = 3
+MIN_MATCH_LEN = 2
+DEFAULT_BLOCK_SIZE = 0x8000
+MAX_MAIN_CODEWORD_LEN = 16
+MAX_LEN_CODEWORD_LEN = 16
+MAX_PRE_CODEWORD_LEN = 15
+MAX_ALIGNED_CODEWORD_LEN = 7
+BLOCKTYPE_VERBATIM = 1
+BLOCKTYPE_ALIGNED = 2
+BLOCKTYPE_UNCOMPRESSED = 3
+# File size the WIM compressor uses for the E8 translation
+E8_FILE_SIZE = 12000000
+
+####################################################################################
+# _offset_slots: (base, extra bits) of every offset slot. The base is of the formatted
+#       offset, the match offset plus 2
+####################################################################################
+def _offset_slots( ):
+    base = []
+    extra = []
+    pos = 0
+    for slot in xrange( NUM_OFFSET_SLOTS ):
+        bits = 0 if slot < 4 else min( ( slot - 2 ) // 2, 17 )
+        base.append( pos )
+        extra.append( bits )
+        pos += 1 << bits
+    return base, extra
+OFFSET_SLOT_BASE, OFFSET_SLOT_EXTRA = _offset_slots()
+
+####################################################################################
+# _BitReader: The bitstream of a chunk. Reads past the end see zeros
+####################################################################################
+class _BitReader( object ):
+    def __init__( self, buf ):
+        self.buf = bytearray( buf )
+        self.pos = 0
+        self.bitbuf = 0
+        self.bitsleft = 0
+
+    def ensure( self, count ):
+        if self.bitsleft >= count:
+            return
+        word = 0
+        if self.pos + 2 <= len(self.buf):
+            word = self.buf[self.pos] | self.buf[self.pos+1] << 8
+            self.pos += 2
+        self.bitbuf = self.bitbuf << 16 | word
+        self.bitsleft += 16
+
+    def bits( self, count ):
+        if count == 0:
+            return 0
+        self.ensure( count )
+        self.bitsleft -= count
+        value = self.bitbuf >> self.bitsleft
+        self.bitbuf &= ( 1 << self.bitsleft ) - 1
+        return value
+
+    ####################################################################################
+    # symbol: Decodes the next symbol of a code built by _code
+    ####################################################################################
+    def symbol( self, code ):
+        table_bits, table, max_length = code
+        self.ensure( max_length )
+        entry = table[ self.bitbuf >> ( self.bitsleft - table_bits ) ]
+        if entry == None:
+            raise Exception( "LZX", "Invalid Huffman code at %d" % self.pos )
+        self.bitsleft -= entry & 0x1f
+        self.bitbuf &= ( 1 << self.bitsleft ) - 1
+        return entry >> 5
+
+    def align( self ):
+        self.ensure( 1 )
+        self.bitsleft = 0
+        self.bitbuf = 0
+
+    def u32( self ):
+        if self.pos + 4 > len(self.buf):
+            raise Exception( "LZX", "Truncated uncompressed block header" )
+        value = struct.unpack_from( '<I', self.buf, self.pos )[0]
+        self.pos += 4
+        return value
+
+    def raw( self, size ):
+        if self.pos + size > len(self.buf):
+            raise Exception( "LZX", "Truncated uncompressed block" )
+        ret = self.buf[self.pos:self.pos+size]
+        self.pos += size
+        return ret
+
+def _code( lengths, max_length ):
+    table_bits, table = decode_table( lengths, max_length )
+    return table_bits, table, max_length
+
+####################################################################################
+# _read_lengths: Reads the code lengths lengths[start:end] with a new precode. The
+#       lengths of the previous block are updated in place
+####################################################################################
+def _read_lengths( bits, lengths, start, end ):
+    precode = _code( [ bits.bits( 4 ) for n in xrange( NUM_PRECODE_SYMBOLS ) ], MAX_PRE_CODEWORD_LEN )
+    pos = start
+    while pos < end:
+        presym = bits.symbol( precode )
+        if presym < 17:
+            lengths[pos] = ( lengths[pos] - presym ) % 17
+            pos += 1
+            continue
+        if presym == 17:
+            run = 4 + bits.bits( 4 )
+            value = 0
+        elif presym == 18:
+            run = 20 + bits.bits( 5 )
+            value = 0
+        else:
+            run = 4 + bits.bits( 1 )
+            presym = bits.symbol( precode )
+            if presym > 16:
+                raise Exception( "LZX", "Invalid precode run at %d" % bits.pos )
+            value = ( lengths[pos] - presym ) % 17
+        for n in xrange( pos, min( pos + run, end )):
+            lengths[n] = value
+        pos += run
+
+####################################################################################
+# decompress: Decompresses one WOF chunk
+#       buf: The compressed chunk
+#       size: Size of the chunk once decompressed, at most WINDOW_SIZE
+####################################################################################
+def decompress( buf, size ):
+    bits = _BitReader( buf )
+    out = bytearray()
+    main_lengths = [ 0 ] * NUM_MAIN_SYMBOLS
+    len_lengths = [ 0 ] * NUM_LEN_SYMBOLS
+    recent = [ 1, 1, 1 ]
+    while len(out) < size:
+        block_type = bits.bits( 3 )
+        if bits.bits( 1 ) == 1:
+            block_size = DEFAULT_BLOCK_SIZE
+        else:
+            block_size = bits.bits( 16 )
+        if block_size < 1 or block_size > size - len(out):
+            raise Exception( "LZX", "Invalid block size %d at %d" % ( block_size, len(out) ))
+        aligned = None
+        if block_type == BLOCKTYPE_ALIGNED:
+            aligned = _code( [ bits.bits( 3 ) for n in xrange( NUM_ALIGNED_SYMBOLS ) ], MAX_ALIGNED_CODEWORD_LEN )
+        elif block_type == BLOCKTYPE_UNCOMPRESSED:
+            bits.align()
+            recent = [ bits.u32(), bits.u32(), bits.u32() ]
+            if 0 in recent:
+                raise Exception( "LZX", "Invalid recent offset at %d" % bits.pos )
+            out += bits.raw( block_size )
+            if block_size & 1:
+                bits.pos += 1
+            continue
+        elif not block_type == BLOCKTYPE_VERBATIM:
+            raise Exception( "LZX", "Invalid block type %d at %d" % ( block_type, len(out) ))
+        _read_lengths( bits, main_lengths, 0, NUM_CHARS )
+        _read_lengths( bits, main_lengths, NUM_CHARS, NUM_MAIN_SYMBOLS )
+        main = _code( main_lengths, MAX_MAIN_CODEWORD_LEN )
+        _read_lengths( bits, len_lengths, 0, NUM_LEN_SYMBOLS )
+        length_code = _code( len_lengths, MAX_LEN_CODEWORD_LEN )
+        block_end = len(out) + block_size
+        while len(out) < block_end:
+            symbol = bits.symbol( main )
+            if symbol < NUM_CHARS:
+                out.append( symbol )
+                continue
+            symbol -= NUM_CHARS
+            length = symbol & 7
+            slot = symbol >> 3
+            if length == NUM_PRIMARY_LENS:
+                length += bits.symbol( length_code )
+            length += MIN_MATCH_LEN
+            if slot < NUM_RECENT_OFFSETS:
+                offset = recent[slot]
+                recent[slot] = recent[0]
+                recent[0] = offset
+            else:
+                extra = OFFSET_SLOT_EXTRA[slot]
+                offset = OFFSET_SLOT_BASE[slot]
+                if not aligned == None and extra >= 3:
+                    offset += bits.bits( extra - 3 ) << 3
+                    offset += bits.symbol( aligned )
+                else:
+                    offset += bits.bits( extra )
+                offset -= NUM_RECENT_OFFSETS - 1
+                recent[2] = recent[1]
+                recent[1] = recent[0]
+                recent[0] = offset
+            if offset > len(out) or length > block_end - len(out):
+                raise Exception( "LZX", "Invalid match at %d" % len(out) )
+            src = len(out) - offset
+            if offset >= length:
+                out += out[src:src+length]
+            else:
+                out += ( out[src:] * ( length // offset + 1 ))[:length]
+    _undo_e8( out )
+    return str( out )
+
+####################################################################################
+# _undo_e8: Turns the absolute CALL targets written by the compressor back into
+#       relative ones, in place. The last 10 bytes are never translated
+####################################################################################
+def _undo_e8( out ):
+    if len(out) <= 10:
+        return
+    end = len(out) - 10
+    pos = out.find( '\xe8', 0, end )
+    while pos >= 0:
+        target = struct.unpack_from( '<i', out, pos + 1 )[0]
+        if target >= 0:
+            if target < E8_FILE_SIZE:
+                struct.pack_into( '<i', out, pos + 1, target - pos )
+        elif target >= -pos:
+            struct.pack_into( '<i', out, pos + 1, target + E8_FILE_SIZE )
+        pos = out.find( '\xe8', pos + 5, end )
@@ -1,13 +1,14 @@
 #!/usr/bin/env python
 
-import array
 import struct
 import logging
 from datetime import datetime
 
 from . import BinaryParser
 from BinaryParser import Block
+from BinaryParser import Layout
 from BinaryParser import Nestable
+from Fixup import apply_fixups
 
 g_logger = logging.getLogger("ntfs.mft")
 
@@ -40,41 +41,43 @@ class FixupBlock(Block):
         - this is most complete
         - also most complex to implement
       - we can make a copy of the buffer, and work with that
-    we take the third option for ease of implementation
+    we take the third option for ease of implementation, unless the buffer
+      is already a bytearray the caller owns, which is fixed up in place.
 
     some notes:
       - we change the buffer for this object from whats passed to the constructor
+        when it is not a bytearray
       - we change the offset for this object from whats passed to the constructor
-      - we assume the total object size is no greater than the size of the fixups!
+        in that case too
+      - the size of the object is given, or is one 512 byte stride per fixup
     """
 
     def __init__(self, buf, offset, parent):
         super(FixupBlock, self).__init__(buf, offset)
 
-    def fixup(self, num_fixups, fixup_value_offset):
-        fixup_buffer = array.array("b", self.unpack_binary(0, length=(num_fixups - 1) * 512))
-        self._buf = fixup_buffer
-        self._offset = 0
-
-        fixup_value = self.unpack_word(fixup_value_offset)
-
-        for i in range(0, num_fixups - 1):
-            fixup_offset = 512 * (i + 1) - 2
-            check_value = self.unpack_word(fixup_offset)
-
-            if check_value != fixup_value:
-                logging.warning("Bad fixup at %s", hex(self.offset() + fixup_offset))
-                continue
-
-            new_value = self.unpack_word(fixup_value_offset + 2 + 2 * i)
-            self.pack_word(fixup_offset, new_value)
-
-            check_value = self.unpack_word(fixup_offset)
-
+    def fixup(self, num_fixups, fixup_value_offset, size=None):
+        """
+        Applies the update sequence fixups, see Fixup.apply_fixups.
+        Arguments:
+        - `num_fixups`: The number of entries of the update sequence array.
+        - `fixup_value_offset`: The relative offset of the array.
+        - `size`: The size of the block. Defaults to 512 bytes per fixup,
+            which is the stride on every NTFS volume.
+        Throws:
+        - `OverrunBufferException`
+        """
+        if size is None:
+            size = (num_fixups - 1) * 512
+        if size <= 0 or self._offset + size > len(self._buf):
+            raise BinaryParser.OverrunBufferException(self._offset + max(size, 0),
+                                                      len(self._buf))
+        if not isinstance(self._buf, bytearray):
+            self._buf = bytearray(buffer(self._buf, self._offset, size))
+            self._offset = 0
 
-#            g_logger.debug("Fixup verified at %s and patched from %s to %s.",
-#                          hex(self.offset() + fixup_offset),
-#                          hex(fixup_value), hex(check_value))
+        if not apply_fixups(self._buf, self._offset, size,
+                            fixup_value_offset, num_fixups):
+            logging.warning("Bad fixup at %s", hex(self.offset()))
 
 
 class INDEX_ENTRY_FLAGS:
@@ -87,12 +90,14 @@ class INDEX_ENTRY_FLAGS:
 
 
 class INDEX_ENTRY_HEADER(Block, Nestable):
+    LAYOUT = Layout(("word", "length", 0x8),
+                    ("word", "key_length"),
+                    ("word", "index_entry_flags"),  # see INDEX_ENTRY_FLAGS
+                    ("word", "reserved"))
+
     def __init__(self, buf, offset, parent):
         super(INDEX_ENTRY_HEADER, self).__init__(buf, offset)
-        self.declare_field("word", "length", 0x8)
-        self.declare_field("word", "key_length")
-        self.declare_field("word", "index_entry_flags")  # see INDEX_ENTRY_FLAGS
-        self.declare_field("word", "reserved")
+        self.apply_layout(INDEX_ENTRY_HEADER.LAYOUT)
 
     @staticmethod
     def structure_size(buf, offset, parent):
@@ -116,9 +121,11 @@ class MFT_INDEX_ENTRY_HEADER(INDEX_ENTRY_HEADER):
     Index used by the MFT for INDX attributes.
     """
 
+    REFERENCE = Layout(("qword", "mft_reference", 0x0))
+
     def __init__(self, buf, offset, parent):
         super(MFT_INDEX_ENTRY_HEADER, self).__init__(buf, offset, parent)
-        self.declare_field("qword", "mft_reference", 0x0)
+        self.apply_layout(MFT_INDEX_ENTRY_HEADER.REFERENCE)
 
 
 class SECURE_INDEX_ENTRY_HEADER(INDEX_ENTRY_HEADER):
@@ -167,8 +174,12 @@ class MFT_INDEX_ENTRY(Block, Nestable):
 
     def __init__(self, buf, offset, parent):
         super(MFT_INDEX_ENTRY, self).__init__(buf, offset)
-        self.declare_field(MFT_INDEX_ENTRY_HEADER, "header", 0x0)
-        self.declare_field(FilenameAttribute, "filename_information")
+
+    def header(self):
+        return MFT_INDEX_ENTRY_HEADER(self._buf, self._offset, self)
+
+    def filename_information(self):
+        return FilenameAttribute(self._buf, self._offset + 0x10, self)
 
     @staticmethod
     def structure_size(buf, offset, parent):
@@ -256,13 +267,15 @@ class INDEX_HEADER_FLAGS:
 
 
 class INDEX_HEADER(Block, Nestable):
+    LAYOUT = Layout(("dword", "entries_offset", 0x0),
+                    ("dword", "index_length"),
+                    ("dword", "allocated_size"),
+                    ("byte", "index_header_flags"))  # see INDEX_HEADER_FLAGS
+    # then 3 bytes padding/reserved
+
     def __init__(self, buf, offset, parent):
         super(INDEX_HEADER, self).__init__(buf, offset)
-        self.declare_field("dword", "entries_offset", 0x0)
-        self.declare_field("dword", "index_length")
-        self.declare_field("dword", "allocated_size")
-        self.declare_field("byte", "index_header_flags")  # see INDEX_HEADER_FLAGS
-        # then 3 bytes padding/reserved
+        self.apply_layout(INDEX_HEADER.LAYOUT)
 
     @staticmethod
     def structure_size(buf, offset, parent):
@@ -345,15 +358,17 @@ class INDEX(Block, Nestable):
 
 
 class INDEX_ROOT(Block, Nestable):
+    LAYOUT = Layout(("dword", "type", 0x0),
+                    ("dword", "collation_rule"),
+                    ("dword", "index_record_size_bytes"),
+                    ("byte", "index_record_size_clusters"),
+                    ("byte", "unused1"),
+                    ("byte", "unused2"),
+                    ("byte", "unused3"))
+
     def __init__(self, buf, offset, parent=None):
         super(INDEX_ROOT, self).__init__(buf, offset)
-        self.declare_field("dword", "type", 0x0)
-        self.declare_field("dword", "collation_rule")
-        self.declare_field("dword", "index_record_size_bytes")
-        self.declare_field("byte", "index_record_size_clusters")
-        self.declare_field("byte", "unused1")
-        self.declare_field("byte", "unused2")
-        self.declare_field("byte", "unused3")
+        self.apply_layout(INDEX_ROOT.LAYOUT)
         self._index_offset = self.current_field_offset()
         self.add_explicit_field(self._index_offset, INDEX, "index")
 
@@ -538,15 +553,17 @@ class StandardInformationFieldDoesNotExist(Exception):
 
 
 class StandardInformation(Block):
+    LAYOUT = Layout(("filetime", "created_time", 0x0),
+                    ("filetime", "modified_time"),
+                    ("filetime", "changed_time"),
+                    ("filetime", "accessed_time"),
+                    ("dword", "attributes"),
+                    ("binary", "reserved", None, 0xC))
+
     # TODO(wb): implement sizing so we can make this nestable
     def __init__(self, buf, offset, parent):
         super(StandardInformation, self).__init__(buf, offset)
-        self.declare_field("filetime", "created_time", 0x0)
-        self.declare_field("filetime", "modified_time")
-        self.declare_field("filetime", "changed_time")
-        self.declare_field("filetime", "accessed_time")
-        self.declare_field("dword", "attributes")
-        self.declare_field("binary", "reserved", self.current_field_offset(), 0xC)
+        self.apply_layout(StandardInformation.LAYOUT)
         # self.declare_field("dword", "owner_id", 0x30)  # Win2k+, NTFS 3.x
         # self.declare_field("dword", "security_id")  # Win2k+, NTFS 3.x
         # self.declare_field("qword", "quota_charged")  # Win2k+, NTFS 3.x
@@ -620,36 +637,44 @@ class Attribute_List(Block, Nestable):
 
 
 class Attribute_List_Entry(Block, Nestable):
+    LAYOUT = Layout(("dword", "type", 0x0),
+                    ("word", "record_length", 0x4),
+                    ("byte", "nameLength", 0x6),
+                    ("byte", "offsetToName", 0x7),
+                    ("qword", "startVCN", 0x8),
+                    ("qword", "baseFileReference", 0x10),
+                    ("word", "attributeID", 0x18))
+
     def __init__(self, buf, offset, logger):
         super(Attribute_List_Entry, self).__init__(buf, offset)
-        self.declare_field("dword", "type", 0x0)
-        self.declare_field("word", "record_length", 0x4)
-        self.declare_field("byte", "nameLength", 0x6)
-        self.declare_field("byte", "offsetToName", 0x7)
-        self.declare_field("qword", "startVCN", 0x8)
-        self.declare_field("qword", "baseFileReference", 0x10)
-        self.declare_field("word", "attributeID", 0x18)
-        self.declare_field("wstring", "name", 0x1a, 2 * self.nameLength())
+        self.apply_layout(Attribute_List_Entry.LAYOUT)
+
+    def name(self):
+        return self.unpack_wstring(0x1a, 2 * self.nameLength())
 
     def __len__(self):
         return self.size()
 
 
 class FilenameAttribute(Block, Nestable):
+    LAYOUT = Layout(("qword", "mft_parent_reference", 0x0),
+                    ("filetime", "created_time"),
+                    ("filetime", "modified_time"),
+                    ("filetime", "changed_time"),
+                    ("filetime", "accessed_time"),
+                    ("qword", "physical_size"),
+                    ("qword", "logical_size"),
+                    ("dword", "flags"),
+                    ("dword", "reparse_value"),
+                    ("byte", "filename_length"),
+                    ("byte", "filename_type"))
+
     def __init__(self, buf, offset, parent):
         super(FilenameAttribute, self).__init__(buf, offset)
-        self.declare_field("qword", "mft_parent_reference", 0x0)
-        self.declare_field("filetime", "created_time")
-        self.declare_field("filetime", "modified_time")
-        self.declare_field("filetime", "changed_time")
-        self.declare_field("filetime", "accessed_time")
-        self.declare_field("qword", "physical_size")
-        self.declare_field("qword", "logical_size")
-        self.declare_field("dword", "flags")
-        self.declare_field("dword", "reparse_value")
-        self.declare_field("byte", "filename_length")
-        self.declare_field("byte", "filename_type")
-        self.declare_field("wstring", "filename", 0x42, self.filename_length())
+        self.apply_layout(FilenameAttribute.LAYOUT)
+
+    def filename(self):
+        return self.unpack_wstring(0x42, self.filename_length())
 
     @staticmethod
     def structure_size(buf, offset, parent):
@@ -695,17 +720,19 @@ class SlackIndexEntry(IndexEntry):
 
 
 class Runentry(Block, Nestable):
+    LAYOUT = Layout(("byte", "header", 0x0))
+
     def __init__(self, buf, offset, parent):
         super(Runentry, self).__init__(buf, offset)
-        self.declare_field("byte", "header")
+        self.apply_layout(Runentry.LAYOUT)
         self._offset_length = self.header() >> 4
         self._length_length = self.header() & 0x0F
-        self.declare_field("binary",
-                           "length_binary",
-                           self.current_field_offset(), self._length_length)
-        self.declare_field("binary",
-                           "offset_binary",
-                           self.current_field_offset(), self._offset_length)
+
+    def length_binary(self):
+        return self.unpack_binary(0x1, self._length_length)
+
+    def offset_binary(self):
+        return self.unpack_binary(0x1 + self._length_length, self._offset_length)
 
     @staticmethod
     def structure_size(buf, offset, parent):
@@ -812,6 +839,7 @@ class ATTR_TYPE:
     DATA = 0x80
     INDEX_ROOT = 0x90
     INDEX_ALLOCATION = 0xA0
+    REPARSE_POINT = 0xC0
     UTILITY_STREAM = 0x100
 
 
@@ -854,36 +882,39 @@ class Attribute(Block, Nestable):
         0x20000000: "has-view-index",
     }
 
+    HEADER = Layout(("dword", "type", 0x0),
+                    ("dword", "size"),  # this value must rounded up to 0x8 byte alignment
+                    ("byte", "non_resident"),
+                    ("byte", "name_length"),
+                    ("word", "name_offset"),
+                    ("word", "flags"),
+                    ("word", "instance"))
+    # compressed_size at 0x40 only exists in compressed attributes, see
+    #  compressed_size()
+    NON_RESIDENT = Layout(("qword", "lowest_vcn", 0x10),
+                          ("qword", "highest_vcn"),
+                          ("word", "runlist_offset"),
+                          ("byte", "compression_unit"),
+                          ("byte", "reserved1"),
+                          ("byte", "reserved2"),
+                          ("byte", "reserved3"),
+                          ("byte", "reserved4"),
+                          ("byte", "reserved5"),
+                          ("qword", "allocated_size"),
+                          ("qword", "data_size"),
+                          ("qword", "initialized_size"))
+    RESIDENT = Layout(("dword", "value_length", 0x10),
+                      ("word", "value_offset"),
+                      ("byte", "value_flags"),
+                      ("byte", "reserved"))
+
     def __init__(self, buf, offset, parent):
         super(Attribute, self).__init__(buf, offset)
-        self.declare_field("dword", "type")
-        self.declare_field("dword", "size")  # this value must rounded up to 0x8 byte alignment
-        self.declare_field("byte", "non_resident")
-        self.declare_field("byte", "name_length")
-        self.declare_field("word", "name_offset")
-        self.declare_field("word", "flags")
-        self.declare_field("word", "instance")
+        self.apply_layout(Attribute.HEADER)
         if self.non_resident() > 0:
-            self.declare_field("qword", "lowest_vcn", 0x10)
-            self.declare_field("qword", "highest_vcn")
-            self.declare_field("word", "runlist_offset")
-            self.declare_field("byte", "compression_unit")
-            self.declare_field("byte", "reserved1")
-            self.declare_field("byte", "reserved2")
-            self.declare_field("byte", "reserved3")
-            self.declare_field("byte", "reserved4")
-            self.declare_field("byte", "reserved5")
-            self.declare_field("qword", "allocated_size")
-            self.declare_field("qword", "data_size")
-            self.declare_field("qword", "initialized_size")
-            self.declare_field("qword", "compressed_size")
+            self.apply_layout(Attribute.NON_RESIDENT)
         else:
-            self.declare_field("dword", "value_length", 0x10)
-            self.declare_field("word", "value_offset")
-            self.declare_field("byte", "value_flags")
-            self.declare_field("byte", "reserved")
-            self.declare_field("binary", "value",
-                               self.value_offset(), self.value_length())
+            self.apply_layout(Attribute.RESIDENT)
 
     @staticmethod
     def structure_size(buf, offset, parent):
@@ -903,6 +934,16 @@ class Attribute(Block, Nestable):
         s = self.unpack_dword(self._off_size)
         return s + (8 - (s % 8))
 
+    def compressed_size(self):
+        if self.non_resident() == 0:
+            raise AttributeError("compressed_size")
+        return self.unpack_qword(0x40)
+
+    def value(self):
+        if self.non_resident() > 0:
+            raise AttributeError("value")
+        return self.unpack_binary(self.value_offset(), self.value_length())
+
     def name(self):
         return self.unpack_wstring(self.name_offset(), self.name_length())
 
@@ -931,44 +972,47 @@ class AttributeNotFoundError(Exception):
 
 
 class MFTRecord(FixupBlock):
-    def __init__(self, buf, offset, parent, inode=None):
-        super(MFTRecord, self).__init__(buf, offset, parent)
-
+    HEADER = Layout(
         # 0x0 File or BAAD
-        self.declare_field("dword", "magic")
+        ("dword", "magic"),
         # 0x04 Offset to fixup array
-        self.declare_field("word", "usa_offset")
+        ("word", "usa_offset"),
         # 0x06 Number of entries in fixup array
-        self.declare_field("word", "usa_count")
+        ("word", "usa_count"),
         # 0x08 $LogFile sequence number
-        self.declare_field("qword", "lsn")
+        ("qword", "lsn"),
         # 0x10 Sequence value
-        self.declare_field("word", "sequence_number")
+        ("word", "sequence_number"),
         # 0x12 Link Count
-        self.declare_field("word", "link_count")
+        ("word", "link_count"),
         # 0x14 Offset of first attribute
-        self.declare_field("word", "attrs_offset")
+        ("word", "attrs_offset"),
         # 0x16 Flags:
         #   0x00 - not in use
         #   0x01 - in use
         #   0x02 - directory
         #   0x03 - directory in use
-        self.declare_field("word", "flags")
+        ("word", "flags"),
 
         # 0x18 Used size of MFT entry
-        self.declare_field("dword", "bytes_in_use")
+        ("dword", "bytes_in_use"),
         # 0x1c Allocated size of MFT entry
-        self.declare_field("dword", "bytes_allocated")
+        ("dword", "bytes_allocated"),
         # 0x20 File reference to base record
-        self.declare_field("qword", "base_mft_record")
+        ("qword", "base_mft_record"),
         # 0x28 Nex attribute identifier
-        self.declare_field("word", "next_attr_instance")
+        ("word", "next_attr_instance"),
 
         # Attributes and fixup values
         # 0x2a
-        self.declare_field("word", "reserved")
+        ("word", "reserved"),
         # 0x2c
-        self.declare_field("dword", "mft_record_number")
+        ("dword", "mft_record_number"))
+
+    def __init__(self, buf, offset, parent, inode=None):
+        super(MFTRecord, self).__init__(buf, offset, parent)
+        # the header is before the first fixup, unpacking it first is safe
+        self.apply_layout(MFTRecord.HEADER)
 
         self.inode = inode or self.mft_record_number()
         #        print self.sequence_number()
@@ -1057,13 +1101,13 @@ class MFTRecord(FixupBlock):
         """
         Returns A binary string containing the MFT record slack.
         """
-        return self._buf[self.offset() + self.bytes_in_use():self.offset() + 1024].tostring()
+        return str(self._buf[self.offset() + self.bytes_in_use():self.offset() + 1024])
 
     def active_data(self):
         """
         Returns A binary string containing the MFT record slack.
         """
-        return self._buf[self.offset():self.offset() + self.bytes_in_use()].tostring()
+        return str(self._buf[self.offset():self.offset() + self.bytes_in_use()])
 
 
 class InvalidAttributeException(INDXException):
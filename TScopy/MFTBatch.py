@@ -0,0 +1,174 @@
+"""
+Batch decoder for MFT record headers.
+
+MFTRecord declares every header field through BinaryParser for each record it is
+given, which is what the per file code paths want but far too slow when the whole
+$MFT is walked. decode_records() takes a buffer holding many records, applies the
+update sequence fixups to all of them at once and returns the header fields as
+columns. With NumPy the buffer is viewed through a structured dtype, without it the
+same columns are filled in with struct.
+"""
+import struct
+
+from Fixup import valid_usa, apply_fixups, apply_fixups_batch
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FILE_MAGIC = 0x454c4946 # 'FILE'
+
+MFT_RECORD_IN_USE = 0x1
+MFT_RECORD_IS_DIRECTORY = 0x2
+
+ATTR_TYPE_FILENAME = 0x30
+ATTR_TYPE_END = 0xffffffff
+
+# Header of an MFT record, see MFTRecord
+HEADER_FIELDS = [ ('magic', '<u4', 0x00),
+                  ('usa_offset', '<u2', 0x04),
+                  ('usa_count', '<u2', 0x06),
+                  ('lsn', '<u8', 0x08),
+                  ('sequence_number', '<u2', 0x10),
+                  ('link_count', '<u2', 0x12),
+                  ('attrs_offset', '<u2', 0x14),
+                  ('flags', '<u2', 0x16),
+                  ('bytes_in_use', '<u4', 0x18),
+                  ('bytes_allocated', '<u4', 0x1c),
+                  ('base_mft_record', '<u8', 0x20),
+                  ('next_attr_instance', '<u2', 0x28),
+                  ('reserved', '<u2', 0x2a),
+                  ('mft_record_number', '<u4', 0x2c) ]
+HEADER_STRUCT = struct.Struct('<IHHQHHHHIIQHHI')
+
+####################################################################################
+# record_dtype: NumPy structured dtype laying the header fields over a record of
+#       record_size bytes. Only available when NumPy is installed
+####################################################################################
+def record_dtype( record_size ):
+    return np.dtype({ 'names': [ x[0] for x in HEADER_FIELDS ],
+                      'formats': [ x[1] for x in HEADER_FIELDS ],
+                      'offsets': [ x[2] for x in HEADER_FIELDS ],
+                      'itemsize': record_size })
+
+####################################################################################
+# RecordBatch: Header columns of count consecutive MFT records starting at record
+#       number first. Every column has one entry per record. fixup_ok is False for
+#       records that are not FILE records or whose fixups did not match.
+#       data holds the fixed up records, record(i) returns a buffer over record i
+#       that can be handed to MFTRecord or filename_attributes
+####################################################################################
+class RecordBatch( object ):
+    def __init__( self, first, count, record_size, data, columns ):
+        self.first = first
+        self.count = count
+        self.record_size = record_size
+        self.data = data
+        for name, value in columns.items():
+            setattr( self, name, value )
+
+    def record( self, i ):
+        return buffer( self.data, i*self.record_size, self.record_size )
+
+    # Indexes of the FILE records that are in use and have good fixups
+    def in_use( self ):
+        if not np == None and isinstance( self.flags, np.ndarray ):
+            return np.flatnonzero( self.fixup_ok & ( self.flags & MFT_RECORD_IN_USE > 0 )).tolist()
+        return [ i for i in xrange(self.count) if self.fixup_ok[i] and self.flags[i] & MFT_RECORD_IN_USE ]
+
+    def is_directory( self, i ):
+        return self.flags[i] & MFT_RECORD_IS_DIRECTORY > 0
+
+    def base_record( self, i ):
+        return int(self.base_mft_record[i]) & 0xffffffffffff
+
+####################################################################################
+# decode_records: Decodes the headers of count records in buf and applies the fixups
+#       buf: str, buffer or mmap view holding at least count*record_size bytes
+#       first: Record number of the first record in buf
+#       useNumpy: None uses NumPy when it is installed, False forces the struct decoder
+####################################################################################
+def decode_records( buf, count, record_size, first=0, useNumpy=None ):
+    if useNumpy == None:
+        useNumpy = not np == None
+    if useNumpy == True:
+        return _decode_numpy( buf, count, record_size, first )
+    return _decode_struct( buf, count, record_size, first )
+
+####################################################################################
+# _decode_numpy: The records are copied once into a (count, record_size) uint8 array
+#       so the fixups can be written. The headers are read through a structured view of
+#       the same memory. Fixups are applied to every record sharing the most common
+#       update sequence layout with a single fancy index assignment, the rest are done
+#       one record at a time.
+####################################################################################
+def _decode_numpy( buf, count, record_size, first ):
+    raw = np.frombuffer( buf, dtype=np.uint8, count=count*record_size ).copy()
+    hdr = raw.view( record_dtype( record_size ))
+    words = raw.view( '<u2' ).reshape( count, record_size // 2 )
+    fixup_ok = hdr['magic'] == FILE_MAGIC
+
+    if fixup_ok.any():
+        layout = ( hdr['usa_offset'].astype('<u4') << 16 ) | hdr['usa_count']
+        layouts, counts = np.unique( layout[fixup_ok], return_counts=True )
+        common = layouts[ counts.argmax() ]
+        usa_offset, usa_count = int(common >> 16), int(common & 0xffff)
+        same = fixup_ok & ( layout == common )
+        if valid_usa( usa_offset, usa_count, record_size ):
+            rows = np.flatnonzero( same )
+            ends = ( np.arange( 1, usa_count ) * ( record_size // (usa_count - 1)) - 2 ) // 2
+            usa = words[ rows, usa_offset // 2 : usa_offset // 2 + usa_count ]
+            good = ( words[ rows[:, None], ends ] == usa[:, :1] ).all( axis=1 )
+            words[ rows[good][:, None], ends ] = usa[ good, 1: ]
+            fixup_ok[ rows[~good] ] = False
+        else:
+            fixup_ok[ same ] = False
+        view = memoryview( raw )
+        for i in np.flatnonzero( fixup_ok & ~same ):
+            fixup_ok[i] = apply_fixups( view, i*record_size, record_size,
+                                        int(hdr['usa_offset'][i]), int(hdr['usa_count'][i]) )
+
+    columns = dict( ( x[0], hdr[x[0]] ) for x in HEADER_FIELDS )
+    columns['fixup_ok'] = fixup_ok
+    return RecordBatch( first, count, record_size, raw, columns )
+
+####################################################################################
+# _decode_struct: Same as _decode_numpy with one struct unpack per record and the
+#       fixups of the chunk applied by Fixup.apply_fixups_batch. The columns are lists
+####################################################################################
+def _decode_struct( buf, count, record_size, first ):
+    raw = bytearray( buffer( buf, 0, count*record_size ))
+    columns = dict( ( x[0], [] ) for x in HEADER_FIELDS )
+    appends = [ columns[x[0]].append for x in HEADER_FIELDS ]
+    for i in xrange( count ):
+        values = HEADER_STRUCT.unpack_from( raw, i*record_size )
+        for append, value in zip( appends, values ):
+            append( value )
+    columns['fixup_ok'] = apply_fixups_batch( raw, count, record_size, magic=FILE_MAGIC )
+    return RecordBatch( first, count, record_size, raw, columns )
+
+####################################################################################
+# filename_attributes: Returns [(parent reference, filename type, name)] for every
+#       $FILE_NAME attribute of a fixed up record without building an MFTRecord.
+#       buf: The record, usually RecordBatch.record(i)
+####################################################################################
+def filename_attributes( buf, attrs_offset, bytes_in_use ):
+    ret = []
+    offset = int(attrs_offset)
+    end = min( int(bytes_in_use), len(buf) )
+    while offset + 8 <= end:
+        attr_type, attr_len = struct.unpack_from( '<II', buf, offset )
+        if attr_type == ATTR_TYPE_END or attr_len == 0 or offset + attr_len > end:
+            break
+        # $FILE_NAME is always resident
+        if attr_type == ATTR_TYPE_FILENAME and struct.unpack_from( '<B', buf, offset + 8 )[0] == 0:
+            value_len, value_offset = struct.unpack_from( '<IH', buf, offset + 0x10 )
+            value = offset + value_offset
+            if value_len >= 0x42 and value + value_len <= offset + attr_len:
+                parent = struct.unpack_from( '<Q', buf, value )[0]
+                name_len, fn_type = struct.unpack_from( '<BB', buf, value + 0x40 )
+                name = buf[ value + 0x42 : value + 0x42 + 2*name_len ]
+                ret.append( ( parent, fn_type, name.decode( 'utf-16le', 'replace' )))
+        offset += attr_len
+    return ret
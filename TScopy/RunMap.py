@@ -0,0 +1,78 @@
+"""
+VCN to volume offset mapping for the data runs of a non resident attribute.
+
+The runs are flattened once into sorted tables of the first byte (VCN * cluster
+size) each run covers, so any offset in the attribute is resolved with a binary
+search instead of walking the runlist from the start.
+"""
+import bisect
+
+####################################################################################
+# RunMap: Byte level map of an attribute's data runs.
+#       runs: (lcn, length in clusters) in VCN order, as yielded by MFT.Runlist.runs().
+#             An lcn of 0 is a sparse run
+#       bytes_per_cluster: Cluster size of the volume
+####################################################################################
+class RunMap( object ):
+    def __init__( self, runs, bytes_per_cluster ):
+        self.bytes_per_cluster = bytes_per_cluster
+        self._starts = []
+        self._offsets = []
+        self._sizes = []
+        pos = 0
+        for lcn, length in runs:
+            if length <= 0:
+                continue
+            self._starts.append( pos )
+            self._offsets.append( None if lcn == 0 else lcn * bytes_per_cluster )
+            self._sizes.append( length * bytes_per_cluster )
+            pos += length * bytes_per_cluster
+        self.size = pos
+
+    def __len__( self ):
+        return len( self._starts )
+
+    ####################################################################################
+    # locate: Returns the index of the run holding the byte offset, -1 if the offset is
+    #       outside of the attribute
+    ####################################################################################
+    def locate( self, offset ):
+        if offset < 0 or offset >= self.size:
+            return -1
+        return bisect.bisect_right( self._starts, offset ) - 1
+
+    ####################################################################################
+    # extents: Returns [(volume offset, size)] covering size bytes of the attribute
+    #       starting at offset. The volume offset is None for sparse runs. More than one
+    #       extent is returned when the range crosses runs. The range is clipped at the
+    #       end of the attribute.
+    ####################################################################################
+    def extents( self, offset, size ):
+        ret = []
+        idx = self.locate( offset )
+        if idx < 0:
+            return ret
+        end = min( offset + size, self.size )
+        while offset < end:
+            skip = offset - self._starts[idx]
+            step = min( self._sizes[idx] - skip, end - offset )
+            run_offset = self._offsets[idx]
+            ret.append( ( None if run_offset == None else run_offset + skip, step ))
+            offset += step
+            idx += 1
+        return ret
+
+    ####################################################################################
+    # split_records: Returns {record number: [(volume offset, size)]} for every fixed
+    #       size record that crosses a run boundary. Only the boundaries are visited so
+    #       the cost is O(runs). A record can span any number of runs.
+    ####################################################################################
+    def split_records( self, record_size ):
+        ret = {}
+        for start in self._starts[1:]:
+            if start % record_size == 0:
+                continue
+            recnum = start // record_size
+            if not recnum in ret and ( recnum + 1 ) * record_size <= self.size:
+                ret[recnum] = self.extents( recnum * record_size, record_size )
+        return ret
@@ -0,0 +1,38 @@
+"""
+Open volumes kept between the copies of a TScopy run.
+
+Opening a volume reads its boot sector, parses MFT record 0 for the $MFT data runs
+and finds the records split between two runs. A VolumeSession keeps that state,
+together with the volume reader, so later copies from the same volume start
+right away. TScopy works on its config dictionary: the session saves the volume
+keys of the config once the volume is open and puts them back when a copy from
+the volume starts.
+    SESSION_KEYS: The config keys describing the open volume
+"""
+
+SESSION_KEYS = ( 'volume',
+                 'driveLetter',
+                 'fd',
+                 'image_offset_found',
+                 'bss',
+                 'mft_dataruns',
+                 'mft_runmap',
+                 'split_mft_rec' )
+
+####################################################################################
+# VolumeSession: The state of one open volume, valid until close() is called. The
+#       $MFT data runs are not read again, a live volume whose $MFT grew since the
+#       session was opened needs a new session to reach the new records
+####################################################################################
+class VolumeSession( object ):
+    def __init__( self, config ):
+        self.state = dict( ( key, config.get( key )) for key in SESSION_KEYS )
+
+    def activate( self, config ):
+        config.update( self.state )
+
+    def close( self ):
+        fd = self.state.get( 'fd' )
+        if not fd == None:
+            fd.close()
+        self.state['fd'] = None
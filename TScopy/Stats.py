@@ -0,0 +1,88 @@
+"""
+Counters and phase timers of a TScopy run.
+
+Tells whether a slow collection is bound by the reads of the volume, the parsing
+of the MFT records and indexes or the writing of the output:
+    counters: Events counted on the hot paths, volumes opened, MFT records read and
+          parsed, INDX blocks parsed, lookup table hits and misses, $I30 B+-tree
+          lookups and their fallbacks to listing the directory, directory listing
+          cache hits and misses, volume reads and bytes read and written, timeline
+          entries written and files left out by the filter
+    phases: Wall clock seconds spent in each phase of the run. A phase entered again
+          by the same thread while it is running, by a recursive call, is only
+          timed once
+"""
+import time
+import threading
+import collections
+from contextlib import contextmanager
+
+COUNTERS = ( 'volumes_opened',
+             'mft_records_read',
+             'mft_records_parsed',
+             'indx_blocks_parsed',
+             'lookup_hits',
+             'lookup_misses',
+             'index_lookups',
+             'index_lookup_fallbacks',
+             'dir_cache_hits',
+             'dir_cache_misses',
+             'read_calls',
+             'bytes_read',
+             'bytes_written',
+             'streams_written',
+             'timeline_entries',
+             'files_filtered' )
+PHASES = ( 'boot_sector', 'gen_ref_array', 'scan_mft', 'resolve', 'copy', 'timeline' )
+
+####################################################################################
+# PerfStats: Counters and phase timers shared by the calling thread and the workers
+####################################################################################
+class PerfStats( object ):
+    def __init__( self ):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = time.time()
+        self._counters = collections.defaultdict( int )
+        self._phases = collections.defaultdict( float )
+
+    def add( self, name, count=1 ):
+        with self._lock:
+            self._counters[name] += count
+
+    ####################################################################################
+    # phase: Context manager timing the code run inside it as the phase name
+    ####################################################################################
+    @contextmanager
+    def phase( self, name ):
+        running = getattr( self._local, 'running', None )
+        if running == None:
+            running = self._local.running = set()
+        if name in running:
+            yield
+            return
+        running.add( name )
+        start = time.time()
+        try:
+            yield
+        finally:
+            running.discard( name )
+            elapsed = time.time() - start
+            with self._lock:
+                self._phases[name] += elapsed
+
+    ####################################################################################
+    # summary: The counters and phases as a dictionary that can be dumped as JSON
+    ####################################################################################
+    def summary( self ):
+        with self._lock:
+            counters = dict( ( name, self._counters.get( name, 0 )) for name in COUNTERS )
+            counters.update( self._counters )
+            phases = dict( ( name, round( self._phases.get( name, 0.0 ), 6 )) for name in PHASES )
+            phases.update( ( name, round( value, 6 )) for name, value in self._phases.items() )
+        lookups = counters['lookup_hits'] + counters['lookup_misses']
+        return { 'counters': counters,
+                 'phases': phases,
+                 'elapsed': round( time.time() - self._start, 6 ),
+                 'lookup_hit_rate': round( float( counters['lookup_hits'] ) / lookups, 4 ) if lookups > 0 else None,
+                 'read_write_ratio': round( float( counters['bytes_read'] ) / counters['bytes_written'], 4 ) if counters['bytes_written'] > 0 else None }
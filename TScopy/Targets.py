@@ -0,0 +1,81 @@
+"""
+Collection profiles, the targets of a collection kept in a JSON or YAML file.
+
+A profile is turned into the list of source paths TScopy.copy() takes. The layouts
+accepted are:
+    A list of targets
+    {"targets": [...]}, or {"Targets": [...]} as in the KAPE .tkape files
+Every target is a path, wildcards allowed, or a dictionary with:
+    path / Path: The directory or file. KAPE variables such as %user% match any name
+    file_mask / FileMask: (Optional) Names to copy from the directory
+    recursive / Recursive: (Optional) Also look for the file mask in the directories
+          below, or copy every file below the directory when there is no mask
+The other KAPE keys (Name, Category, Comment, ...) are ignored. The targets are
+deduplicated without case, the planning of TScopy removes the overlaps left.
+YAML profiles (.yaml, .yml, .tkape) need the PyYAML module.
+"""
+import re
+import json
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+YAML_SUFFIXES = ( '.yaml', '.yml', '.tkape' )
+KAPE_VARIABLE = re.compile( r'%[^%\\/]+%' )
+
+####################################################################################
+# load_profile: Reads the profile file. Returns the list of source paths
+####################################################################################
+def load_profile( filename ):
+    with open( filename, 'rb' ) as fd:
+        data = fd.read()
+    if filename.lower().endswith( YAML_SUFFIXES ):
+        if yaml == None:
+            raise Exception( "TARGETS", "Reading %s needs the PyYAML module" % filename )
+        profile = yaml.safe_load( data )
+    else:
+        profile = json.loads( data )
+    return profile_targets( profile )
+
+####################################################################################
+# profile_targets: The source paths of a profile already parsed, see load_profile
+####################################################################################
+def profile_targets( profile ):
+    if isinstance( profile, dict ):
+        targets = profile.get( 'targets', profile.get( 'Targets' ))
+    else:
+        targets = profile
+    if not isinstance( targets, list ):
+        raise Exception( "TARGETS", "The profile has no list of targets" )
+    ret = []
+    seen = set()
+    for target in targets:
+        if isinstance( target, basestring ):
+            path = target
+        elif isinstance( target, dict ):
+            path = target_path( target.get( 'path', target.get( 'Path' )),
+                                target.get( 'file_mask', target.get( 'FileMask' )),
+                                target.get( 'recursive', target.get( 'Recursive', False )))
+        else:
+            raise Exception( "TARGETS", "Invalid target %r" % ( target, ))
+        if isinstance( path, unicode ):
+            path = path.encode( 'utf-8' )
+        if not path.lower() in seen:
+            seen.add( path.lower() )
+            ret.append( path )
+    return ret
+
+####################################################################################
+# target_path: The source path of a path, file mask and recursive target
+####################################################################################
+def target_path( path, file_mask=None, recursive=False ):
+    if path == None:
+        raise Exception( "TARGETS", "Target without a path" )
+    path = KAPE_VARIABLE.sub( '*', path ).rstrip( '\\/' )
+    if recursive == True:
+        path += '\\**'
+    if not file_mask == None and not file_mask == '':
+        path += '\\' + file_mask
+    return path
@@ -0,0 +1,230 @@
+"""
+Metadata timeline of a volume, written as a mactime bodyfile or as CSV.
+
+The timeline is built from two sequential passes of the $MFT, decoded in chunks
+with MFTBatch:
+    1. The name, parent and sequence number of every directory record. Only the
+       directories are kept in memory, the full paths are resolved from them
+    2. The $STANDARD_INFORMATION and $FILE_NAME timestamps and the size of every
+       record, in use or deleted, written out as soon as the record is decoded
+A parent reference whose sequence number does not match the directory record, a
+directory deleted and its record reused, puts the file under $OrphanFiles as The
+Sleuth Kit does. Extension records are skipped, the base record holds the
+timestamps.
+    bodyfile: The Sleuth Kit 3.x body format read by mactime. One line with the
+          $STANDARD_INFORMATION times and one with the $FILE_NAME times, the name
+          ending with " ($FILE_NAME)", for every name of the record
+    csv: One row per name with both sets of times in ISO 8601 UTC
+"""
+import csv
+import struct
+import datetime
+
+TIMELINE_FORMATS = ( 'bodyfile', 'csv' )
+
+ATTR_TYPE_STANDARD_INFORMATION = 0x10
+ATTR_TYPE_FILENAME = 0x30
+ATTR_TYPE_DATA = 0x80
+ATTR_TYPE_END = 0xffffffff
+
+ROOT_RECORD = 5
+ORPHAN_DIRECTORY = '$OrphanFiles'
+FILENAME_DOS = 0x2
+# Seconds between 1601-01-01 and 1970-01-01 in 100ns units
+EPOCH_DIFFERENCE = 116444736000000000
+FILETIME_EPOCH = datetime.datetime( 1601, 1, 1 )
+# created, modified, mft modified, accessed
+TIMES = struct.Struct( '<QQQQ' )
+
+####################################################################################
+# RecordTimes: What the timeline needs from one MFT record
+#       si_times: (created, modified, mft modified, accessed) FILETIMEs, None if the
+#           record has no $STANDARD_INFORMATION
+#       names: [(parent reference, filename type, name, $FILE_NAME times)]
+#       size: Size of the unnamed $DATA stream, the $FILE_NAME size when the stream is
+#           in an extension record
+####################################################################################
+class RecordTimes( object ):
+    __slots__ = ( 'si_times', 'names', 'size' )
+
+    def __init__( self ):
+        self.si_times = None
+        self.names = []
+        self.size = None
+
+####################################################################################
+# record_times: Decodes a fixed up record without building an MFTRecord, like
+#       MFTBatch.filename_attributes. Returns a RecordTimes
+####################################################################################
+def record_times( buf, attrs_offset, bytes_in_use ):
+    ret = RecordTimes()
+    fn_size = 0
+    offset = int(attrs_offset)
+    end = min( int(bytes_in_use), len(buf) )
+    while offset + 0x18 <= end:
+        attr_type, attr_len, non_resident, name_length = struct.unpack_from( '<IIBB', buf, offset )
+        if attr_type == ATTR_TYPE_END or attr_len == 0 or offset + attr_len > end:
+            break
+        if non_resident == 0:
+            value_len, value_offset = struct.unpack_from( '<IH', buf, offset + 0x10 )
+            value = offset + value_offset
+            if value + value_len > offset + attr_len:
+                value_len = 0
+            if attr_type == ATTR_TYPE_STANDARD_INFORMATION and value_len >= 0x20:
+                ret.si_times = TIMES.unpack_from( buf, value )
+            elif attr_type == ATTR_TYPE_FILENAME and value_len >= 0x42:
+                parent = struct.unpack_from( '<Q', buf, value )[0]
+                real_size, = struct.unpack_from( '<Q', buf, value + 0x30 )
+                name_len, fn_type = struct.unpack_from( '<BB', buf, value + 0x40 )
+                name = buf[ value + 0x42 : value + 0x42 + 2*name_len ]
+                ret.names.append( ( parent, fn_type, name.decode( 'utf-16le', 'replace' ),
+                                    TIMES.unpack_from( buf, value + 0x8 )))
+                fn_size = max( fn_size, real_size )
+            elif attr_type == ATTR_TYPE_DATA and name_length == 0:
+                ret.size = value_len
+        elif attr_type == ATTR_TYPE_DATA and name_length == 0 and attr_len >= 0x40:
+            lowest_vcn, = struct.unpack_from( '<Q', buf, offset + 0x10 )
+            if lowest_vcn == 0:
+                ret.size = struct.unpack_from( '<Q', buf, offset + 0x30 )[0]
+        offset += attr_len
+    if ret.size == None:
+        ret.size = fn_size
+    return ret
+
+####################################################################################
+# long_names: The names of a record without the DOS 8.3 names, unless there is
+#       nothing else
+####################################################################################
+def long_names( names ):
+    ret = [ x for x in names if not x[1] == FILENAME_DOS ]
+    if len(ret) == 0:
+        return names[:1]
+    return ret
+
+def unix_time( filetime ):
+    if filetime < EPOCH_DIFFERENCE:
+        return 0
+    return ( filetime - EPOCH_DIFFERENCE ) // 10000000
+
+def iso_time( filetime ):
+    if filetime == 0:
+        return ''
+    try:
+        return ( FILETIME_EPOCH + datetime.timedelta( microseconds=filetime // 10 )).isoformat() + 'Z'
+    except OverflowError:
+        return ''
+
+####################################################################################
+# DirectoryPaths: The full path of the directories found by the first pass
+#       add: Records a directory, name and parent reference of its long name
+#       path: The full path of the parent of a name, from the parent reference
+#       prefix: Put in front of every path, the drive ('c:') for instance
+####################################################################################
+class DirectoryPaths( object ):
+    def __init__( self, prefix='' ):
+        self._prefix = prefix
+        self._dirs = {}
+        self._paths = {}
+
+    def add( self, record, sequence, parent, name ):
+        self._dirs[record] = ( sequence, parent, name )
+
+    def path( self, reference ):
+        record, sequence = reference & 0xffffffffffff, reference >> 48
+        if record == ROOT_RECORD:
+            return self._prefix
+        entry = self._dirs.get( record )
+        if entry == None or ( sequence > 0 and not entry[0] == sequence ):
+            return self._prefix + '/' + ORPHAN_DIRECTORY
+        return self.__resolve( record )
+
+    # Walks up to the root or to a directory already resolved, then fills in the
+    #   paths on the way back down
+    def __resolve( self, record ):
+        chain = []
+        seen = set()
+        while not record in self._paths:
+            if record == ROOT_RECORD:
+                self._paths[record] = self._prefix
+                break
+            entry = self._dirs.get( record )
+            if entry == None or record in seen:
+                self._paths[record] = self._prefix + '/' + ORPHAN_DIRECTORY
+                break
+            seen.add( record )
+            chain.append( record )
+            record = entry[1] & 0xffffffffffff
+        path = self._paths[record]
+        for record in reversed( chain ):
+            path = path + '/' + self._dirs[record][2]
+            self._paths[record] = path
+        return path
+
+####################################################################################
+# write_record: Writes the entries of every long name of a record, see record_times.
+#       Returns the number of names written
+####################################################################################
+def write_record( writer, paths, record, sequence, is_directory, in_use, times ):
+    count = 0
+    for parent, fn_type, name, fn_times in long_names( times.names ):
+        path = paths.path( parent ) + '/'
+        if not record == ROOT_RECORD:
+            path += name
+        writer.write( record, sequence, path, is_directory, in_use, times.si_times, fn_times, times.size )
+        count += 1
+    return count
+
+####################################################################################
+# BodyfileWriter: MD5|name|inode|mode|UID|GID|size|atime|mtime|ctime|crtime, ctime
+#       being the MFT modified time. The inode is record-sequence
+####################################################################################
+class BodyfileWriter( object ):
+    def __init__( self, fd ):
+        self._fd = fd
+
+    def write( self, record, sequence, path, is_directory, in_use, si_times, fn_times, size ):
+        name = path.replace( '|', '_' )
+        suffix = ''
+        if in_use == False:
+            suffix = ' (deleted)'
+        mode = 'd/drwxrwxrwx' if is_directory == True else 'r/rrwxrwxrwx'
+        if not si_times == None:
+            self.__line( name + suffix, record, sequence, mode, size, si_times )
+        self.__line( name + ' ($FILE_NAME)' + suffix, record, sequence, mode, size, fn_times )
+
+    def __line( self, name, record, sequence, mode, size, times ):
+        created, modified, changed, accessed = [ unix_time( x ) for x in times ]
+        self._fd.write( '0|%s|%d-%d|%s|0|0|%d|%d|%d|%d|%d\n' % ( name.encode( 'utf-8' ), record, sequence, mode,
+                        size, accessed, modified, changed, created ))
+
+####################################################################################
+# CsvWriter: One row per name with the $STANDARD_INFORMATION and $FILE_NAME times
+####################################################################################
+class CsvWriter( object ):
+    HEADER = ( 'record', 'sequence', 'path', 'type', 'in_use', 'size',
+               'si_created', 'si_modified', 'si_mft_modified', 'si_accessed',
+               'fn_created', 'fn_modified', 'fn_mft_modified', 'fn_accessed' )
+
+    def __init__( self, fd ):
+        self._writer = csv.writer( fd )
+        self._writer.writerow( self.HEADER )
+
+    def write( self, record, sequence, path, is_directory, in_use, si_times, fn_times, size ):
+        row = [ record, sequence, path.encode( 'utf-8' ), 'directory' if is_directory == True else 'file',
+                1 if in_use == True else 0, size ]
+        for times in ( si_times, fn_times ):
+            if times == None:
+                row.extend( [ '' ] * 4 )
+            else:
+                row.extend( [ iso_time( x ) for x in times ] )
+        self._writer.writerow( row )
+
+####################################################################################
+# timeline_writer: The writer of a format of TIMELINE_FORMATS over an open file
+####################################################################################
+def timeline_writer( fd, fmt ):
+    if fmt == 'bodyfile':
+        return BodyfileWriter( fd )
+    if fmt == 'csv':
+        return CsvWriter( fd )
+    raise Exception( "TIMELINE", "Invalid timeline format %s" % fmt )
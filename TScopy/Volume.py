@@ -0,0 +1,157 @@
+"""
+Readers used by TScopy to access the raw volume, image file or block device.
+
+Every reader does positional reads (offset, size) from the start of the device
+and hands the parsers a buffer they can use directly. The mmap based reader
+returns zero copy buffer() views over the mapping instead of building a new
+string for every MFT record, INDX run and data run.
+"""
+import os
+import mmap
+
+if os.name == "nt":
+    import win32file
+
+# Largest chunk copied to an output file at once
+READ_STEP = 0x01500000
+# Alignment of the live volume reads until the boot sector is known. A multiple of
+#   every sector size in use, 512 and 4096
+SECTOR_ALIGNMENT = 0x1000
+
+####################################################################################
+# VolumeReader: Base class for the volume readers. Subclasses define view()
+#       view( offset, size ): Returns the size bytes starting at offset as a str or a
+#                    buffer, shorter at the end of the device. Used by write_to
+#       write_to: Copies size bytes starting at offset into an open output file
+#       thread_safe: True if one reader can be shared by several threads. Otherwise
+#                    every thread needs its own reader
+#       set_sector_size: Gives the reader the bytes per sector of the volume. Readers
+#                    of devices that only accept whole sectors align their reads to it,
+#                    the callers can read at any offset and size
+####################################################################################
+class VolumeReader( object ):
+    thread_safe = False
+
+    def __init__( self, filename ):
+        self._filename = filename
+
+    def set_sector_size( self, sector_size ):
+        pass
+
+    def write_to( self, offset, size, fd_output ):
+        written = 0
+        while written < size:
+            buf = self.view( offset + written, min( READ_STEP, size - written ))
+            if len(buf) == 0:
+                break
+            fd_output.write( buf )
+            written += len(buf)
+        return written
+
+    def close( self ):
+        pass
+
+    def __repr__( self ):
+        return "%s(%r)" % ( self.__class__.__name__, self._filename )
+
+####################################################################################
+# FileReader: Plain seek and read. Used when the image can not be memory mapped.
+#       Uses os.pread when the platform has it, which makes the reader thread safe
+####################################################################################
+class FileReader( VolumeReader ):
+    thread_safe = hasattr( os, 'pread' )
+
+    def __init__( self, filename ):
+        super(FileReader, self).__init__( filename )
+        self._fd = open( filename, 'rb' )
+
+    def view( self, offset, size ):
+        if self.thread_safe == True:
+            return os.pread( self._fd.fileno(), size, offset )
+        self._fd.seek( offset, 0 )
+        return self._fd.read( size )
+
+    def close( self ):
+        self._fd.close()
+
+####################################################################################
+# MmapReader: Maps the whole image or block device read only. view() returns a
+#       buffer() over the mapping so no data is copied until a parser needs it.
+#       Block devices report a size of 0 so the size is found by seeking to the end.
+####################################################################################
+class MmapReader( VolumeReader ):
+    thread_safe = True
+
+    def __init__( self, filename ):
+        super(MmapReader, self).__init__( filename )
+        self._fd = open( filename, 'rb' )
+        try:
+            self._fd.seek( 0, 2 )
+            self._size = self._fd.tell()
+            self._mmap = mmap.mmap( self._fd.fileno(), self._size, access=mmap.ACCESS_READ )
+        except:
+            self._fd.close()
+            raise
+
+    def view( self, offset, size ):
+        if offset >= self._size:
+            return ''
+        return buffer( self._mmap, offset, size )
+
+    def close( self ):
+        self._mmap.close()
+        self._fd.close()
+
+####################################################################################
+# Win32Reader: Wrapper around win32file CreateFile, SetFilePointer and ReadFile for
+#       the live volumes (\\.\C:). A volume handle only reads whole sectors, the
+#       offset is rounded down and the end up to the sector size and the requested
+#       bytes are sliced out of the read
+####################################################################################
+class Win32Reader( VolumeReader ):
+    def __init__( self, filename ):
+        super(Win32Reader, self).__init__( filename )
+        self._fd = win32file.CreateFile( filename,
+                        win32file.GENERIC_READ,
+                        win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE,
+                        None,
+                        win32file.OPEN_EXISTING,
+                        win32file.FILE_ATTRIBUTE_NORMAL,
+                        None)
+        self._sector_size = SECTOR_ALIGNMENT
+
+    def set_sector_size( self, sector_size ):
+        if sector_size > 0:
+            self._sector_size = sector_size
+
+    def view( self, offset, size ):
+        start = offset - offset % self._sector_size
+        end = offset + size
+        end += -end % self._sector_size
+        win32file.SetFilePointer( self._fd, start, win32file.FILE_BEGIN)
+        buf = win32file.ReadFile( self._fd, end - start )[1]
+        if start == offset and len(buf) <= size:
+            return buf
+        if offset - start >= len(buf):
+            return ''
+        return buffer( buf, offset - start, size )
+
+    def close( self ):
+        self._fd.Close()
+
+####################################################################################
+# open_volume: Returns the best reader for the target.
+#       filename: The live volume (\\.\C:), image file or block device
+#       useWin32: True for live volumes
+#       Images are memory mapped when possible. Falls back to FileReader when the
+#       mapping fails, for example an image larger than the address space on 32 bit.
+####################################################################################
+def open_volume( filename, useWin32=False, logger=None ):
+    if useWin32 == True:
+        return Win32Reader( filename )
+    try:
+        return MmapReader( filename )
+    except (EnvironmentError, ValueError, OverflowError), e:
+        if not logger == None:
+            logger.debug( "mmap of %s failed (%s). Using file reads" % ( filename, e ))
+    return FileReader( filename )
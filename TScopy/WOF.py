@@ -0,0 +1,159 @@
+"""
+Windows Overlay Filter (WOF) compressed files, the CompactOS compression of Windows 10.
+
+The unnamed $DATA stream of such a file is empty, only its size is the size of the
+file. A reparse point tagged IO_REPARSE_TAG_WOF names the algorithm and the data is
+in the WofCompressedData alternate data stream:
+    chunk table: The offset of the end of every chunk but the last, 4 bytes each or
+          8 when the file is larger than 4GB, relative to the end of the table
+    chunks: The file cut into chunks of the chunk size of the algorithm, compressed
+          on their own. A chunk as large as its uncompressed size is stored as is
+Chunks are independent so they are decompressed in batches on a process pool, the
+decoders are pure Python and would hold the GIL in threads.
+"""
+import struct
+from multiprocessing import Pool, cpu_count
+import XPRESS
+import LZX
+
+IO_REPARSE_TAG_WOF = 0x80000017
+WOF_PROVIDER_FILE = 2
+# Name of the alternate data stream holding the compressed data
+WOF_STREAM_NAME = 'WofCompressedData'
+
+ALGORITHM_XPRESS4K = 0
+ALGORITHM_LZX = 1
+ALGORITHM_XPRESS8K = 2
+ALGORITHM_XPRESS16K = 3
+ALGORITHM_NAMES = { ALGORITHM_XPRESS4K: 'XPRESS4K', ALGORITHM_LZX: 'LZX',
+                    ALGORITHM_XPRESS8K: 'XPRESS8K', ALGORITHM_XPRESS16K: 'XPRESS16K' }
+CHUNK_SIZES = { ALGORITHM_XPRESS4K: 0x1000, ALGORITHM_LZX: 0x8000,
+                ALGORITHM_XPRESS8K: 0x2000, ALGORITHM_XPRESS16K: 0x4000 }
+
+# Uncompressed bytes decompressed by one task on the pool
+WOF_TASK_SIZE = 0x40000
+# Tasks of one file queued on the pool before the writer waits for the oldest
+WOF_INFLIGHT = 8
+
+####################################################################################
+# reparse_algorithm: Returns the algorithm of a WOF reparse point, None when buf is
+#       another kind of reparse point or a WOF reparse point of another provider
+#       buf: Value of the $REPARSE_POINT attribute
+####################################################################################
+def reparse_algorithm( buf ):
+    if len(buf) < 24:
+        return None
+    tag, length, reserved, version, provider, file_version, algorithm = struct.unpack_from( '<IHHIIII', buf, 0 )
+    if not tag == IO_REPARSE_TAG_WOF or not provider == WOF_PROVIDER_FILE:
+        return None
+    if not algorithm in CHUNK_SIZES:
+        raise Exception( "WOF", "Unknown WOF algorithm %d" % algorithm )
+    return algorithm
+
+####################################################################################
+# table_size: Size of the chunk table of a file of size bytes
+####################################################################################
+def table_size( size, algorithm ):
+    chunk_size = CHUNK_SIZES[algorithm]
+    num_chunks = ( size + chunk_size - 1 ) // chunk_size
+    if num_chunks < 2:
+        return 0
+    return ( num_chunks - 1 ) * ( 8 if size > 0xffffffff else 4 )
+
+####################################################################################
+# chunk_table: Returns [(offset in the WofCompressedData stream, compressed size,
+#       size)] of every chunk
+#       buf: The chunk table, table_size() bytes from the start of the stream
+#       size: Size of the file
+#       data_size: Size of the WofCompressedData stream
+####################################################################################
+def chunk_table( buf, size, algorithm, data_size ):
+    chunk_size = CHUNK_SIZES[algorithm]
+    num_chunks = ( size + chunk_size - 1 ) // chunk_size
+    table_len = table_size( size, algorithm )
+    if len(buf) < table_len:
+        raise Exception( "WOF", "Truncated chunk table" )
+    entry = 'Q' if size > 0xffffffff else 'I'
+    ends = list( struct.unpack_from( '<%d%s' % ( num_chunks - 1, entry ), buf, 0 )) if num_chunks > 1 else []
+    ends.append( data_size - table_len )
+    ret = []
+    start = 0
+    for n in xrange( num_chunks ):
+        if ends[n] < start or table_len + ends[n] > data_size:
+            raise Exception( "WOF", "Invalid chunk table entry %d" % n )
+        ret.append( (table_len + start, ends[n] - start, min( chunk_size, size - n * chunk_size )) )
+        start = ends[n]
+    return ret
+
+####################################################################################
+# decompress_chunk: Decompresses one chunk
+#       buf: The compressed chunk
+#       size: Size of the chunk once decompressed
+####################################################################################
+def decompress_chunk( algorithm, buf, size ):
+    if len(buf) == size:
+        return str( buf )
+    if algorithm == ALGORITHM_LZX:
+        return LZX.decompress( buf, size )
+    return XPRESS.decompress( buf, size )
+
+####################################################################################
+# _decompress_chunks: Runs on the pool. Decompresses a batch of chunks
+#       chunks: [(compressed chunk, size)]
+####################################################################################
+def _decompress_chunks( algorithm, chunks ):
+    return ''.join( [ decompress_chunk( algorithm, buf, size ) for buf, size in chunks ] )
+
+####################################################################################
+# decompress_pool: Process pool the chunks are decompressed on
+#       workers: Number of processes. None uses one per CPU, 1 decompresses in the
+#                calling thread and returns None
+####################################################################################
+def decompress_pool( workers=None ):
+    if workers == None or workers < 1:
+        workers = cpu_count()
+    if workers == 1:
+        return None
+    return Pool( workers )
+
+####################################################################################
+# ChunkWriter: Writes the decompressed chunks of one file to fd_out in order. Batches
+#       of chunks are decompressed on the pool while the caller reads the next ones.
+#       close() waits for the batches still on the pool, fd_out is left open
+#       pool: See decompress_pool
+####################################################################################
+class ChunkWriter( object ):
+    def __init__( self, fd_out, algorithm, pool ):
+        self._fd_out = fd_out
+        self._algorithm = algorithm
+        self._pool = pool
+        self._batch = []
+        self._batch_size = 0
+        self._results = []
+
+    ####################################################################################
+    # write: Adds the next chunk of the file
+    #       buf: The compressed chunk
+    #       size: Size of the chunk once decompressed
+    ####################################################################################
+    def write( self, buf, size ):
+        self._batch.append( (buf, size) )
+        self._batch_size += size
+        if self._batch_size >= WOF_TASK_SIZE:
+            self.__submit()
+
+    def __submit( self ):
+        if len(self._batch) == 0:
+            return
+        batch, self._batch, self._batch_size = self._batch, [], 0
+        if self._pool == None:
+            self._fd_out.write( _decompress_chunks( self._algorithm, batch ))
+            return
+        self._results.append( self._pool.apply_async( _decompress_chunks, ( self._algorithm, batch )))
+        while len(self._results) > WOF_INFLIGHT:
+            self._fd_out.write( self._results.pop(0).get() )
+
+    def close( self ):
+        self.__submit()
+        while len(self._results) > 0:
+            self._fd_out.write( self._results.pop(0).get() )
@@ -0,0 +1,151 @@
+"""
+XPRESS Huffman (LZ77+Huffman of MS-XCA), the compression of the WOF XPRESS4K,
+XPRESS8K and XPRESS16K formats.
+
+The data is blocks of up to 65536 bytes of output. Each block starts with 256 bytes
+holding the 4 bit code lengths of its 512 Huffman symbols followed by a bitstream
+read 16 bits (little endian) at a time, most significant bit first:
+    symbol < 256: A literal byte
+    symbol >= 256: A match. The low 4 bits are the length - 3, 15 meaning the length
+          follows as a byte, or as a word after a 255 byte, in the byte stream. The
+          high 4 bits are the number of offset bits that follow in the bitstream
+          under an implied leading 1
+Huffman symbols are decoded with one table lookup on the next max code length bits.
+
+On Windows decompress() uses RtlDecompressBufferEx from ntdll.
+"""
+import os
+import struct
+
+NUM_SYMBOLS = 512
+BLOCK_SIZE = 0x10000
+MAX_CODE_LENGTH = 15
+COMPRESSION_FORMAT_XPRESS_HUFF = 4
+
+_rtl_decompress = None
+if os.name == "nt":
+    try:
+        import ctypes
+        _rtl_decompress = ctypes.windll.ntdll.RtlDecompressBufferEx
+        _rtl_workspace_size = ctypes.windll.ntdll.RtlGetCompressionWorkSpaceSize
+    except:
+        _rtl_decompress = None
+
+####################################################################################
+# decode_table: Canonical Huffman decoding table, shared with LZX. Codes are handed
+#       out by increasing length then symbol. Returns (table bits, table) where the
+#       entry for the next table bits of the stream is symbol << 5 | code length.
+#       Bit patterns of an incomplete code are left None
+#       lengths: Code length of every symbol, 0 for unused symbols
+####################################################################################
+def decode_table( lengths, max_length ):
+    table_bits = max( lengths ) if len(lengths) > 0 else 0
+    if table_bits == 0:
+        return 0, [ None ]
+    if table_bits > max_length:
+        raise Exception( "HUFFMAN", "Code length %d is longer than %d" % ( table_bits, max_length ))
+    table = [ None ] * ( 1 << table_bits )
+    code = 0
+    code_length = 0
+    for length, symbol in sorted( [ (x, n) for n, x in enumerate( lengths ) if x > 0 ] ):
+        code <<= length - code_length
+        code_length = length
+        fill = 1 << ( table_bits - length )
+        start = code * fill
+        if start + fill > len(table):
+            raise Exception( "HUFFMAN", "Over subscribed code" )
+        table[start:start + fill] = [ symbol << 5 | length ] * fill
+        code += 1
+    return table_bits, table
+
+####################################################################################
+# decompress: Decompresses one WOF chunk
+#       buf: The compressed chunk
+#       size: Size of the chunk once decompressed
+####################################################################################
+def decompress( buf, size ):
+    if not _rtl_decompress == None:
+        return _decompress_rtl( buf, size )
+    return _decompress_python( buf, size )
+
+def _decompress_rtl( buf, size ):
+    buf = str( buf )
+    workspace_size = ctypes.c_ulong( 0 )
+    fragment_size = ctypes.c_ulong( 0 )
+    _rtl_workspace_size( COMPRESSION_FORMAT_XPRESS_HUFF, ctypes.byref( workspace_size ), ctypes.byref( fragment_size ))
+    workspace = ctypes.create_string_buffer( workspace_size.value )
+    out = ctypes.create_string_buffer( size )
+    final = ctypes.c_ulong( 0 )
+    status = _rtl_decompress( COMPRESSION_FORMAT_XPRESS_HUFF, out, size, buf, len(buf), ctypes.byref( final ), workspace )
+    if not status == 0 or not final.value == size:
+        raise Exception( "XPRESS", "RtlDecompressBufferEx failed 0x%08x" % ( status & 0xffffffff ))
+    return out.raw
+
+def _decompress_python( buf, size ):
+    # Reads past the end of the data see zeros
+    buf = bytearray( buf ) + bytearray( 8 )
+    end = len(buf) - 8
+    out = bytearray()
+    pos = 0
+    while len(out) < size:
+        if pos + 256 > end:
+            raise Exception( "XPRESS", "Truncated Huffman table at %d" % pos )
+        lengths = []
+        for byte in buf[pos:pos+256]:
+            lengths.append( byte & 0xf )
+            lengths.append( byte >> 4 )
+        table_bits, table = decode_table( lengths, MAX_CODE_LENGTH )
+        table_shift = 32 - table_bits
+        pos += 256
+        next_bits = ( buf[pos] | buf[pos+1] << 8 ) << 16 | buf[pos+2] | buf[pos+3] << 8
+        pos += 4
+        extra_bits = 16
+        block_end = min( len(out) + BLOCK_SIZE, size )
+        while len(out) < block_end:
+            entry = table[ next_bits >> table_shift ]
+            if entry == None:
+                raise Exception( "XPRESS", "Invalid Huffman code at %d" % pos )
+            length = entry & 0x1f
+            next_bits = ( next_bits << length ) & 0xffffffff
+            extra_bits -= length
+            if extra_bits < 0:
+                next_bits |= ( buf[pos] | buf[pos+1] << 8 ) << -extra_bits
+                extra_bits += 16
+                pos += 2
+            symbol = entry >> 5
+            if symbol < 256:
+                out.append( symbol )
+                continue
+            match_length = symbol & 0xf
+            offset_bits = ( symbol >> 4 ) & 0xf
+            if match_length == 15:
+                match_length = buf[pos]
+                pos += 1
+                if match_length == 255:
+                    match_length = buf[pos] | buf[pos+1] << 8
+                    pos += 2
+                    if match_length == 0:
+                        match_length = struct.unpack_from( '<I', buf, pos )[0]
+                        pos += 4
+                    if match_length < 15:
+                        raise Exception( "XPRESS", "Invalid match length at %d" % pos )
+                    match_length -= 15
+                match_length += 15
+            match_length += 3
+            offset = ( next_bits >> ( 32 - offset_bits )) | ( 1 << offset_bits )
+            next_bits = ( next_bits << offset_bits ) & 0xffffffff
+            extra_bits -= offset_bits
+            if extra_bits < 0:
+                next_bits |= ( buf[pos] | buf[pos+1] << 8 ) << -extra_bits
+                extra_bits += 16
+                pos += 2
+            if offset > len(out):
+                raise Exception( "XPRESS", "Match offset %d before the start of the data" % offset )
+            src = len(out) - offset
+            if offset >= match_length:
+                out += out[src:src+match_length]
+            else:
+                out += ( out[src:] * ( match_length // offset + 1 ))[:match_length]
+        if pos > end + 4:
+            raise Exception( "XPRESS", "Truncated data" )
+    return str( out[:size] )
@@ -7,22 +7,56 @@ This project is based off the work from the following projects:
 # TODO: Currently only processes '\\.\' where RawCopy supported other formats
 import sys
 import os
-import re
+import json
 import pickle
+import struct
+import time
+import threading
 import traceback
 
 from math import ceil
-from BinaryParser import hex_dump, Block
+from multiprocessing.pool import ThreadPool
+from BinaryParser import hex_dump, Block, Layout
 from MFT import INDXException, MFTRecord, ATTR_TYPE, Attribute_List
 from MFT import INDEX_ROOT
+from Volume import open_volume, READ_STEP
+from RunMap import RunMap
+from Hashing import StreamHash, HashingWriter, Manifest
+from Archive import open_archive
+from Compress import CompressingWriter, COMPRESSION_SUFFIX, compression_methods, compression_pool
+from Stats import PerfStats
+from DirCache import DirectoryCache
+from Session import VolumeSession
+from Fixup import apply_fixups_batch
+from Index import UpCase, IndexLookupError, find_entry
+import Index
+from Glob import GlobTrie, is_glob
+from Targets import load_profile
+from Filter import FileFilter
+from Timeline import DirectoryPaths, TIMELINE_FORMATS, long_names, record_times, timeline_writer, write_record
+import MFTBatch
+import LZNT1
+import WOF
 
 if os.name == "nt":
     try:
-        import win32file, win32api, win32con
+        import msvcrt
+        import win32file, win32api
     except:
         print "Must have pywin32 installed -- pip install pywin32"
         sys.exit(1)
 
+# Size of the sequential reads used when streaming the whole $MFT
+MFT_SCAN_CHUNK = 0x400000
+# Output files kept open by each writer while carrying out a disk order plan
+PLAN_OPEN_FILES = 64
+# FSCTL_SET_SPARSE, marks an output file sparse on Windows so skipped ranges stay holes
+FSCTL_SET_SPARSE = 0x000900c4
+# Magic number of the index blocks of INDEX_ALLOCATION attributes, 'INDX'
+INDX_MAGIC = 0x58444e49
+# Attribute header flag of LZNT1 compressed attributes
+ATTR_FLAG_COMPRESSED = 0x0001
+
 ####################################################################################
 # BootSector structure
 #   https://flatcap.org/linux-ntfs/ntfs/files/boot.html
@@ -55,6 +89,11 @@ class BootSector(Block):
             self.mft_record_size = self.bytes_per_cluster * self.file_rec_indicator()
             
         self.sectors_per_mft_record = self.mft_record_size / self.bytes_per_sector()
+        # Same encoding for the size of the INDX blocks of the directory indexes
+        if self.idx_buf_size_indicator() > 127:
+            self.index_block_size = 1 << (256 - self.idx_buf_size_indicator())
+        else:
+            self.index_block_size = self.bytes_per_cluster * self.idx_buf_size_indicator()
         self.cluster_per_file_record_segment = int(ceil(float(self.mft_record_size) / self.bytes_per_cluster))
         
 
@@ -63,57 +102,53 @@ class BootSector(Block):
 #     https://flatcap.org/linux-ntfs/ntfs/concepts/index_record.html 
 ####################################################################################
 class INDX( Block ):
+    LAYOUT = Layout( ("dword", "magic", 0x0),
+                     ("word", "update_seq_offset", 0x4),
+                     ("word", "update_seq_sz", 0x6),
+                     ("qword", "logfile_seq_num", 0x8),
+                     ("qword", "VCN_INDX", 0x10),
+                     ("dword", "index_entries_offset", 0x18),
+                     ("dword", "index_entries_sz", 0x1c),
+                     ("dword", "alloc_sz", 0x20),
+                     ("byte", "leaf_node", 0x24),
+                     ("word", "update_seq", 0x28) )
+
     def __init__(self, buf, offset ):
         super(INDX, self).__init__(buf, offset)
-        self.declare_field("dword", "magic", 0x0)
-        self.declare_field("word", "update_seq_offset", 0x4)
-        self.declare_field("word", "update_seq_sz", 0x6)
-        self.declare_field("qword", "logfile_seq_num", 0x8)
-        self.declare_field("qword", "VCN_INDX", 0x10)
-        self.declare_field("dword", "index_entries_offset", 0x18)
-        self.declare_field("dword", "index_entries_sz", 0x1c)
-        self.declare_field("dword", "alloc_sz", 0x20)
-        self.declare_field("byte", "leaf_node", 0x24)
-        self.declare_field("word", "update_seq", 0x28)
-        s = self.update_seq_sz()
-
-    def update_seq_arr( self, idx_buf ):
-        # TODO: Clean this up into a for loop
-        seq_arr = idx_buf[self.update_seq_offset()+2:self.update_seq_offset()+2+self.update_seq_sz()*2]
-        ret  = idx_buf[0x0000:0x01fe] + seq_arr[0x00:0x2]
-        ret += idx_buf[0x0200:0x03fe] + seq_arr[0x02:0x4]
-        ret += idx_buf[0x0400:0x05fe] + seq_arr[0x04:0x6]
-        ret += idx_buf[0x0600:0x07fe] + seq_arr[0x06:0x8]
-        ret += idx_buf[0x0800:0x09fe] + seq_arr[0x08:0xa]
-        ret += idx_buf[0x0a00:0x0bfe] + seq_arr[0x0a:0xc]
-        ret += idx_buf[0x0c00:0x0dfe] + seq_arr[0x0c:0xe]
-        ret += idx_buf[0x0e00:0x0ffe] + seq_arr[0x0e:0x10]
-        ret += idx_buf[0x1000:      ] 
-        return ret
+        self.apply_layout( INDX.LAYOUT )
+
+    # Size of the index block, the entries are allocated from 0x18
+    def block_size( self ):
+        return self.alloc_sz() + 0x18
 
 ####################################################################################
 #  NTFS INDX Entry Structure
 #     https://flatcap.org/linux-ntfs/ntfs/concepts/index_entry.html
 ####################################################################################
 class INDX_ENTRY( Block ):
+    HEADER = Layout( ("qword", "mft_recordnum", 0),
+                     ("word", "entry_sz", 0x08 ) )
+    ENTRY = Layout( ("word", "filename_offset", 0x0a ),
+                    ("word", "index_flags", 0x0c ),
+                    ("qword", "mft_parent_recordnum", 0x10 ),
+                    ("qword", "alloc_sz", 0x38 ),
+                    ("qword", "file_sz", 0x40 ),
+                    ("qword", "file_flags", 0x48 ),
+                    ("byte", "filename_sz", 0x50 ) )
+
     def __init__(self, buf, offset):
         super(INDX_ENTRY, self).__init__(buf, offset)
-        self.declare_field("qword", "mft_recordnum", 0)
-        self.declare_field("word", "entry_sz", 0x08 )
+        self.apply_layout( INDX_ENTRY.HEADER )
         if self.entry_sz() == 0x18 and self.mft_recordnum() == 0:
             raise INDXException("End of INDX File found")
         if self.entry_sz() == 0x10 and self.mft_recordnum() == 0:
             raise INDXException("End of INDX File found")
         if self.entry_sz() == 0x00 and self.mft_recordnum() == 0:
             raise INDXException("NULLS INDX File found")
-        self.declare_field("word", "filename_offset", 0x0a )
-        self.declare_field("word", "index_flags", 0x0c )
-        self.declare_field("qword", "mft_parent_recordnum", 0x10 )
-        self.declare_field("qword", "alloc_sz", 0x38 )
-        self.declare_field("qword", "file_sz", 0x40 )
-        self.declare_field("qword", "file_flags", 0x48 )
-        self.declare_field("byte", "filename_sz", 0x50 )
-        self.declare_field("binary", "filename", 0x52, self.filename_sz()*2 )
+        self.apply_layout( INDX_ENTRY.ENTRY )
+
+    def filename( self ):
+        return self.unpack_binary( 0x52, self.filename_sz()*2 )
 
 
 ####################################################################################
@@ -124,6 +159,7 @@ class INDX_ENTRY( Block ):
 #       tscopy = TScopy()
 #       tscopy.setConfiguration( config )
 #       tscopy.copy( src, dst )
+#       log.info( json.dumps( tscopy.getStats() ))
 #
 #     * Config key descriptions
 #       - outputbasedir : The FULL PATH of directory where the files will be copied too.
@@ -132,7 +168,39 @@ class INDX_ENTRY( Block ):
 #       - debug : Not used
 #       - ignore_table: 
 #           * True  = Rebuilds the MFT table from the root node and does not save the table at the end of the run
-#           * False = Uses a previous mft.pickle file if found. Saves the file after every copy.
+#           * False = Uses a previous mft.pickle file if found. Saves the file when the volumes
+#                     are closed, see closeSession.
+#       - image : (Optional) Path to a raw disk/volume image or block device. When set the
+#                 files are copied out of the image instead of the live Windows volumes.
+#                 This is the only mode available on non Windows hosts.
+#       - image_offset : (Optional) Byte offset of the NTFS volume inside the image. When
+#                 None the offset is found from the boot sector, MBR or GPT partition table.
+#       - bulk_scan : (Optional) True streams the entire $MFT once per volume and resolves
+#                 every path, wildcard and directory listing from memory instead of reading 
+#                 the directory indexes. Faster when copying many files.
+#       - workers : (Optional) Number of threads extracting files at the same time. Paths
+#                 are still resolved by the calling thread. Default 1 copies one file at a time
+#       - disk_order : (Optional) True resolves every requested file first and then reads
+#                 all of their data runs sorted by volume offset. See __runPlan
+#       - runlist_sidecar : (Optional) True saves the data runs of every non resident 
+#                 stream to <output file>.runlist.json
+#       - manifest : (Optional) Path of a JSON lines file. The MD5, SHA-1 and SHA-256 of
+#                 every copied stream are computed while it is written and appended to it
+#       - archive : (Optional) Path of a .tar or .zip file. Every stream is written into
+#                 it under its source path instead of the mirrored directory tree. 
+#                 Call close() once done to finish the archive
+#       - compression : (Optional) 'gzip' or 'zstd'. Output files are compressed on a
+#                 thread pool while the next data is read and saved as <file>.gz or 
+#                 <file>.zst. A tar archive is compressed as a whole, zip members are 
+#                 deflated
+#       - compress_workers : (Optional) Number of compression threads. Default one per CPU
+#       - wof_workers : (Optional) Number of processes decompressing the chunks of WOF
+#                 compressed files, the CompactOS binaries of Windows 10. Default one per CPU
+#       - dir_cache_size : (Optional) Number of parsed directory listings kept in memory
+#                 and shared by the path lookups, wildcards and directory copies. 
+#                 0 disables the cache. Default 1024
+#       - filter : (Optional) Filter.FileFilter, only the files matching it are copied.
+#                 Checked on the MFT metadata before any data is read. Default None
 ####################################################################################
 class TScopy( object ):
     _instance = None
@@ -146,6 +214,19 @@ class TScopy( object ):
                             'logger': None,
                             'debug': True,
                             'ignore_table':False,
+                            'image': None,
+                            'image_offset': None,
+                            'bulk_scan': False,
+                            'workers': 1,
+                            'disk_order': False,
+                            'runlist_sidecar': False,
+                            'manifest': None,
+                            'archive': None,
+                            'compression': None,
+                            'compress_workers': None,
+                            'wof_workers': None,
+                            'dir_cache_size': 1024,
+                            'filter': None,
                           }
             cls.__useWin32 = False
         return cls._instance
@@ -164,12 +245,45 @@ class TScopy( object ):
         if self.__isConfigured == True:
             return
         self.__MFT_lookup_table = None
+        self.__mft_index = {}
+        self.__upcase = {}
+        self.__dir_cache = DirectoryCache()
+        self.__sessions = {}
+        self.__pool = None
+        self.__plan = []
+        self.__plan_hashes = []
+        self.__manifest = None
+        self.__archive = None
+        self.__compress_pool = None
+        self.__wof_pool = None
+        self.__plan_streams = []
+        self.__local = threading.local()
+        self.__worker_fds = []
+        self.__worker_lock = threading.Lock()
+        self.__stats = PerfStats()
         self.__isConfigured = True
         self.setDebug( config['debug'] )
         self.setLogger( config['logger'] )
         self.setLookupTable( config['ignore_table'] )
         self.setPickleDir( config['pickledir'] )
+        self.setImage( config.get('image'), config.get('image_offset') )
+        self.setBulkScan( config.get('bulk_scan', False) )
+        self.setWorkers( config.get('workers', 1) )
+        self.setDiskOrder( config.get('disk_order', False) )
+        self.setRunlistSidecar( config.get('runlist_sidecar', False) )
+        self.setManifest( config.get('manifest') )
+        self.setCompression( config.get('compression'), config.get('compress_workers') )
+        self.setArchive( config.get('archive') )
+        self.setWofWorkers( config.get('wof_workers') )
+        self.setDirCache( config.get('dir_cache_size', 1024) )
+        self.setFilter( config.get('filter') )
+
 
+    ####################################################################################
+    # getStats: The counters and phase times of the copies done so far. See Stats.PerfStats
+    ####################################################################################
+    def getStats( self ):
+        return self.__stats.summary()
 
     ####################################################################################
     # SetLogger:  Sets the class object logger variable
@@ -192,6 +306,128 @@ class TScopy( object ):
     def setLookupTable( self, tf ):
         self.config['ignore_table'] = tf
 
+    ####################################################################################
+    # setImage: Sets the raw image or block device to copy from instead of the live volumes
+    #       image: Path to the image. None copies from the live Windows volumes
+    #       offset: Byte offset of the NTFS volume in the image. None to detect it
+    ####################################################################################
+    def setImage( self, image, offset=None ):
+        if not image == None and not os.path.exists( image ):
+            self.config['logger'].error("Error image (%s) not found" % image)
+            raise Exception( "TSCOPY", "Error image (%s) not found" % image)
+        self.config['image'] = image
+        self.config['image_offset'] = offset
+
+    ####################################################################################
+    # setBulkScan: Sets the class object bulk_scan. See __scanMFT
+    ####################################################################################
+    def setBulkScan( self, tf ):
+        self.config['bulk_scan'] = tf
+
+    ####################################################################################
+    # setWorkers: Sets the number of extraction threads. See __startWorkers
+    ####################################################################################
+    def setWorkers( self, workers ):
+        if workers == None or workers < 1:
+            workers = 1
+        self.config['workers'] = int(workers)
+
+    ####################################################################################
+    # setDiskOrder: Sets the class object disk_order. See __runPlan
+    ####################################################################################
+    def setDiskOrder( self, tf ):
+        self.config['disk_order'] = tf
+
+    ####################################################################################
+    # setRunlistSidecar: Sets the class object runlist_sidecar. See __write_runlist
+    ####################################################################################
+    def setRunlistSidecar( self, tf ):
+        self.config['runlist_sidecar'] = tf
+
+    ####################################################################################
+    # setManifest: Opens the hash manifest. None disables hashing. See Hashing.Manifest
+    ####################################################################################
+    def setManifest( self, filename ):
+        if not self.__manifest == None:
+            self.__manifest.close()
+            self.__manifest = None
+        self.config['manifest'] = filename
+        if not filename == None:
+            self.__manifest = Manifest( filename )
+
+    ####################################################################################
+    # setArchive: Opens the tar or zip file the copied streams are written to. None writes
+    #       the mirrored directory tree under the output directory. A compressed tar file
+    #       gets the suffix of the compression. See Archive.open_archive
+    ####################################################################################
+    def setArchive( self, filename ):
+        if not self.__archive == None:
+            self.__archive.close()
+            self.__archive = None
+        self.config['archive'] = filename
+        if not filename == None:
+            self.__archive = open_archive( filename, self.config['compression'], self.__compress_pool )
+            self.config['logger'].info("Writing the copied files to the archive %s" % self.__archive.filename)
+
+    ####################################################################################
+    # setCompression: Sets the compression method and starts its thread pool. None writes
+    #       the data as read. Must be set before the archive. See Compress.CompressingWriter
+    ####################################################################################
+    def setCompression( self, method, workers=None ):
+        if not method == None and not method in compression_methods():
+            self.config['logger'].error("Compression %s is not available" % method)
+            raise Exception( "TSCOPY", "Compression %s is not available" % method)
+        if not self.__compress_pool == None:
+            self.__compress_pool.close()
+            self.__compress_pool.join()
+            self.__compress_pool = None
+        self.config['compression'] = method
+        self.config['compress_workers'] = workers
+        if not method == None:
+            self.__compress_pool = compression_pool( workers )
+
+    ####################################################################################
+    # setWofWorkers: Sets the number of WOF decompression processes. The pool is started
+    #       by the first WOF compressed file. See WOF.decompress_pool
+    ####################################################################################
+    def setWofWorkers( self, workers ):
+        if not self.__wof_pool == None:
+            self.__wof_pool.close()
+            self.__wof_pool.join()
+            self.__wof_pool = None
+        self.config['wof_workers'] = workers
+
+    ####################################################################################
+    # setDirCache: Sets the number of directory listings kept by the DirectoryCache.
+    #       0 disables the cache
+    ####################################################################################
+    def setDirCache( self, size ):
+        if size == None or size < 0:
+            size = 0
+        self.config['dir_cache_size'] = int(size)
+        self.__dir_cache.maxsize = self.config['dir_cache_size']
+        if self.config['dir_cache_size'] == 0:
+            self.__dir_cache.clear()
+
+    ####################################################################################
+    # setFilter: Sets the Filter.FileFilter of the files to copy, None copies every file
+    ####################################################################################
+    def setFilter( self, file_filter ):
+        if not file_filter == None and not isinstance( file_filter, FileFilter ):
+            raise Exception( "TSCOPY", "Invalid filter %r" % ( file_filter, ))
+        self.config['filter'] = file_filter
+
+    ####################################################################################
+    #  close: Closes the open volumes, see closeSession, and finishes the archive and the
+    #       manifest. Nothing can be copied to them after
+    ####################################################################################
+    def close( self ):
+        self.closeSession()
+        self.setArchive( None )
+        self.setManifest( None )
+        self.setCompression( None )
+        self.setWofWorkers( self.config['wof_workers'] )
+
     ####################################################################################
     #  setPickleDir: Sets the output directory to save the mft.pickle file too
     ####################################################################################
@@ -232,10 +468,6 @@ class TScopy( object ):
         fd = self.config['fd']
         bss = self.config['bss']
         mft_offset = bss.bytes_per_sector() * bss.sectors_per_cluster() * bss.start_c_mft()
-        if self.__useWin32 == False:
-            mft_offset = 0x400
-#        win32file.SetFilePointer( fd, mft_offset+(index*bss.mft_record_size ), win32file.FILE_BEGIN)
-#        buf = win32file.ReadFile( fd, bss.mft_record_size )[1]
         buf, buf_sz = self.__read( fd, mft_offset+(index*bss.mft_record_size ), bss.mft_record_size )
         record = MFTRecord(buf, 0, None)
         ret = {}
@@ -262,46 +494,164 @@ class TScopy( object ):
         return ret
 
     ####################################################################################
-    #  __GenRefArray: Iterates through the seq_num 5 datadruns 
+    #  __GenRefArray: Finds the MFT records that are split across two or more of the $MFT
+    #           data runs. Saved as {record number: [(volume offset, size)]} in split_mft_rec
+    #           so __calcOffset can check a record with a single lookup
     ####################################################################################
     def __GenRefArray( self ):
-        MFTClustersToKeep = 0
-        ref = -1
+        self.config['split_mft_rec'] = self.config['mft_runmap'].split_records( self.config['bss'].mft_record_size )
+
+    ####################################################################################
+    #  __iterMFT: Streams the entire $MFT through its data runs in MFT_SCAN_CHUNK reads.
+    #           Yields (first record number, buffer, record count) for each chunk of whole
+    #           records. Records that straddle two data runs are joined before being yielded
+    ####################################################################################
+    def __iterMFT( self ):
+        fd = self.config['fd']
+        bss = self.config['bss']
+        bpc = bss.bytes_per_cluster
+        rec_sz = bss.mft_record_size
+        chunk_sz = MFT_SCAN_CHUNK - (MFT_SCAN_CHUNK % rec_sz)
+
+        buf, buf_sz = self.__calcOffset( 0 )
+        remaining = MFTRecord(buf, 0, None).data_attribute().data_size()
         dataruns = self.config['mft_dataruns']
-        bytes_per_cluster = self.config['bss'].bytes_per_cluster 
-        ClustersPerFileRecordSegment = self.config['bss'].cluster_per_file_record_segment 
-        split_mft_rec = {} 
-        cnt = 0
-        for x in dataruns:
-            r = dataruns[x]
-            doKeepCluster = MFTClustersToKeep
-            MFTClustersToKeep = (r[1]+ClustersPerFileRecordSegment - MFTClustersToKeep) % ClustersPerFileRecordSegment
-            if not MFTClustersToKeep == 0:
-                MFTClustersToKeep = ClustersPerFileRecordSegment - MFTClustersToKeep
-            pos = r[0] * bytes_per_cluster 
-            subtr = self.config['bss'].mft_record_size 
-            if  MFTClustersToKeep or doKeepCluster:
-                subtr = 0
-            end_of_run = r[1] * bytes_per_cluster - subtr
-            for i in range(0, end_of_run, self.config['bss'].mft_record_size):
-                if MFTClustersToKeep:
-                    if i >= end_of_run - ((ClustersPerFileRecordSegment - MFTClustersToKeep) * bytes_per_cluster):
-                        bytesToGet = (ClustersPerFileRecordSegment - MFTClustersToKeep) * bytes_per_cluster
-                        split_mft_rec[cnt] = '%d?%d,%d' % (ref+1, pos+i, bytesToGet )
-                ref += 1
-                if i == 0 and doKeepCluster:
-                    bytesToGet = doKeepCluster * bytes_per_cluster
-                    if bytesToGet > self.config['bss'].mft_record_size:
-                        bytesToGet = self.config['bss'].mft_record_size 
-                    split_mft_rec[cnt] += '|%d&%d' % ( pos+i, bytesToGet )
-                cnt += 1
-        self.config['split_mft_rec'] = split_mft_rec
-
-    ####################################################################################
-    #  __process_image: TODO 
+        recnum = 0
+        pending = ''
+        for x in sorted(dataruns):
+            cluster_offset, length = dataruns[x]
+            pos = 0
+            while pos < length*bpc and remaining > 0:
+                step = min( chunk_sz, length*bpc - pos, remaining )
+                buf, buf_sz = self.__read( fd, cluster_offset*bpc + pos, step )
+                if buf_sz == 0:
+                    return
+                pos += step
+                remaining -= step
+                if not pending == '':
+                    buf = pending + buf[:]
+                    pending = ''
+                count = len(buf) / rec_sz
+                if not len(buf) == count*rec_sz:
+                    pending = buf[count*rec_sz:]
+                if count > 0:
+                    yield recnum, buf, count
+                    recnum += count
+
+    ####################################################################################
+    #  __scanMFT: Builds the parent reference -> children map of the whole volume from the
+    #           $FILE_NAME attributes of every record in one sequential pass of the $MFT.
+    #           __getChildIndex is answered from this map once it exists.
+    #           The map is {directory seq_num: {child seq_num: name}}. Every directory
+    #           has an entry even if it is empty.
+    #           Each chunk is decoded with MFTBatch so only the in use records are looked
+    #           at and no MFTRecord objects are built.
+    ####################################################################################
+    def __scanMFT( self ):
+        start = time.time()
+        rec_sz = self.config['bss'].mft_record_size
+        index = {}
+        records = 0
+        for first, buf, count in self.__iterMFT():
+            batch = MFTBatch.decode_records( buf, count, rec_sz, first )
+            self.__stats.add( 'mft_records_read', count )
+            for i in batch.in_use():
+                try:
+                    seq_num = first + i
+                    if batch.base_record( i ) > 0:
+                        seq_num = batch.base_record( i )
+                    elif batch.is_directory( i ) and not seq_num in index:
+                        index[seq_num] = {}
+                    fns = MFTBatch.filename_attributes( batch.record( i ), batch.attrs_offset[i], batch.bytes_in_use[i] )
+                    for parent, fn_type, name in fns:
+                        # Skip the DOS 8.3 name when the record has a long name as well
+                        if fn_type == 0x2 and len(fns) > 1:
+                            continue
+                        parent = parent & 0xffffffffffff
+                        if parent == seq_num:
+                            continue
+                        if not parent in index:
+                            index[parent] = {}
+                        index[parent][seq_num] = name
+                    records += 1
+                except:
+                    self.config['logger'].debug( 'Failed to parse MFT record %d\n%s' % (first+i, traceback.format_exc()))
+        self.__stats.add( 'mft_records_parsed', records )
+        self.config['logger'].info( 'Scanned %d MFT records (%d directories) in %.2f seconds' % ( records, len(index), time.time()-start ))
+        return index
+
+    ####################################################################################
+    #  __isDirectory: Returns True if the MFT record is a directory. Answered from the bulk
+    #           scan map when there is one, otherwise the record is read
+    ####################################################################################
+    def __isDirectory( self, index ):
+        mft_index = self.__mft_index.get( self.config['driveLetter'] )
+        if not mft_index == None:
+            return index in mft_index
+        buf, buf_sz = self.__calcOffset( index )
+        if buf == None or buf_sz == 0:
+            raise Exception("Failed to process mft_offset")
+        self.__stats.add( 'mft_records_parsed' )
+        return MFTRecord(buf, 0, None).is_directory()
+
+    ####################################################################################
+    #  __process_image: Locates the start of the NTFS volume and saves it as the image_offset
+    #           added to every read. Live volumes always start at 0. For images the
+    #           configured offset is used, otherwise sector 0 is checked for an NTFS boot
+    #           sector and then the MBR or GPT partition entries are searched for the first
+    #           NTFS volume.
+    #       targetDrive: The volume or image being processed
     ####################################################################################
     def __process_image( self, targetDrive ):
-        pass
+        self.config['image_offset_found'] = 0
+        if self.__useWin32 == True:
+            return
+        if not self.config['image_offset'] == None:
+            self.config['image_offset_found'] = int(self.config['image_offset'])
+            return
+
+        sector, sector_sz = self.__read( self.config['fd'], 0, 0x200 )
+        if sector[3:11] == 'NTFS    ':
+            return
+
+        if not sector[0x1fe:0x200] == '\x55\xaa':
+            raise Exception( "TSCOPY", "No NTFS boot sector or partition table found in %s" % targetDrive )
+
+        candidates = []
+        for i in range(4):
+            entry = sector[0x1be+i*0x10:0x1ce+i*0x10]
+            part_type = ord(entry[4])
+            start_lba = struct.unpack('<I', entry[8:12])[0]
+            if part_type == 0xee:
+                candidates.extend( self.__gpt_partitions( ) )
+            elif not part_type == 0 and start_lba > 0:
+                candidates.append( start_lba * 0x200 )
+
+        for offset in candidates:
+            buf, buf_sz = self.__read( self.config['fd'], offset, 0x200 )
+            if buf[3:11] == 'NTFS    ':
+                self.config['logger'].debug( 'NTFS volume found at offset 0x%x in %s' % (offset, targetDrive) )
+                self.config['image_offset_found'] = offset
+                return
+        raise Exception( "TSCOPY", "No NTFS partition found in %s" % targetDrive )
+
+    ####################################################################################
+    #  __gpt_partitions: Returns the byte offsets of the partitions in the GPT partition table
+    #       Assumes 512 byte logical sectors
+    ####################################################################################
+    def __gpt_partitions( self ):
+        ret = []
+        header, header_sz = self.__read( self.config['fd'], 0x200, 0x200 )
+        if not header[:8] == 'EFI PART':
+            return ret
+        entries_lba, num_entries, entry_sz = struct.unpack('<QII', header[0x48:0x58])
+        entries, entries_sz = self.__read( self.config['fd'], entries_lba*0x200, num_entries*entry_sz )
+        for i in range(num_entries):
+            entry = entries[i*entry_sz:(i+1)*entry_sz]
+            if entry[:16] == '\x00'*16:
+                continue
+            ret.append( struct.unpack('<Q', entry[0x20:0x28])[0] * 0x200 )
+        return ret
 
     ####################################################################################
     # __search_mft: Iterates through the target files path, populating the table and seq_path
@@ -315,18 +665,29 @@ class TScopy( object ):
         for name in tmp_path:
             index = table['seq_num']
 #            self.config['logger'].debug('Looking for (%s) MFT_INDEX(%016X)' % (name, index))
-            ret = self.__getChildIndex( index )
-#            self.config['logger'].debug("childindex = %r" % len(ret) )
             tmp_index = index
-            for seq_num in ret:
-                c_index = seq_num & 0xffffffff
-                c_name = ret[seq_num].lower()
-                table['children'][c_name] = { 'name':c_name, 'seq_num':c_index, 'children':{}}
-                if c_name == name.lower():
-                    index = c_index
+            seq_num = self.__lookupChild( index, name )
+            if not seq_num == None:
+                if seq_num > 0:
+                    c_name = name.lower()
+                    if not c_name in table['children']:
+                        table['children'][c_name] = { 'name':c_name, 'seq_num':seq_num, 'children':{}}
+                    index = seq_num
                     seq_path.append( (index, c_name ) )
                     table = table['children'][c_name]
-                    break
+            else:
+                ret = self.__getChildIndex( index )
+#                self.config['logger'].debug("childindex = %r" % len(ret) )
+                for seq_num in ret:
+                    c_index = seq_num & 0xffffffff
+                    c_name = ret[seq_num].lower()
+                    if not c_name in table['children']:
+                        table['children'][c_name] = { 'name':c_name, 'seq_num':c_index, 'children':{}}
+                    if c_name == name.lower():
+                        index = c_index
+                        seq_path.append( (index, c_name ) )
+                        table = table['children'][c_name]
+                        break
             if tmp_index == index:
 #                self.config['logger'].info("%s NOT FOUND" % name)
                 return None, None, None
@@ -345,7 +706,9 @@ class TScopy( object ):
         for name in l_path:
             name = name.lower()
             if not name in table['children']:
+                self.__stats.add( 'lookup_misses' )
                 break
+            self.__stats.add( 'lookup_hits' )
             table = table['children'][name]
             tmp_path = tmp_path[1:]
             seq_path.append( ( table['seq_num'], name ))
@@ -369,11 +732,9 @@ class TScopy( object ):
             for dirs in table['children']:
                 l_table = table['children'][dirs]
                 c_index = l_table['seq_num']
-                buf, buf_sz = self.__calcOffset( c_index )
-                if buf == None or buf_sz == 0:
-                    raise Exception("Failed to process mft_offset")
-                record = MFTRecord(buf, 0, None)
-                if record.is_directory():
+                with self.__stats.phase( 'resolve' ):
+                    is_directory = self.__isDirectory( c_index )
+                if is_directory == True:
                     self.config['logger'].debug( "Next Directory %r  %r %r" % (c_index, dirs, fname))
                     self.config['current_file'] = fname[2:]
                     self.__copydir( os.path.join(fname,dirs), c_index, l_table, bRecursive=True )
@@ -386,16 +747,20 @@ class TScopy( object ):
     ####################################################################################
     def __copydirfiles( self, fname, index, table ):
         self.config['logger'].debug( "copydirfiles \n\tfname:\t%r\n\tindex:\t%r\n\ttable %r" % (fname,index,table))
-        if table['children'] == {}:
-            ret = self.__getChildIndex( index )
+        # Lookups only add the children on their path, the directory is listed once
+        if not table.get( 'complete' ) == True:
+            with self.__stats.phase( 'resolve' ):
+                ret = self.__getChildIndex( index )
             self.config['logger'].debug( "\tchildren: %r" % len(ret))
             for seq_num in ret: 
                 c_index = seq_num & 0xffffffff
                 c_name = ret[seq_num].lower()
-                table['children'][c_name] = { 'name':c_name, 'seq_num':c_index, 'children':{}}
+                if not c_name in table['children']:
+                    table['children'][c_name] = { 'name':c_name, 'seq_num':c_index, 'children':{}}
 
                 if ret[seq_num].strip() == '' or seq_num == 0:
                     continue
+            table['complete'] = True
 
         tmp_filename = self.config['current_file']
         for name in table['children']:
@@ -406,128 +771,310 @@ class TScopy( object ):
             if '*' in fname[2:]+os.sep+name:
                 self.config['current_file'] = tmp_filename+os.sep+name # strip the drive letter off the front
                 
-            self.__getFile( [seq_num&0xffffffff, name] )
+            with self.__stats.phase( 'copy' ):
+                self.__getFile( [seq_num&0xffffffff, name] )
         return table
 
     ####################################################################################
-    #  __copyfile: Internal copy function. Used to setup and parse target filename, locate
-    #           previously identified paths in the mft metadata list. and then copy the file/
-    #           files/ or direcotories
-    #       filename: Full path to the target file/directory or wildcarded to copy
-    #       mft_filename: TODO remove
-    #       bRecursive: 
-    #           True:  Copy all children from this directory on
-    #           False: Do not copy children
+    #  __targetDrive: Returns (volume to open, key of the volume in the MFT metadata table)
+    #           of a source filename
     ####################################################################################
-    def __copyfile( self, filename, mft_filename=None, bRecursive=False ):
+    def __targetDrive( self, filename ):
         if self.__useWin32 == True:
-            self.config['logger'].debug( 'filename %r' % filename)
             if not filename[:4].lower() == '\\\\.\\':
                 targetDrive = '\\\\.\\'+filename[:2]
             else:
                 targetDrive = filename[:6]
-            
-            driveLetter = targetDrive[-2]
-            self.config['logger'].debug( 'Target Drive %s' % targetDrive)
-            self.config['logger'].debug( 'DriveLetter %s' % driveLetter)
+            return targetDrive, targetDrive[-2]
+        return self.config['image'], self.__imageKey()
 
-            self.__process_image( targetDrive ) # TODO process this to determin correct offsets
+    ####################################################################################
+    #  __openSession: Opens the volume, reads its boot sector and the $MFT data runs and
+    #           keeps them in a VolumeSession reused by the next copies from the volume
+    #           until closeSession. The lookup table of the volume is started unless it
+    #           was loaded from the pickle file
+    #       targetDrive: The volume or image to open
+    #       driveLetter: Key of the volume in the MFT metadata table
+    ####################################################################################
+    def __openSession( self, targetDrive, driveLetter ):
+        if self.config['ignore_table'] == True or not driveLetter in self.__MFT_lookup_table:
+            self.__MFT_lookup_table[driveLetter] = {5:{'seq_num':5,'name':'','children':{}}}
+        self.config['driveLetter'] = driveLetter
+        self.config['volume'] = targetDrive
+        self.config['fd'] = None
+        with self.__stats.phase( 'boot_sector' ):
+            fd = self.__open( targetDrive )
+            if fd == None:
+                raise Exception( "TSCOPY", "Failed to open %s" % targetDrive )
+            self.config['fd'] = fd
+            self.__process_image( targetDrive )
+            buf, buf_sz = self.__read( fd, 0, 0x200 ) #        buf = win32file.ReadFile( fd, 0x200)[1]
+            if not buf[3:11] == 'NTFS    ':
+                raise Exception( "TSCOPY", "%s is not an NTFS volume" % targetDrive )
+            self.config['bss'] = BootSector( buf, 0, self.config['logger'] ) 
+            fd.set_sector_size( self.config['bss'].bytes_per_sector() )
+            self.config['mft_dataruns'] = self.__getMFT( 0)
+            self.config['mft_runmap'] = RunMap( [ self.config['mft_dataruns'][x] for x in sorted( self.config['mft_dataruns'] )], 
+                                                self.config['bss'].bytes_per_cluster )
+        with self.__stats.phase( 'gen_ref_array' ):
+            self.__GenRefArray()
+        if self.config['bulk_scan'] == True and not driveLetter in self.__mft_index:
+            with self.__stats.phase( 'scan_mft' ):
+                self.__mft_index[driveLetter] = self.__scanMFT()
+        self.__stats.add( 'volumes_opened' )
+        session = VolumeSession( self.config )
+        self.__sessions[driveLetter] = session
+        return session
 
-            if self.config['ignore_table'] == True:
-                self.__MFT_lookup_table = {driveLetter:{5:{'seq_num':5,'name':'','children':{}}}}
-            elif not driveLetter in self.__MFT_lookup_table.keys():
-                self.__MFT_lookup_table = self.__MFT_lookup_table[driveLetter] = {5:{'seq_num':5,'name':'','children':{}}}
-#            self.config['logger'].debug( 'Target Drive %s' % driveLetter)
+    ####################################################################################
+    #  closeSession: Closes the open volume of the source filename, every open volume when
+    #           None, and saves the lookup table unless ignore_table is set. The next copy
+    #           from a closed volume opens it again and reads its boot sector and $MFT
+    #           data runs again. Called by close()
+    #       filename: A source filename, only its drive is used. Images have one volume
+    ####################################################################################
+    def closeSession( self, filename=None ):
+        if filename == None:
+            driveLetters = self.__sessions.keys()
         else:
-            self.__MFT_lookup_table = {"c":{5:{'seq_num':5,'name':'','children':{}}}}
-            targetDrive = mft_filename
-            driveLetter = "c"
-            self.config['logger'].debug( 'Processing the %s MFT file' % targetDrive )
-
-        self.config['driveLetter'] = driveLetter
-        fd = self.__open( targetDrive )
-        self.config['fd'] = fd
-        buf, buf_sz = self.__read( fd, 0, 0x200 ) #        buf = win32file.ReadFile( fd, 0x200)[1]
-        self.config['bss'] = BootSector( buf, 0, self.config['logger'] ) 
-        self.config['mft_dataruns'] = self.__getMFT( 0)
-        self.__GenRefArray()
+            driveLetters = [ self.__targetDrive( filename )[1] ]
+        if self.config.get('driveLetter') in driveLetters:
+            with self.__stats.phase( 'copy' ):
+                self.__runPlan()
+            self.config['driveLetter'] = None
+            self.config['fd'] = None
+        closed = False
+        for driveLetter in driveLetters:
+            session = self.__sessions.pop( driveLetter, None )
+            if session == None:
+                continue
+            session.close()
+            self.__mft_index.pop( driveLetter, None )
+            self.__upcase.pop( driveLetter, None )
+            self.__dir_cache.drop( driveLetter )
+            closed = True
+        if closed == True and self.config['ignore_table'] == False:
+            self.__saveLookuptable( self.__MFT_lookup_table )
 
-        fname = filename 
-        index = 5
-        
+    ####################################################################################
+    #  __copyfile: Internal copy function. Used to setup and parse target filename, locate
+    #           previously identified paths in the mft metadata list. and then copy the file/
+    #           files/ or direcotories
+    #       filenames: Full paths to the target files/directories or wildcards to copy,
+    #           all on the same volume. They are resolved together, see __planTargets
+    #       bRecursive: 
+    #           True:  Copy all children from this directory on
+    #           False: Do not copy children
+    ####################################################################################
+    def __copyfile( self, filenames, bRecursive=False ):
+        if not type( filenames ) == list:
+            filenames = [ filenames ]
+        self.config['logger'].debug( 'filenames %r' % filenames)
+        targetDrive, driveLetter = self.__targetDrive( filenames[0] )
+        self.config['logger'].debug( 'Target Drive %s' % targetDrive)
+        self.config['logger'].debug( 'DriveLetter %s' % driveLetter)
+
+        # The disk order plan holds offsets of the previous volume
+        if not self.config.get('driveLetter') == driveLetter:
+            with self.__stats.phase( 'copy' ):
+                self.__runPlan()
+        session = self.__sessions.get( driveLetter )
+        if session == None:
+            session = self.__openSession( targetDrive, driveLetter )
+        session.activate( self.config )
+
+        self.__startWorkers( targetDrive )
         try:
-            # Find the last known directory in the MFT_lookup_table
-            seq_path = [(index,None)]
-            tmp_path = fname[3:].split(os.sep)
-            table = self.__MFT_lookup_table[driveLetter][5]
-
-            expandedWildCards = self.__process_wildcards( filename, table )
-            if expandedWildCards == False:
-                cp_files = [ tmp_path ]
-            else:
-                cp_files = expandedWildCards
+            with self.__stats.phase( 'resolve' ):
+                cp_files = self.__planTargets( filenames, bRecursive )
 
-            
-            for cp_file in cp_files:
+            for fname, cp_file in cp_files:
                 self.config['current_file'] = os.sep.join(cp_file) # strip the drive letter off the front
                 l_fname = fname[:3] + self.config['current_file']
                 self.config['logger'].info("Copying %s to %s" % (l_fname, self.config['outputbasedir']+self.config['current_file']))
-                table, tmp_path, seq_path = self.__get_file_mft_seqid( cp_file )
+                with self.__stats.phase( 'resolve' ):
+                    table, tmp_path, seq_path = self.__get_file_mft_seqid( cp_file )
                 
-                # Index was not located exit (error message already logged)
+                # Index was not located, go on with the next file. Only files removed since
+                #   the planning get here
                 if table == None:
-                    self.config['logger'].error("File Not Found"  )
-                    return
+                    self.config['logger'].error("File Not Found %s" % l_fname )
+                    continue
 
                 # Check the mft structure if this is a directory
                 index = seq_path[-1][0]
-                buf, buf_sz = self.__calcOffset( index )
-                if buf == None or buf_sz == 0:
-                    raise Exception("Failed to process mft_offset")
-                record = MFTRecord(buf, 0, None)
-                if record.is_directory():
+                with self.__stats.phase( 'resolve' ):
+                    is_directory = self.__isDirectory( index )
+                if is_directory == True:
                     self.__copydir( l_fname, index, table, bRecursive=bRecursive )
                 else:
-                    self.__getFile( seq_path[-1] )
+                    with self.__stats.phase( 'copy' ):
+                        self.__getFile( seq_path[-1] )
         except:
             self.config['logger'].error(traceback.format_exc())
         finally:
-            if self.config['ignore_table'] == False:
-                self.__saveLookuptable( self.__MFT_lookup_table)                
+            with self.__stats.phase( 'copy' ):
+                self.__stopWorkers()
 
     ####################################################################################
-    # __isSplitMFT: Determines if the MFT record is split
+    #  __getUpCase: The Index.UpCase table of the volume, read once from the $UpCase
+    #       file (MFT record 10). None if it can not be read
     ####################################################################################
-    def __isSplitMFT( self, array, target_seq_num ):
-        for ind in array:
-            i = array[ind]
-            if not '?' in i:
-                continue
-            ind = i.index('?')
-            testRef = i[0:ind]   
-            if int(testRef) == target_seq_num:
-                return ind 
-        return None
+    def __getUpCase( self ):
+        driveLetter = self.config['driveLetter']
+        if driveLetter in self.__upcase:
+            return self.__upcase[driveLetter]
+        upcase = None
+        try:
+            buf, buf_sz = self.__calcOffset( 10 )
+            if not buf == None and buf_sz > 0:
+                self.__stats.add( 'mft_records_parsed' )
+                attribute = MFTRecord( buf, 0, None ).data_attribute()
+                if attribute == None:
+                    pass
+                elif attribute.non_resident() > 0:
+                    runmap = RunMap( attribute.runlist().runs(), self.config['bss'].bytes_per_cluster )
+                    data = []
+                    for volume_offset, length in runmap.extents( 0, min( attribute.data_size(), 0x20000 )):
+                        if volume_offset == None:
+                            raise Exception( "TSCOPY", "Sparse $UpCase" )
+                        data.append( self.__read( self.__fd(), volume_offset, length )[0][:] )
+                    upcase = UpCase( ''.join( data ))
+                else:
+                    upcase = UpCase( attribute.value() )
+        except:
+            self.config['logger'].debug( traceback.format_exc() )
+            upcase = None
+        if upcase == None:
+            self.config['logger'].debug( "$UpCase not read, directories are listed to find the paths" )
+        self.__upcase[driveLetter] = upcase
+        return upcase
+
+    ####################################################################################
+    #  __lookupChild: Finds one name in the $I30 index of a directory by walking down its
+    #       B+-tree, only the INDX blocks on the way to the name are read. See Index
+    #       index: Sequence ID of the directory
+    #       name: The name of the child, compared with the $UpCase table of the volume
+    #       The DirectoryCache is checked first.
+    #       Returns the sequence ID of the child, 0 if the directory does not have it
+    #       and None when the index can not be walked, bulk scanned volumes, indexes
+    #       spread by an attribute list or damaged. Those are found with __getChildIndex
+    ####################################################################################
+    def __lookupChild( self, index, name ):
+        if not self.__mft_index.get( self.config['driveLetter'] ) == None:
+            return None
+        upcase = self.__getUpCase()
+        if upcase == None:
+            return None
+        bpc = self.config['bss'].bytes_per_cluster
+
+        buf, buf_sz = self.__calcOffset( index )
+        if buf == None or buf_sz == 0:
+            raise Exception("Failed to process mft_offset")
+        record = MFTRecord(buf, 0, None)
+        self.__stats.add( 'mft_records_parsed' )
+        if not record.is_directory():
+            return 0
+        # A directory already listed is answered from its listing. Only the listings
+        #   parsed by __getChildIndex count as misses
+        listing = self.__dir_cache.get( ( self.config['driveLetter'], index, record.sequence_number() ))
+        if not listing == None:
+            self.__stats.add( 'dir_cache_hits' )
+            name = name.lower()
+            for seq_num in listing:
+                if listing[seq_num].lower() == name:
+                    return seq_num & 0xffffffff
+            return 0
+        root = None
+        allocation = None
+        for attribute in record.attributes():
+            if attribute.type() == ATTR_TYPE.ATTRIBUTE_LIST:
+                return None
+            elif attribute.type() == ATTR_TYPE.INDEX_ROOT and root == None:
+                root = attribute.value()
+            elif attribute.type() == ATTR_TYPE.INDEX_ALLOCATION and allocation == None:
+                allocation = RunMap( attribute.runlist().runs(), bpc )
+        if root == None:
+            return None
+
+        if isinstance( name, str ):
+            name = name.decode( 'utf-8', 'replace' )
+        key = upcase.key( name )
+        try:
+            block_sz = struct.unpack_from( '<I', root, Index.ROOT_BLOCK_SIZE_OFFSET )[0]
+            # VCNs count clusters, or 512 byte units when the blocks are smaller than a cluster
+            vcn_sz = bpc if block_sz >= bpc else 512
+            self.__stats.add( 'index_lookups' )
+            node_buf, node = root, Index.ROOT_NODE_OFFSET
+            # A B+-tree of a few levels indexes millions of names, deeper is a loop
+            for depth in range( 32 ):
+                reference, child = find_entry( node_buf, node, key, upcase )
+                if not reference == None:
+                    return reference & 0xffffffff
+                if child == None:
+                    return 0
+                if allocation == None:
+                    raise IndexLookupError( "Child node without an $INDEX_ALLOCATION" )
+                node_buf = bytearray()
+                for volume_offset, length in allocation.extents( child*vcn_sz, block_sz ):
+                    if volume_offset == None:
+                        raise IndexLookupError( "INDX block %d is not allocated" % child )
+                    node_buf += self.__read( self.__fd(), volume_offset, length )[0]
+                if not len(node_buf) == block_sz or not apply_fixups_batch( node_buf, 1, block_sz, magic=INDX_MAGIC )[0]:
+                    raise IndexLookupError( "Bad magic or fixups in INDX block %d" % child )
+                self.__stats.add( 'indx_blocks_parsed' )
+                node = Index.INDX_NODE_OFFSET
+            raise IndexLookupError( "Index deeper than 32 levels" )
+        except ( IndexLookupError, struct.error ) as e:
+            self.config['logger'].debug( "Listing 0x%08x, B+-tree lookup failed: %s" % ( index, e ))
+            self.__stats.add( 'index_lookup_fallbacks' )
+            return None
 
     ####################################################################################
     #  __GetChildIndex: Parses the MFT records to find all children of the current sequence ID
     #       index: Sequence ID or seq_num of the current MFT record to extract and parse
+    #       When the volume was bulk scanned the children come from the in memory map.
+    #       Otherwise the listings are kept in the DirectoryCache, only the MFT record is
+    #       read again to check its sequence number
     ####################################################################################
     def __getChildIndex( self, index  ):
-        fd = self.config['fd']
-        bss = self.config['bss']
-        bpc = bss.bytes_per_cluster
+        mft_index = self.__mft_index.get( self.config['driveLetter'] )
+        if not mft_index == None:
+            return dict( mft_index.get( index, {} ))
 
         buf, buf_sz = self.__calcOffset( index )
         if buf == None or buf_sz == 0:
             raise Exception("Failed to process mft_offset")
         record = MFTRecord(buf, 0, None)
+        self.__stats.add( 'mft_records_parsed' )
         if not record.is_directory():
             return []
+        key = ( self.config['driveLetter'], index, record.sequence_number() )
+        listing = self.__dir_cache.get( key )
+        if not listing == None:
+            self.__stats.add( 'dir_cache_hits' )
+            return dict( listing )
+        self.__stats.add( 'dir_cache_misses' )
+        listing = self.__listDirectory( record, index )
+        self.__dir_cache.put( key, listing )
+        return dict( listing )
+
+    ####################################################################################
+    #  __listDirectory: Reads the $I30 index of the directory record. Returns 
+    #       {mft reference: name} of every child. See __getChildIndex
+    ####################################################################################
+    def __listDirectory( self, record, index ):
+        fd = self.config['fd']
+        bss = self.config['bss']
+        bpc = bss.bytes_per_cluster
+
         ret  = {}
+        index_block_size = None
         for attribute in record.attributes():
             if attribute.type() == ATTR_TYPE.INDEX_ROOT:
-                for entry in INDEX_ROOT(attribute.value(), 0).index().entries():
+                index_root = INDEX_ROOT(attribute.value(), 0)
+                index_block_size = index_root.index_record_size_bytes()
+                for entry in index_root.index().entries():
                     refNum = entry.header().mft_reference() & 0xfffffffff
                     if refNum in ret:
                         if "~" in ret[refNum]:
@@ -553,230 +1100,617 @@ class TScopy( object ):
                     self.config['logger'].debug("ATTRIBUTE_LIST index(%d) children (%r) " % (next_index, rec_children) )
                     ret.update( rec_children )
             elif attribute.type() == ATTR_TYPE.INDEX_ALLOCATION:
+                # The runs are joined so blocks split between two runs, or smaller
+                #   than a cluster, are read whole. One copy, fixed up in place
+                idx_buf = bytearray()
                 for cluster_offset, length  in attribute.runlist().runs():
-                    offset=cluster_offset*bpc
-                    buf, buf_sz = self.__read( fd, offset, length*bpc)
-                    for cnt in range(length):
-                        idx_buf = buf[cnt*bpc:(cnt+2)*bpc]
-                        ind = INDX( idx_buf, 0 )
-                        idx_buf = ind.update_seq_arr( idx_buf )
-                        entry_offset = ind.index_entries_offset()+0x18 
-                        i = 0 
-                        last_i = i
-                        while i < ind.index_entries_sz() :
-                            try:
-                                entry  = INDX_ENTRY( idx_buf, entry_offset )
-                                refNum = entry.mft_recordnum() & 0xfffffffff
-                                if refNum in ret:
-                                    if "~" in ret[refNum]:
-                                        ret[refNum] = entry.filename().replace('\x00','')
-                                else:
+                    buf, buf_sz = self.__read( fd, cluster_offset*bpc, length*bpc)
+                    idx_buf += buf
+                block_sz = index_block_size or bss.index_block_size
+                count = len(idx_buf) / block_sz
+                for cnt, fixup_ok in enumerate( apply_fixups_batch( idx_buf, count, block_sz, magic=INDX_MAGIC )):
+                    if fixup_ok == False:
+                        self.config['logger'].debug( 'Skipped INDX block %d of 0x%08x, bad magic or fixups' % ( cnt, index ))
+                        continue
+                    block = cnt*block_sz
+                    ind = INDX( idx_buf, block )
+                    self.__stats.add( 'indx_blocks_parsed' )
+                    entry_offset = block + ind.index_entries_offset()+0x18
+                    i = 0
+                    while i < ind.index_entries_sz() :
+                        try:
+                            entry  = INDX_ENTRY( idx_buf, entry_offset )
+                            refNum = entry.mft_recordnum() & 0xfffffffff
+                            if refNum in ret:
+                                if "~" in ret[refNum]:
                                     ret[refNum] = entry.filename().replace('\x00','')
-                            except   INDXException:
-                                break
-                            except:
-                                self.config['logger'].error(traceback.format_exc())
-                                self.config['logger'].debug( 'len(idx_buf (%03x) entry_offset(%03x)' % ( len(idx_buf), entry_offset))
-                                pass
-                            entry_offset += entry.entry_sz()
-
-                            i += entry.entry_sz()
-                            if entry.entry_sz() == 0:
-                                break
+                            else:
+                                ret[refNum] = entry.filename().replace('\x00','')
+                        except   INDXException:
+                            break
+                        except:
+                            self.config['logger'].error(traceback.format_exc())
+                            self.config['logger'].debug( 'len(idx_buf (%03x) entry_offset(%03x)' % ( len(idx_buf), entry_offset))
+                            pass
+                        entry_offset += entry.entry_sz()
+
+                        i += entry.entry_sz()
+                        if entry.entry_sz() == 0:
+                            break
         return ret
 
     ####################################################################################
     # __calcOffset: Calculates the offset into the drive to locat the specific data 
     #       for the taget sequence Number
     #   target_seq_num: Sequence ID to copy form the disk
+    #       Records inside a single data run are found with a binary search of the $MFT
+    #       run map built once per volume. Returns (None, 0) past the end of the $MFT
     ####################################################################################
     def __calcOffset( self, target_seq_num ):
-        fd = self.config['fd']
+        fd = self.__fd()
         bss = self.config['bss']
-        mft_vcn = self.config['mft_dataruns']
-        image_offset = 0 # TODO: Change this when finished processing the image
-        array = self.config['split_mft_rec']
+        split = self.config['split_mft_rec'].get( target_seq_num )
+        self.__stats.add( 'mft_records_read' )
 
-        # Handle in the case that the object is split accross two dataruns
-        split = self.__isSplitMFT( array, target_seq_num )
+        # Handle in the case that the object is split accross dataruns
         if not split == None:
-#            self.config['logger'].debug( 'calcOffset: a split record was detected' )
-            item = array[split]
-            ind = item.index('?')
-            testRef = item[0:ind]   
-            if not int(testRef) == target_seq_num:
-#                self.config['logger'].debug("Error: The ref in the array did not match target ref.")
-                return None
-            
-            srecord3 = item[ind+1:]
-            srecordArr = srecord3.split('|')
-            if not len( srecordArr ) == 3:
-#                self.config['logger'].debug("Error: Array contained more elements than expected: %d" % len( srecordArr ))
-                return None
-
             record = ""
             record_sz = 0
-            for i in srecordArr:
-                if not ',' in i: 
-#                    self.config['logger'].debug('Split:: Could not find ","')
-                    continue
-                ind = i.index(',')
-                srOffset = i[:ind]
-                srSize   = i[ind+1:]
-#                win32file.SetFilePointer( fd, srOffset + image_offset, win32file.FILE_BEGIN)
-#                record += win32file.ReadFile( fd, srSize)[1]
-                buf, buf_sz = self.__read( fd, srOffset + image_offset, srSize )
-                record  += buf
+            for offset, size in split:
+                if offset == None:
+                    return None, 0
+                buf, buf_sz = self.__read( fd, offset, size )
+                record  += buf[:]
                 record_sz += buf_sz
             return record, record_sz
         else:
-            counter = 0
-            offset = 0
-            recordsdivisor = bss.mft_record_size/512
-            for indx in mft_vcn: 
-                current_cluster = mft_vcn[indx][1]
-                offset = mft_vcn[indx][0]
-                records_in_currentrun = (current_cluster * bss.sectors_per_cluster() ) / recordsdivisor 
-                counter += records_in_currentrun 
-                if counter > target_seq_num:
-                    break
-            tryat = counter - records_in_currentrun
-            records_per_cluster = bss.sectors_per_cluster() / recordsdivisor
-            final = 0
-            counter2 = 0
-            record_jmp = 0
-            while final < target_seq_num:
-                record_jmp += records_per_cluster
-                counter2 += 1
-                final = tryat + record_jmp
-            records_to_much = final - target_seq_num
-
-            mft_offset = image_offset + offset * bss.bytes_per_cluster + ( counter2 * bss.bytes_per_cluster ) - ( records_to_much * bss.mft_record_size )
-#            win32file.SetFilePointer( fd, mft_offset, win32file.FILE_BEGIN)
-#            return win32file.ReadFile( fd, bss.mft_record_size )[1]
-            if self.__useWin32 == False:
-                mft_offset = 0x400 + 0x400*target_seq_num
-#            self.config['logger'].debug('Split:: mft_offset(%r) record_size(%r)' % ( mft_offset, bss.mft_record_size))
-            return self.__read( fd, mft_offset, bss.mft_record_size)
-        return None
-
-    ####################################################################################
-    #  __parse_attribute_data: Processes the files data sections and combines them to 
-    #            create the file.
-    #       attribute: The data attribute from the MFT record 
-    #       Returns the dat content 
-    ####################################################################################
-    def __parse_attribute_data( self, attribute, output_name ):
-        ret = ''
-        fd = self.config['fd']
-        out_name = output_name
-        bpc = self.config['bss'].bytes_per_cluster
-        filename = attribute.name()
-#        import pdb; pdf.set_trace()
-        try:
-            self.config['logger'].debug("Attribute File Name %s" % attribute.name())
-            if attribute.name_length() > 0:
-                out_name += "_ADS_%s" % attribute.name()
-            fd_out = open(out_name, "wb")
-            self.config['logger'].debug("non_resident %r" % attribute.non_resident() )
-            if attribute.non_resident() == 0:
-                fd_out.write( attribute.value() )
-            else:
-                cnt = 0
-                padd = False
-                for cluster_offset, length in attribute.runlist().runs():
-                    read_sz = length * bpc 
-
-                    if cluster_offset == 0: ## Sparsed file segment detected
-                        self.config['logger'].debug("parse_attribute_data:: Sparsed file segment detected  length( %08x ) lengthx4096 (%08x)" % ( length, read_sz))
-                        chunk_sz = 0x1000
-                        chunk = "\x00"*chunk_sz
-                        while cnt < read_sz:
-                            if read_sz-cnt > chunk_sz:
-                                chunk_sz = read_sz-cnt
-                            fd_out.write(chunk[:chunk_sz])
-                            cnt += chunk_sz
-                    else:
-                        self.config['logger'].debug("GetFile:: cluster_offset( %08x ) length( %08x )  " % ( cluster_offset, length))
-                        self.config['logger'].debug("readsize %08x cnt %08x init_sz %08x" % ( read_sz, cnt, attribute.initialized_size()))
-                        if read_sz + cnt > attribute.initialized_size():
-                            read_sz = attribute.initialized_size() - cnt
-                            padd = True
-                        if (read_sz % 0x1000) > 0:
-                            read_sz += 0x1000 - (read_sz%0x1000)
-                        offset=cluster_offset * bpc
-    
-                        self.config['logger'].debug("readsize %08x cnt %08x init_sz %08x" % ( read_sz, cnt, attribute.initialized_size()))
-                        name = ''
-
-                        # Detected ADS
-                        buf, buf_sz = self.__read( fd, offset, read_sz, fd_out )
-    
-                        if attribute.data_size() < cnt + read_sz:
-                            read_sz = attribute.data_size()-cnt
-                        cnt += read_sz
-                            
-                        if padd == True:
-                            padd_sz  = attribute.data_size() - attribute.initialized_size()
-                            ret += '\x00' * padd_sz
-                            cnt += padd_sz
-                        if cnt > attribute.initialized_size():
-    #                        self.config['logger'].debug("readsize %08x cnt %08x init_sz %08x" % ( read_sz, cnt, attribute.initialized_size()))
-                            break
-        except:
-            self.config['logger'].error('Failed to get file %s\n%s' % (filename, traceback.format_exc() ))
+            extents = self.config['mft_runmap'].extents( target_seq_num * bss.mft_record_size, bss.mft_record_size )
+            if not len(extents) == 1 or extents[0][0] == None:
+                return None, 0
+            return self.__read( fd, extents[0][0], bss.mft_record_size )
 
     ####################################################################################
-    # __parse_file_record: Given the sequence ID parse the contents of the file from the 
-    #           MFT and return as a string.
-    #       mft_file_seq_id: The sequence ID of the MFT record to return the data from
+    #  __data_streams: Collects the $DATA attributes of the file, following the attribute
+    #            list into the extension records. A stream split across several extension
+    #            records is put back together by VCN.
+    #       mft_file_seq_id: The sequence ID of the MFT record
+    #       Returns None for directories, otherwise {stream name: stream} where stream is
+    #       {'value': resident data or None, 'size', 'initialized', 'runs': [(vcn, lcn, length)],
+    #        'compression_unit': log2 of the clusters per compression unit, 0 if not compressed,
+    #        'wof': WOF algorithm or None, 'wof_data': the WofCompressedData stream}
+    #       The WofCompressedData stream of a WOF compressed file is moved into the unnamed
+    #       stream. See WOF
     ####################################################################################
-    def __parse_file_record( self, mft_file_seq_id, output_name ):
+    def __data_streams( self, mft_file_seq_id, streams=None ):
         self.config['logger'].debug("parse_fle_record 0x%08x" % mft_file_seq_id)
         buf, buf_sz = self.__calcOffset( mft_file_seq_id )
         if buf == None:
             raise Exception("Failed to process mft_offset")
 
         record = MFTRecord(buf, 0, None)
-        if record.is_directory():
-            return None
+        self.__stats.add( 'mft_records_parsed' )
+        base_record = streams == None
+        if streams == None:
+            if record.is_directory():
+                return None
+            streams = {}
 
-        ret_val = {}
         for attribute in record.attributes():
             self.config['logger'].debug("Parsing Attribute 0x%2x" % attribute.type() )
             if attribute.type() == ATTR_TYPE.ATTRIBUTE_LIST:
-                file_contents = ''
                 self.config['logger'].debug("ATTRIBUTE_LIST HAS BEEN FOUND getting the File 0x(%08x)!!!!" % mft_file_seq_id)
                 attr_list = Attribute_List(attribute.value(), 0, attribute.value_length(), self.config['logger'] )
                 a_list = []
                 for entry in attr_list.get():
-                    if entry.type() == ATTR_TYPE.DATA and not (entry.baseFileReference()&0xffffffff) == mft_file_seq_id:
-                        if not entry.baseFileReference() in a_list:
+                    if entry.type() in ( ATTR_TYPE.DATA, ATTR_TYPE.REPARSE_POINT ) and not (entry.baseFileReference()&0xffffffff) == mft_file_seq_id:
+                        if not entry.baseFileReference() & 0xffffffff in a_list:
                             a_list.append( entry.baseFileReference() & 0xffffffff   )
                 for next_index in a_list:
-                    if mft_file_seq_id == next_index:
-                        continue
-                    # WARNING RECURSION
-                    self.__parse_file_record( next_index, output_name )
+                    self.__data_streams( next_index, streams )
+            elif attribute.type() == ATTR_TYPE.REPARSE_POINT and attribute.non_resident() == 0:
+                algorithm = WOF.reparse_algorithm( attribute.value() )
+                if not algorithm == None:
+                    streams.setdefault( '', self.__new_stream() )['wof'] = algorithm
             elif attribute.type() == ATTR_TYPE.DATA:
-                self.__parse_attribute_data( attribute, output_name )
+                stream = streams.setdefault( attribute.name(), self.__new_stream() )
+                if attribute.non_resident() == 0:
+                    stream['value'] = attribute.value()
+                    stream['size'] = stream['initialized'] = len(stream['value'])
+                    continue
+                # The sizes are only valid in the first extent of the stream
+                if attribute.lowest_vcn() == 0:
+                    stream['size'] = attribute.data_size()
+                    stream['initialized'] = min( attribute.initialized_size(), attribute.data_size() )
+                    if attribute.flags() & ATTR_FLAG_COMPRESSED:
+                        stream['compression_unit'] = attribute.compression_unit()
+                vcn = attribute.lowest_vcn()
+                for cluster_offset, length in attribute.runlist().runs():
+                    stream['runs'].append( (vcn, cluster_offset, length) )
+                    vcn += length
+        if base_record == True:
+            self.__merge_wof( mft_file_seq_id, streams )
+        return streams
+
+    ####################################################################################
+    #  __new_stream: An empty stream. See __data_streams
+    ####################################################################################
+    def __new_stream( self ):
+        return {'value': None, 'size': 0, 'initialized': 0, 'runs': [], 'compression_unit': 0, 'wof': None, 'wof_data': None}
+
+    ####################################################################################
+    #  __merge_wof: Moves the WofCompressedData stream of a WOF compressed file into its
+    #            unnamed stream. Without the compressed data or the size of the file 
+    #            the streams are copied as they are
+    ####################################################################################
+    def __merge_wof( self, mft_file_seq_id, streams ):
+        stream = streams.get( '' )
+        if stream == None or stream['wof'] == None:
+            return
+        if not WOF.WOF_STREAM_NAME in streams or stream['size'] == 0:
+            self.config['logger'].info("WOF compressed file 0x%08x without its data, copying the raw streams" % mft_file_seq_id)
+            stream['wof'] = None
+            return
+        stream['wof_data'] = streams.pop( WOF.WOF_STREAM_NAME )
+
+    ####################################################################################
+    #  __stream_extents: Maps a non resident stream to the reads needed to rebuild it.
+    #       Returns [(volume offset, size)] in file order. The volume offset is None for 
+    #       sparse runs and for the uninitialized end of the stream which read as zeros
+    #       The last read ends with the initialized data, not on a sector. The volume
+    #       reader aligns it for the live volumes, see Volume.Win32Reader
+    ####################################################################################
+    def __stream_extents( self, stream ):
+        ret = self.__stream_runmap( stream ).extents( 0, stream['initialized'] )
+        read = sum( size for offset, size in ret )
+        if read < stream['size']:
+            ret.append( (None, stream['size'] - read) )
+        return ret
+
+    ####################################################################################
+    #  __stream_runmap: RunMap of the data runs of a non resident stream
+    ####################################################################################
+    def __stream_runmap( self, stream ):
+        runs = [ (cluster_offset, length) for vcn, cluster_offset, length in sorted( stream['runs'] ) ]
+        return RunMap( runs, self.config['bss'].bytes_per_cluster )
+
+    ####################################################################################
+    #  __stream_read: Returns size bytes of the stream starting at offset. Sparse runs
+    #            read as zeros. Whole clusters are read and the range is sliced out of
+    #            them, the WOF chunk table and chunks start and end anywhere
+    #       runmap: The __stream_runmap of the stream, None for resident streams
+    ####################################################################################
+    def __stream_read( self, stream, runmap, offset, size ):
+        if not stream['value'] == None:
+            return stream['value'][offset:offset+size]
+        fd = self.__fd()
+        bpc = self.config['bss'].bytes_per_cluster
+        start = offset - offset % bpc
+        end = offset + size
+        end += -end % bpc
+        ret = []
+        for volume_offset, length in runmap.extents( start, end - start ):
+            if volume_offset == None:
+                ret.append( '\x00' * length )
+            else:
+                ret.append( self.__read( fd, volume_offset, length )[0][:] )
+        return ''.join( ret )[ offset - start : offset - start + size ]
+
+    ####################################################################################
+    #  __stream_name: Output file name of a stream. Alternate data streams are saved 
+    #            next to the file as <file>_ADS_<stream name>
+    ####################################################################################
+    def __stream_name( self, output_name, name ):
+        if len(name) > 0:
+            return output_name + "_ADS_%s" % name
+        return output_name
+
+    ####################################################################################
+    #  __make_sparse: Sparse and uninitialized ranges are skipped with seek/truncate so
+    #            they become holes in the output. NTFS only keeps holes in files marked 
+    #            sparse, other file systems do it on their own
+    ####################################################################################
+    def __make_sparse( self, fd_out ):
+        if not os.name == "nt" or not self.__archive == None or not self.config['compression'] == None:
+            return
+        try:
+            handle = msvcrt.get_osfhandle( fd_out.fileno() )
+            win32file.DeviceIoControl( handle, FSCTL_SET_SPARSE, None, 0 )
+        except:
+            self.config['logger'].debug( "Failed to mark %s sparse\n%s" % ( fd_out.name, traceback.format_exc() ))
+
+    ####################################################################################
+    #  __write_runlist: Saves the data runs of a non resident stream next to the output
+    #            file as <output>.runlist.json when runlist_sidecar is set. Sparse runs
+    #            have an lcn of null. For WOF compressed files these are the runs of the
+    #            WofCompressedData stream
+    ####################################################################################
+    def __write_runlist( self, stream, out_name, mft_file_seq_id ):
+        source = stream if stream['wof'] == None else stream['wof_data']
+        if not self.config['runlist_sidecar'] == True or not source['value'] == None:
+            return
+        runs = [ [ vcn, None if cluster_offset == 0 else cluster_offset, length ] for vcn, cluster_offset, length in sorted( source['runs'] ) ]
+        sidecar = { 'record': mft_file_seq_id,
+                    'size': source['size'],
+                    'initialized_size': source['initialized'],
+                    'bytes_per_cluster': self.config['bss'].bytes_per_cluster,
+                    'compression_unit': source['compression_unit'],
+                    'runs': runs }
+        if not stream['wof'] == None:
+            sidecar['wof_algorithm'] = WOF.ALGORITHM_NAMES[ stream['wof'] ]
+            sidecar['wof_size'] = stream['size']
+        if not self.__archive == None:
+            self.__archive.add_bytes( self.__archive_name( out_name ) + '.runlist.json', json.dumps( sidecar ))
+            return
+        with open( out_name + '.runlist.json', 'w' ) as fd_sidecar:
+            json.dump( sidecar, fd_sidecar )
+
+    ####################################################################################
+    #  __create_output: Opens the output of a stream of size bytes. A new file or, with an
+    #            archive, a new member of it. Archive members and compressed files fill
+    #            skipped ranges with zeros
+    ####################################################################################
+    def __create_output( self, out_name, size ):
+        if not self.__archive == None:
+            return self.__archive.open_entry( self.__archive_name( out_name ), size )
+        if self.config['compression'] == None:
+            return open( out_name, "wb" )
+        return CompressingWriter( open( self.__output_path( out_name ), "wb" ), self.config['compression'], self.__compress_pool )
+
+    ####################################################################################
+    #  __output_path: Where the stream of out_name ends up. The archive member name or
+    #            the output file with the suffix of the compression
+    ####################################################################################
+    def __output_path( self, out_name ):
+        if not self.__archive == None:
+            return self.__archive_name( out_name )
+        if self.config['compression'] == None:
+            return out_name
+        return out_name + COMPRESSION_SUFFIX[ self.config['compression'] ]
+
+    ####################################################################################
+    #  __archive_name: Name of the archive member of an output file, the path relative
+    #            to the output directory
+    ####################################################################################
+    def __archive_name( self, out_name ):
+        return os.path.relpath( out_name, self.__winapi_path( self.config['outputbasedir'] )).replace( os.sep, '/' )
+
+    ####################################################################################
+    #  __write_stream: Writes one data stream of the file to out_name, in file order.
+    #            Sparse runs and the uninitialized end of the stream are left as holes
+    #       stream: See __data_streams
+    #       Returns the StreamHash of the data when a manifest is being written
+    ####################################################################################
+    def __write_stream( self, stream, out_name ):
+        fd = self.__fd()
+        fd_out = self.__create_output( out_name, stream['size'] )
+        stream_hash = None
+        if not self.__manifest == None:
+            stream_hash = StreamHash()
+            fd_out = HashingWriter( fd_out, stream_hash )
+        try:
+            if not stream['value'] == None:
+                fd_out.write( stream['value'] )
+                self.__stats.add( 'bytes_written', len(stream['value']) )
+                return stream_hash
+            if not stream['wof'] == None:
+                self.__write_wof( stream, fd_out )
+                self.__stats.add( 'bytes_written', stream['size'] )
+                return stream_hash
+            if stream['compression_unit'] > 0:
+                self.__write_compressed( stream, fd_out, stream_hash )
+                return stream_hash
+            extents = self.__stream_extents( stream )
+            if None in [ offset for offset, size in extents ]:
+                self.__make_sparse( fd_out )
+            for offset, size in extents:
+                self.config['logger'].debug("GetFile:: offset( %r ) size( %08x )  " % ( offset, size))
+                if offset == None:
+                    self.__write_hole( fd_out, size, stream_hash )
+                else:
+                    self.__read( fd, offset, size, fd_out )
+            fd_out.truncate( stream['size'] )
+        finally:
+            fd_out.close()
+        return stream_hash
+
+    ####################################################################################
+    #  __write_hole: Skips size bytes of zeros in the output. The hash still sees them
+    ####################################################################################
+    def __write_hole( self, fd_out, size, stream_hash ):
+        if not stream_hash == None:
+            stream_hash.zeros( size )
+        fd_out.seek( size, 1 )
+
+    ####################################################################################
+    #  __write_compressed: Writes an LZNT1 compressed stream one compression unit at a
+    #            time. Units with every cluster allocated are copied, units without any
+    #            allocated cluster are holes and the rest are decompressed. See LZNT1
+    #       stream: See __data_streams
+    ####################################################################################
+    def __write_compressed( self, stream, fd_out, stream_hash ):
+        fd = self.__fd()
+        runmap = self.__stream_runmap( stream )
+        unit_size = self.config['bss'].bytes_per_cluster << stream['compression_unit']
+        self.__make_sparse( fd_out )
+        for unit_offset in xrange( 0, stream['size'], unit_size ):
+            size = min( unit_size, stream['size'] - unit_offset )
+            allocated = [ x for x in runmap.extents( unit_offset, unit_size ) if not x[0] == None ]
+            if len(allocated) == 0:
+                self.__write_hole( fd_out, size, stream_hash )
+            elif sum( length for offset, length in allocated ) >= unit_size:
+                # Whole clusters are read, the end of the last unit is trimmed
+                for offset, length in allocated:
+                    if size <= 0:
+                        break
+                    buf = self.__read( fd, offset, length )[0][:size]
+                    fd_out.write( buf )
+                    self.__stats.add( 'bytes_written', len(buf) )
+                    size -= length
+            else:
+                buf = ''.join( [ self.__read( fd, offset, length )[0][:] for offset, length in allocated ] )
+                fd_out.write( LZNT1.decompress( buf, unit_size )[:size] )
+                self.__stats.add( 'bytes_written', size )
+        fd_out.truncate( stream['size'] )
+
+    ####################################################################################
+    #  __write_wof: Writes a WOF compressed file. The chunks are read from the
+    #            WofCompressedData stream in file order and decompressed on the WOF pool
+    #       stream: See __data_streams
+    ####################################################################################
+    def __write_wof( self, stream, fd_out ):
+        data = stream['wof_data']
+        runmap = None
+        if data['value'] == None:
+            runmap = self.__stream_runmap( data )
+        table = self.__stream_read( data, runmap, 0, WOF.table_size( stream['size'], stream['wof'] ))
+        chunks = WOF.chunk_table( table, stream['size'], stream['wof'], data['size'] )
+        writer = WOF.ChunkWriter( fd_out, stream['wof'], self.__wofPool() )
+        # Consecutive chunks are read together
+        batch = max( 1, WOF.WOF_TASK_SIZE // WOF.CHUNK_SIZES[ stream['wof'] ] )
+        for start in xrange( 0, len(chunks), batch ):
+            group = chunks[start:start+batch]
+            first = group[0][0]
+            buf = self.__stream_read( data, runmap, first, group[-1][0] + group[-1][1] - first )
+            for offset, compressed_size, size in group:
+                writer.write( buf[offset-first:offset-first+compressed_size], size )
+        writer.close()
+        fd_out.truncate( stream['size'] )
+
+    ####################################################################################
+    #  __wofPool: The WOF decompression pool, started on first use. See setWofWorkers
+    ####################################################################################
+    def __wofPool( self ):
+        with self.__worker_lock:
+            if self.__wof_pool == None:
+                self.__wof_pool = WOF.decompress_pool( self.config['wof_workers'] )
+            return self.__wof_pool
+
+    ####################################################################################
+    #  __addManifest: Adds the hashes of a copied stream to the manifest
+    ####################################################################################
+    def __addManifest( self, out_name, mft_file_seq_id, name, size, stream_hash ):
+        if stream_hash == None or self.__manifest == None:
+            return
+        self.__manifest.add( self.__output_path( out_name ), mft_file_seq_id, size, stream_hash.hexdigests(), name )
+
+    ####################################################################################
+    # __parse_file_record: Given the sequence ID parse the contents of the file from the 
+    #           MFT and write every data stream to output_name
+    #       mft_file_seq_id: The sequence ID of the MFT record to return the data from
+    ####################################################################################
+    def __parse_file_record( self, mft_file_seq_id, output_name ):
+        streams = self.__data_streams( mft_file_seq_id )
+        if streams == None:
+            return None
+        for name in streams:
+            self.__copyStream( mft_file_seq_id, name, streams[name], self.__stream_name( output_name, name ))
+
+    ####################################################################################
+    # __copyStream: Writes one stream with its runlist sidecar and manifest entry
+    #       mft_file_seq_id: The sequence ID of the MFT record the stream belongs to
+    #       name: The stream name, '' for the unnamed $DATA stream
+    ####################################################################################
+    def __copyStream( self, mft_file_seq_id, name, stream, out_name ):
+        try:
+            stream_hash = self.__write_stream( stream, out_name )
+            self.__write_runlist( stream, out_name, mft_file_seq_id )
+            self.__addManifest( out_name, mft_file_seq_id, name, stream['size'], stream_hash )
+            self.__stats.add( 'streams_written' )
+        except:
+            self.config['logger'].error('Failed to get file %s\n%s' % (out_name, traceback.format_exc() ))
+
+    ####################################################################################
+    # __planFile: Adds the streams of the file to the disk order plan instead of copying
+    #           it. Output files are created now with their final size and resident data,
+    #           the reads are done by __runPlan. Archive members, compressed output,
+    #           LZNT1 and WOF compressed streams can only be written front to back so for
+    #           them whole streams are planned, ordered by their first read
+    ####################################################################################
+    def __planFile( self, mft_file_object, output_name ):
+        streams = self.__data_streams( mft_file_object[0] )
+        if streams == None:
+            return
+        whole = not self.__archive == None or not self.config['compression'] == None
+        for name in streams:
+            stream = streams[name]
+            out_name = self.__stream_name( output_name, name )
+            if whole == True or stream['compression_unit'] > 0 or not stream['wof'] == None:
+                source = stream if stream['wof'] == None else stream['wof_data']
+                offsets = [ 0 ]
+                if source['value'] == None:
+                    offsets = [ offset for offset, size in self.__stream_extents( source ) if not offset == None ] + offsets
+                self.__plan_streams.append( (offsets[0], mft_file_object[0], name, stream, out_name) )
+                continue
+            fd_out = open( out_name, "wb" )
+            try:
+                self.__stats.add( 'streams_written' )
+                if not stream['value'] == None:
+                    fd_out.write( stream['value'] )
+                    self.__stats.add( 'bytes_written', len(stream['value']) )
+                    if not self.__manifest == None:
+                        stream_hash = StreamHash()
+                        stream_hash.update( stream['value'] )
+                        self.__addManifest( out_name, mft_file_object[0], name, stream['size'], stream_hash )
+                    continue
+                self.__make_sparse( fd_out )
+                fd_out.truncate( stream['size'] )
+            finally:
+                fd_out.close()
+            self.__write_runlist( stream, out_name, mft_file_object[0] )
+            extents = []
+            holes = {}
+            file_offset = 0
+            for offset, size in self.__stream_extents( stream ):
+                if offset == None:
+                    holes[file_offset] = size
+                else:
+                    extents.append( (offset, size, out_name, file_offset) )
+                file_offset += size
+            stream_hash = None
+            if not self.__manifest == None:
+                stream_hash = StreamHash( holes )
+                self.__plan_hashes.append( (out_name, mft_file_object[0], name, stream['size'], stream_hash) )
+            self.__plan.extend( [ extent + ( stream_hash, ) for extent in extents ] )
+
+    ####################################################################################
+    # __runPlan: Carries out every read of the disk order plan sorted by volume offset so
+    #           the volume is read in one sweep. Each read is written at its offset in the
+    #           output file. With workers the sorted reads are cut into one contiguous
+    #           slice per worker. Streams planned whole are written one after the
+    #           other. Must run before the volume is closed
+    ####################################################################################
+    def __runPlan( self ):
+        if len(self.__plan_streams) > 0:
+            plan = sorted( self.__plan_streams, key=lambda x: x[0] )
+            self.__plan_streams = []
+            self.config['logger'].info("Copying %d planned streams in disk order" % len(plan))
+            for offset, mft_file_seq_id, name, stream, out_name in plan:
+                self.__copyStream( mft_file_seq_id, name, stream, out_name )
+        if len(self.__plan) > 0:
+            plan = sorted( self.__plan, key=lambda x: x[0] )
+            self.__plan = []
+            self.config['logger'].info("Copying %d planned reads in disk order" % len(plan))
+            if self.config['workers'] == 1:
+                self.__writeExtents( plan )
+            else:
+                self.__startWorkers( self.config['volume'] )
+                try:
+                    step = (len(plan) + self.config['workers'] - 1) / self.config['workers']
+                    for start in range( 0, len(plan), step ):
+                        self.__pool.apply_async( self.__writeExtents, ( plan[start:start+step], ))
+                finally:
+                    self.__stopWorkers()
+        self.__finishPlanHashes()
+
+    ####################################################################################
+    # __finishPlanHashes: Adds the planned streams to the manifest. Streams whose reads
+    #           were not done in file order, fragments placed backwards on the volume or
+    #           split between workers, are hashed from their output file
+    ####################################################################################
+    def __finishPlanHashes( self ):
+        for out_name, mft_file_seq_id, name, size, stream_hash in self.__plan_hashes:
+            try:
+                if not stream_hash.complete( size ):
+                    stream_hash = StreamHash.from_file( out_name )
+                self.__addManifest( out_name, mft_file_seq_id, name, size, stream_hash )
+            except:
+                self.config['logger'].error('Failed to hash file %s\n%s' % (out_name, traceback.format_exc() ))
+        self.__plan_hashes = []
+
+    ####################################################################################
+    # __writeExtents: Reads the planned extents in order and writes them to their output
+    #           files. Up to PLAN_OPEN_FILES output files are kept open
+    #       extents: [(volume offset, size, output name, file offset, StreamHash or None)]
+    ####################################################################################
+    def __writeExtents( self, extents ):
+        fd = self.__fd()
+        open_files = {}
+        order = []
+        try:
+            for offset, size, out_name, file_offset, stream_hash in extents:
+                try:
+                    fd_out = open_files.get( out_name )
+                    if fd_out == None:
+                        if len(order) >= PLAN_OPEN_FILES:
+                            open_files.pop( order.pop(0) ).close()
+                        fd_out = open( out_name, "r+b" )
+                        open_files[out_name] = fd_out
+                        order.append( out_name )
+                    fd_out.seek( file_offset )
+                    if not stream_hash == None:
+                        fd_out = HashingWriter( fd_out, stream_hash, file_offset )
+                    self.__read( fd, offset, size, fd_out )
+                except:
+                    self.config['logger'].error('Failed to get file %s\n%s' % (out_name, traceback.format_exc() ))
+        finally:
+            for fd_out in open_files.values():
+                fd_out.close()
 
     ####################################################################################
     # __getFile: The required file was identified this function locates all the parts of 
     #           the file and writes them in order to the destination location
     #       mft_file_object:
+    #       The output path is worked out here from current_file. With workers the
+    #       file is then extracted by the pool and this returns straight away. With 
+    #       disk_order the file is only added to the plan
     ####################################################################################
     def __getFile( self, mft_file_object ):
+        if self.__isSelected( mft_file_object ) == False:
+            self.__stats.add( 'files_filtered' )
+            return
         try:
             fullpath = self.config['outputbasedir'] + self.config['current_file']
             #        self.config['logger'].debug( "GetFile:: fullpath %s" % fullpath )
             #        self.config['logger'].debug( "GetFile:: attributes %s" % attribute.get_all_string())
-            path = '\\'.join(fullpath.split('\\')[:-1])
+            path = os.path.dirname(fullpath)
             winapi_path = self.__winapi_path(path)
-            if not os.path.isdir(winapi_path):
+            if self.__archive == None and not os.path.isdir(winapi_path):
                 os.makedirs(winapi_path)
             self.config['logger'].debug("GetFile:: fullpath edit %s" % fullpath)
-            self.__parse_file_record( mft_file_object[0], self.__winapi_path(fullpath) )
+        except:
+            self.config['logger'].error('Failed to get file %s\n%s' % (mft_file_object[1], traceback.format_exc() ))
+            return
+        if self.config['disk_order'] == True:
+            try:
+                self.__planFile( mft_file_object, self.__winapi_path(fullpath) )
+            except:
+                self.config['logger'].error('Failed to get file %s\n%s' % (mft_file_object[1], traceback.format_exc() ))
+        elif self.__pool == None:
+            self.__extractFile( mft_file_object, self.__winapi_path(fullpath) )
+        else:
+            self.__pool.apply_async( self.__extractFile, ( mft_file_object, self.__winapi_path(fullpath) ))
+
+    ####################################################################################
+    # __isSelected: True if the file matches the filter or is a directory, only files
+    #           are filtered. The name is checked first, the MFT record is only read for
+    #           the times and the size and to tell a directory from a file left out
+    #       mft_file_object: [seq_num, name]
+    ####################################################################################
+    def __isSelected( self, mft_file_object ):
+        file_filter = self.config['filter']
+        if file_filter == None or self.__matchFilter( file_filter, mft_file_object ) == True:
+            return True
+        return self.__isDirectory( mft_file_object[0] )
+
+    def __matchFilter( self, file_filter, mft_file_object ):
+        if not mft_file_object[1] == None and file_filter.match_name( mft_file_object[1] ) == False:
+            return False
+        if file_filter.needs_record() == False:
+            return True
+        buf, buf_sz = self.__calcOffset( mft_file_object[0] )
+        if buf == None:
+            return False
+        return file_filter.match_record( buf, self.config['bss'].mft_record_size )
+
+    ####################################################################################
+    # __extractFile: Writes the data of the MFT record to output_name. Runs on the
+    #           worker threads so it must not touch current_file or the lookup table
+    #       mft_file_object: [seq_num, name]
+    #       output_name: Full path of the output file
+    ####################################################################################
+    def __extractFile( self, mft_file_object, output_name ):
+        try:
+            self.__parse_file_record( mft_file_object[0], output_name )
         except:
             self.config['logger'].error('Failed to get file %s\n%s' % (mft_file_object[1], traceback.format_exc() ))
 
@@ -787,118 +1721,109 @@ class TScopy( object ):
         if (not isinstance(filename, unicode) and encoding is not None):
             filename = filename.decode(encoding)
         path = os.path.abspath(filename)
+        if not os.name == "nt":
+            return path
         if path.startswith(u"\\\\"):
             return u"\\\\?\\UNC\\" + path[2:]
         return u"\\\\?\\" + path
 
 
     ####################################################################################
-    # __open: Wrapper around win32file createfile. 
+    # __open: Opens the volume reader for the live volume or image. See Volume.open_volume
     ####################################################################################
     def __open( self, filename ):
         fd = None
         try:
-            if self.__useWin32 == False:
-                fd = open(filename, 'rb') 
-            else:
-                fd = win32file.CreateFile( filename,
-                                win32file.GENERIC_READ,
-                                win32file.FILE_SHARE_READ | win32file.FILE_SHARE_WRITE,
-                                None, 
-                                win32con.OPEN_EXISTING, 
-                                win32file.FILE_ATTRIBUTE_NORMAL,
-                                None)
+            fd = open_volume( filename, self.__useWin32, self.config['logger'] )
         except:
             self.config['logger'].error( traceback.format_exc())
         return fd
 
     ####################################################################################
-    # __read: Wrapper around win32file set file pointer and read contents.
-    #   fd => the handle to the file to be copied
-    #   offset => number of bytes to skip of the file
+    # __fd: Volume reader for the calling thread. Workers that were given their own
+    #       reader by __initWorker use it, everything else shares config['fd']
+    ####################################################################################
+    def __fd( self ):
+        fd = getattr( self.__local, 'fd', None )
+        if fd == None:
+            return self.config['fd']
+        return fd
+
+    ####################################################################################
+    # __startWorkers: Creates the extraction thread pool when more than one worker is
+    #       configured. Paths and directories are still resolved by the calling thread,
+    #       which is the only one that touches the MFT lookup table. The workers only 
+    #       read MFT records and data runs.
+    #       targetDrive: The volume or image every worker opens its own reader for
+    ####################################################################################
+    def __startWorkers( self, targetDrive ):
+        self.__pool = None
+        if self.config['workers'] > 1:
+            self.__pool = ThreadPool( self.config['workers'], self.__initWorker, ( targetDrive, ))
+
+    ####################################################################################
+    # __initWorker: Runs once on every worker thread. Readers that can not be shared, 
+    #       a win32 handle or seek and read, are opened again for the thread
+    ####################################################################################
+    def __initWorker( self, targetDrive ):
+        if self.config['fd'].thread_safe == True:
+            return
+        fd = self.__open( targetDrive )
+        if fd == None:
+            return
+        fd.set_sector_size( self.config['bss'].bytes_per_sector() )
+        self.__local.fd = fd
+        with self.__worker_lock:
+            self.__worker_fds.append( fd )
+
+    ####################################################################################
+    # __stopWorkers: Waits for every queued file to be written then closes the pool and
+    #       the worker readers
+    ####################################################################################
+    def __stopWorkers( self ):
+        if self.__pool == None:
+            return
+        self.__pool.close()
+        self.__pool.join()
+        self.__pool = None
+        with self.__worker_lock:
+            for fd in self.__worker_fds:
+                fd.close()
+            self.__worker_fds = []
+
+    ####################################################################################
+    # __read: Positional read from the volume reader.
+    #   fd => the volume reader of the file to be copied
+    #   offset => number of bytes to skip of the volume. The image_offset of the volume
+    #             is added to it
     #   read_sz => Number of bytes to read from the file
-    #   fd_output => Default None. If none then read into buffer otherwise
+    #   fd_output => Default None. If none then return a buffer otherwise
     #                The handle to the output file
+    #   Returns the buffer and its size. For memory mapped images the buffer is a 
+    #   zero copy view into the image. When writing to fd_output the returned 
+    #   buffer is empty and the size is the number of bytes written.
+    #   Counts the reads, one per READ_STEP when writing to fd_output, and the bytes
+    #   read. Bytes written to fd_output are counted as written
     ####################################################################################
     def __read( self, fd, offset, read_sz, fd_output=None ):
         bytes_read = 0
         buf = ''
+        offset += self.config.get('image_offset_found', 0)
         try:
-            if self.__useWin32 == False:
-                fd.seek( offset, 0)
-                if read_sz > 0x10000000:
-                    read_step = 0x01500000
-                    buf = ''
-                    while bytes_read <= read_sz:
-                        if not fd_output == None:
-                            fd_output.write(fd.read( read_step ))
-                            bytes_read += read_step
-                        else:
-                            buf += fd.read( read_step )
-                            bytes_read += read_step
-                else:
-                    if not fd_output == None:
-                        fd_output.write(fd.read(read_sz))
-                        bytes_read += read_sz
-                    else:
-                        buf += fd.read(read_sz)
-                        bytes_read += read_sz
+            if fd_output == None:
+                buf = fd.view( offset, read_sz )
+                bytes_read = len(buf)
+                self.__stats.add( 'read_calls' )
             else:
-                if read_sz > 0x10000000:
-                    read_step = 0x01500000
-                    buf = ''
-                    while bytes_read <= read_sz:
-                        win32file.SetFilePointer( fd, offset + bytes_read, win32file.FILE_BEGIN)
-                        if not fd_output == None:
-                            fd_output.write( win32file.ReadFile( fd, read_step)[1] )
-                            bytes_read += read_step
-                        else:
-                            buf += win32file.ReadFile(fd, read_step)[1]
-                            bytes_read += read_step
-                else:
-                    win32file.SetFilePointer( fd, offset, win32file.FILE_BEGIN)
-                    if not fd_output == None:
-                        buff =  win32file.ReadFile( fd, read_sz)[1]
-                        fd_output.write( buff )
-                        bytes_read = read_sz
-                    else:
-                        buf += win32file.ReadFile( fd, read_sz)[1]
-                        bytes_read = read_sz
+                bytes_read = fd.write_to( offset, read_sz, fd_output )
+                self.__stats.add( 'read_calls', max( 1, (read_sz + READ_STEP - 1) / READ_STEP ))
+                self.__stats.add( 'bytes_written', bytes_read )
+            self.__stats.add( 'bytes_read', bytes_read )
         except:
             self.config['logger'].error( traceback.format_exc())
-            self.config['logger'].debug("offset(%08x), readsize (%08x) fd (%08x)" % ( offset, read_sz, fd))
-            self.config['logger'].debug("stack %s" % traceback.print_stack() )
+            self.config['logger'].debug("offset(%08x), readsize (%08x) fd (%r)" % ( offset, read_sz, fd))
         return (buf, bytes_read)
 
-    ####################################################################################
-    # __get_wildcard_children:  Get the children of the wildcarded directory location
-    #       path: is a tuple containing the base path and the wildcard
-    # TODO Move this someplace else in the file
-    ####################################################################################
-    def __get_wildcard_children( self, path ):
-        copy_list = []
-        table, x, seq_path = self.__get_file_mft_seqid( path[0] )
-        if seq_path == None:
-            return copy_list
-        # Test if the last value seq_path[-1] is the directory we are looking for
-        if path[1] == None:
-            if seq_path[-1][1] == path[0][-1]:
-                copy_list.append( path[0] )
-
-        # get children of found path and find all that match wildcard.
-        ret = self.__getChildIndex( seq_path[-1][0] )
-        for x in ret:
-            if path[1] == None:
-                    break
-            l_name = ret[x].lower()
-            l_reg = re.escape(path[1]).replace('\\*', '.*')
-            if not l_reg[-1] == '*':
-                l_reg += '$'
-            if re.match( l_reg, l_name ):
-                l_name =  path[0] + [ l_name ] 
-                copy_list.append( l_name )
-        return copy_list
-
     ####################################################################################
     # __get_file_mft_seqid: Wrapper used to search for the file in the current memory mft 
     #           metadata list then process the rest of the path from parsing the MFT
@@ -913,56 +1838,102 @@ class TScopy( object ):
         return table, tmp_path, seq_path
 
     ####################################################################################
-    # __process_wildcards: Called when a wildcard was detected in the source filename.
-    #           Parses the wildcards and breaks up into sections then the paths are expanded
-    #           and each matching record is copied.
-    #       filename: Filename containing the wildcards
-    #       table: Pointer to the root of the mft Metadata table
+    # __planTargets: Plans the copy of the source filenames of the current volume. Plain
+    #           paths and wildcards are all added to one Glob.GlobTrie and resolved by a
+    #           single walk of the volume, see __walk_globs, so a directory is looked up
+    #           or listed once whatever the number of targets going through it. The
+    #           overlaps are then removed: a file matched by several targets, or copied
+    #           with a directory also matched, is copied once
+    #       filenames: Source filenames of the current volume
+    #       bRecursive: The directories matched are copied recursively
+    #       Returns the ordered work list [(filename, path)], path is the list of the
+    #       components of the file or directory to copy
     ####################################################################################
-    def  __process_wildcards( self, filename, table ):
-        filename = filename.lower()
-        if not '*' in filename:
-            return False
-        if filename[1:3] == ":\\":
-            filename = filename[3:]
-        
-        index = 5
-        seq_path = [(index,None)]
-        tmp_path = filename.split( os.sep )
-        path = []
-        path_start = 0
-        for ind in range( len(tmp_path)):
-            if "*" in tmp_path[ind]:
-                path.append( ( tmp_path[ path_start : ind ], tmp_path[ind]) )
-                path_start = ind + 1
-        if path_start < len(tmp_path):
-            path.append( ( tmp_path[ path_start : ], None) )
-
-        tList = []
-        for iPath in path:
-            tList = self.__regexsearch( iPath, tList ) 
-        return tList
-
-    ####################################################################################
-    # __regexsearch: Searches the path to determine if it matches the wildcard. Only the
-    #           '*' wildcard is supported. 
-    #       path:
-    #       tList:
-    ####################################################################################
-    def __regexsearch( self, path, tList ):
-        if tList == []:
-            findPaths = [ path ]
-        else:
-            findPaths = []
-            for ePath in tList:
-                findPaths.append( ( ePath + path[0], path[1] ))
+    def __planTargets( self, filenames, bRecursive=False ):
+        trie = GlobTrie()
+        globs = [ is_glob( filename[3:] ) for filename in filenames ]
+        for tag in range( len(filenames) ):
+            components = [ x for x in filenames[tag][3:].lower().split( os.sep ) if not x == '' ]
+            if len(components) > 0:
+                trie.add( components, tag )
+        matches = []
+        if trie.has_children( trie.start() ):
+            root = self.__MFT_lookup_table[self.config['driveLetter']][5]
+            self.__walk_globs( trie, trie.start(), root, [], matches )
+
+        # A target is found even when an earlier target matching the same file copies it
+        found = set()
+        for tags, path, seq_num in matches:
+            found.update( tags )
+        for tag in range( len(filenames) ):
+            if not tag in found and globs[tag] == False:
+                self.config['logger'].error( "File Not Found %s" % filenames[tag] )
+
+        # The matches of a directory come before the matches below it
         ret = []
-        for fp in findPaths:
-            found =  self.__get_wildcard_children( fp )
-            ret.extend( found )
+        planned = set()
+        for tags, path, seq_num in matches:
+            tag = min( tags )
+            if bRecursive == True and any( [ tuple( path[:n] ) in planned for n in range( 1, len(path) ) ] ):
+                continue
+            if tuple( path[:-1] ) in planned and self.__isDirectory( seq_num ) == False:
+                continue
+            planned.add( tuple( path ))
+            if globs[tag] == False:
+                # Plain paths keep the case they were given in
+                path = [ x for x in filenames[tag][3:].split( os.sep ) if not x == '' ]
+            ret.append( ( filenames[tag], path ))
         return ret
 
-            
+    ####################################################################################
+    # __walk_globs: Matches the children of a directory against the patterns and walks
+    #           down the directories the patterns can still match in. The directory is
+    #           listed once for all the patterns, or only the plain names following it
+    #           are looked up when no wildcard applies to it
+    #       state: The Glob.GlobTrie state of the directory
+    #       table: The directory in the MFT metadata table
+    #       path: Components of the directory
+    #       matches: The [(tags, path, sequence ID)] of the matched files and directories,
+    #           in the order they are found. tags holds every target matching the file,
+    #           the first one gets it
+    ####################################################################################
+    def __walk_globs( self, trie, state, table, path, matches ):
+        names = trie.literal_names( state )
+        if names == None:
+            ret = self.__getChildIndex( table['seq_num'] )
+            for seq_num in ret:
+                c_name = ret[seq_num].lower()
+                if not c_name in table['children']:
+                    table['children'][c_name] = { 'name':c_name, 'seq_num':seq_num & 0xffffffff, 'children':{}}
+            table['complete'] = True
+            children = [ table['children'][c_name] for c_name in sorted( table['children'] ) ]
+        else:
+            children = []
+            for name in names:
+                if name in table['children']:
+                    children.append( table['children'][name] )
+                    continue
+                child, x, seq_path = self.__search_mft( table, [ name ], [] )
+                if not child == None:
+                    children.append( child )
+
+        for child in children:
+            if child['name'].strip() == '':
+                continue
+            c_state = trie.step( state, child['name'] )
+            if len(c_state) == 0:
+                continue
+            c_path = path + [ child['name'] ]
+            # Only the '**' nodes, which always have children, tell files from directories
+            is_directory = False
+            if trie.has_children( c_state ):
+                is_directory = self.__isDirectory( child['seq_num'] )
+            tags = trie.matches( c_state, is_directory )
+            if len(tags) > 0:
+                matches.append( ( tags, c_path, child['seq_num'] ))
+            if is_directory == True and trie.has_children( c_state ):
+                self.__walk_globs( trie, c_state, child, c_path, matches )
+
     def __get_local_drives(self):
         """Returns a list containing letters from local drives"""
         drive_list = win32api.GetLogicalDriveStrings()
@@ -973,44 +1944,175 @@ class TScopy( object ):
                 list_local_drives.append(letter)
         return list_local_drives
     
+    ####################################################################################
+    # __imageKey: Key of the current image in the MFT metadata table. Separates the 
+    #           tables of different images and volumes inside an image
+    ####################################################################################
+    def __imageKey( self ):
+        return '%s@%r' % ( os.path.abspath( self.config['image'] ), self.config['image_offset'] )
+
+    ####################################################################################
+    # __imagePath: Normalizes the source path of a file inside an image. The drive letter 
+    #           is optional and both '\\' and '/' separators are accepted. 
+    #           Example: 'c:\windows\system32' and '/windows/system32' both return 
+    #                    'c:\windows\system32' using the local os.sep
+    ####################################################################################
+    def __imagePath( self, filename ):
+        filename = filename.replace('\\', os.sep).replace('/', os.sep)
+        driveLetter = 'c'
+        if filename[1:2] == ':':
+            if not filename[0] == '*':
+                driveLetter = filename[0]
+            filename = filename[2:]
+        return driveLetter + ':' + os.sep + filename.lstrip(os.sep)
+
+    ####################################################################################
+    # copyProfile: Copies the targets of a JSON or YAML collection profile, see Targets
+    #   profile: Path of the profile file
+    #   extra: (Optional) More source filenames copied with the targets of the profile
+    #   dest_filename, bRecursive: See copy
+    ####################################################################################
+    def copyProfile( self, profile, dest_filename, bRecursive=False, extra=None ):
+        targets = load_profile( profile )
+        if not extra == None:
+            targets = list( extra ) + targets
+        self.config['logger'].info( "%d targets in %s" % ( len(targets), profile ))
+        self.copy( targets, dest_filename, bRecursive=bRecursive )
+
+    ####################################################################################
+    # timeline: Writes the metadata timeline of a volume without copying anything, see
+    #   Timeline. The $MFT is streamed twice and the entries are written as the records
+    #   are decoded, only the directories are kept in memory
+    #   volume: The drive ('c:') or a path on it. Images have one volume
+    #   out_filename: The bodyfile or CSV file to write
+    #   fmt: (Optional) 'bodyfile' or 'csv'. By default csv for a .csv out_filename
+    ####################################################################################
+    def timeline( self, volume, out_filename, fmt=None ):
+        self.__useWin32 = self.config['image'] == None
+        if self.__useWin32 == True and not os.name == "nt":
+            self.config['logger'].error("Reading live volumes requires Windows. Use an image instead")
+            return
+        if fmt == None:
+            fmt = 'csv' if out_filename.lower().endswith( '.csv' ) else 'bodyfile'
+        if not fmt in TIMELINE_FORMATS:
+            raise Exception( "TSCOPY", "Invalid timeline format %s" % fmt )
+        if type(volume) == unicode:
+            volume = volume.encode('ascii', 'ignore')
+        if self.__useWin32 == True:
+            volume = os.path.abspath( volume )
+        else:
+            volume = self.__imagePath( volume )
+        targetDrive, driveLetter = self.__targetDrive( volume )
+        if not self.config.get('driveLetter') == driveLetter:
+            with self.__stats.phase( 'copy' ):
+                self.__runPlan()
+        session = self.__sessions.get( driveLetter )
+        if session == None:
+            session = self.__openSession( targetDrive, driveLetter )
+        session.activate( self.config )
+
+        start = time.time()
+        with self.__stats.phase( 'timeline' ):
+            paths = DirectoryPaths( volume[0].upper() + ':' )
+            self.__timelineDirectories( paths )
+            with open( out_filename, 'wb' ) as fd:
+                entries = self.__timelineRecords( paths, timeline_writer( fd, fmt ))
+        self.__stats.add( 'timeline_entries', entries )
+        self.config['logger'].info( 'Wrote %d timeline entries of %s to %s in %.2f seconds' % ( entries, targetDrive, out_filename, time.time()-start ))
+
+    ####################################################################################
+    #  __timelineDirectories: First pass of timeline, adds the in use directories to paths
+    ####################################################################################
+    def __timelineDirectories( self, paths ):
+        rec_sz = self.config['bss'].mft_record_size
+        for first, buf, count in self.__iterMFT():
+            batch = MFTBatch.decode_records( buf, count, rec_sz, first )
+            self.__stats.add( 'mft_records_read', count )
+            for i in batch.in_use():
+                if not batch.is_directory( i ) or batch.base_record( i ) > 0:
+                    continue
+                try:
+                    fns = long_names( MFTBatch.filename_attributes( batch.record( i ), batch.attrs_offset[i], batch.bytes_in_use[i] ))
+                    if len(fns) > 0:
+                        paths.add( first + i, int(batch.sequence_number[i]), fns[0][0], fns[0][2] )
+                except:
+                    self.config['logger'].debug( 'Failed to parse MFT record %d\n%s' % (first+i, traceback.format_exc()))
+
+    ####################################################################################
+    #  __timelineRecords: Second pass of timeline, writes every base record with good
+    #           fixups, deleted ones included. Returns the number of entries written
+    ####################################################################################
+    def __timelineRecords( self, paths, writer ):
+        rec_sz = self.config['bss'].mft_record_size
+        entries = 0
+        records = 0
+        for first, buf, count in self.__iterMFT():
+            batch = MFTBatch.decode_records( buf, count, rec_sz, first )
+            self.__stats.add( 'mft_records_read', count )
+            for i in xrange( count ):
+                if not batch.fixup_ok[i] or batch.base_record( i ) > 0:
+                    continue
+                try:
+                    times = record_times( batch.record( i ), batch.attrs_offset[i], batch.bytes_in_use[i] )
+                    entries += write_record( writer, paths, first + i, int(batch.sequence_number[i]),
+                                             batch.is_directory( i ), batch.flags[i] & MFTBatch.MFT_RECORD_IN_USE > 0, times )
+                    records += 1
+                except:
+                    self.config['logger'].debug( 'Failed to parse MFT record %d\n%s' % (first+i, traceback.format_exc()))
+        self.__stats.add( 'mft_records_parsed', records )
+        return entries
+
     ####################################################################################
     # Copy file from a single source file or directory. Wildcards (*) are acceptable
-    #   src_filename: Can be a filename, directory, or a wildcard
+    #   src_filename: Can be a filename, directory, or a wildcard. A list of them is 
+    #                 copied in one pass, which lets disk_order sort all of their reads.
+    #                 The targets of a volume are planned together and every file is
+    #                 copied once, see __planTargets
     #   dest_filename: The root directory to save files too. Each will create a mirror path
     #                  Example: dest_filename = 'c:\test\' and copying "c:\windows\somefile" 
     #                           the output file will have the path of "c:\test\windows\somefile"
     #   bRecursive: Tells the copy to recursivly copy a directory. Only works with directories
     ####################################################################################
     def copy( self, src_filename, dest_filename, bRecursive=False ):
-        self.__useWin32 = True
+        self.__useWin32 = self.config['image'] == None
+        if self.__useWin32 == True and not os.name == "nt":
+            self.config['logger'].error("Copying from live volumes requires Windows. Use an image instead")
+            return
         if not (dest_filename[-1] == '/' or dest_filename[-1] == '\\'):
             dest_filename = dest_filename+os.sep
         self.config['outputbasedir'] = dest_filename 
-        if type(src_filename) == unicode:
-            src_filename = src_filename.encode('ascii', 'ignore')
-        if not type( src_filename ) == str:
-            self.config['logger'].error("INVALID src type (%r)" % (src_filename ) )
-            return
-        src_filename = os.path.abspath( src_filename )
-        src_filename = [ src_filename ]
-        for filename in src_filename: 
-            driveLetter = None
+        if not type( src_filename ) == list:
+            src_filename = [ src_filename ]
+        src_filenames = []
+        for filename in src_filename:
+            if type(filename) == unicode:
+                filename = filename.encode('ascii', 'ignore')
+            if not type( filename ) == str:
+                self.config['logger'].error("INVALID src type (%r)" % (filename ) )
+                return
+            if self.__useWin32 == True:
+                filename = os.path.abspath( filename )
+            else:
+                filename = self.__imagePath( filename )
+            src_filenames.append( filename )
+        # The files of a volume are copied together, their wildcards are expanded by
+        #   one walk of the volume
+        volumes = []
+        for filename in src_filenames: 
+            expanded = [ filename ]
             if self.__useWin32 == True:
                 self.config['logger'].debug( 'filename %r' % filename)
-                if not filename[:4].lower() == '\\\\.\\':
-                    targetDrive = '\\\\.\\'+filename[:2]
+                if self.__targetDrive( filename )[1] == '*':
+                    expanded = [ filename.replace("*", drive[0], 1) for drive in self.__get_local_drives() ]
+            for filename in expanded:
+                targetDrive = self.__targetDrive( filename )[0]
+                for volume in volumes:
+                    if volume[0] == targetDrive:
+                        volume[1].append( filename )
+                        break
                 else:
-                    targetDrive = filename[:6]
-                
-                driveLetter = targetDrive[-2]
-            if driveLetter == '*':
-                for drive in self.__get_local_drives():  
-                    self.__copyfile( filename.replace("*", drive[0], 1), bRecursive=bRecursive )
-            else:
-                self.__copyfile( filename, bRecursive=bRecursive )
-
-
-
-
-
-
+                    volumes.append( ( targetDrive, [ filename ] ))
+        for targetDrive, filenames in volumes:
+            self.__copyfile( filenames, bRecursive=bRecursive )
+        with self.__stats.phase( 'copy' ):
+            self.__runPlan()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the parsing of MFT records, attributes and $FILE_NAME values.
+
+Builds a small synthetic volume with bench/ntfs_image.py, reads every record of its
+$MFT and parses them the way the lookups do, the record header, every attribute
+header and the $FILE_NAME attributes, with the compiled BinaryParser.Layout classes
+of MFT.py and with copies of the previous declare_field versions. Both must return
+the same field values.
+
+    python bench/bench_block_parse.py --files 5000 --repeat 3
+"""
+import os
+import sys
+import time
+import struct
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, BENCH_DIR)
+import ntfs_image
+from TScopy.BinaryParser import Block, Nestable
+from TScopy.MFT import MFTRecord, Attribute, FilenameAttribute, FixupBlock, ATTR_TYPE
+
+RECORD_FIELDS = ( 'magic', 'usa_offset', 'usa_count', 'lsn', 'sequence_number', 'link_count', 'attrs_offset',
+                  'flags', 'bytes_in_use', 'bytes_allocated', 'base_mft_record', 'next_attr_instance',
+                  'mft_record_number' )
+ATTRIBUTE_FIELDS = ( 'type', 'size', 'non_resident', 'name_length', 'name_offset', 'flags', 'instance' )
+NON_RESIDENT_FIELDS = ( 'lowest_vcn', 'highest_vcn', 'runlist_offset', 'compression_unit', 'allocated_size',
+                        'data_size', 'initialized_size' )
+RESIDENT_FIELDS = ( 'value_length', 'value_offset', 'value_flags', 'value' )
+FILENAME_FIELDS = ( 'mft_parent_reference', 'created_time', 'modified_time', 'changed_time', 'accessed_time',
+                    'physical_size', 'logical_size', 'flags', 'reparse_value', 'filename_length',
+                    'filename_type', 'filename' )
+
+####################################################################################
+# Legacy*: The declare_field versions of the classes, as MFT.py had them
+####################################################################################
+class LegacyAttribute(Block, Nestable):
+    def __init__(self, buf, offset, parent):
+        super(LegacyAttribute, self).__init__(buf, offset)
+        self.declare_field("dword", "type")
+        self.declare_field("dword", "size")
+        self.declare_field("byte", "non_resident")
+        self.declare_field("byte", "name_length")
+        self.declare_field("word", "name_offset")
+        self.declare_field("word", "flags")
+        self.declare_field("word", "instance")
+        if self.non_resident() > 0:
+            self.declare_field("qword", "lowest_vcn", 0x10)
+            self.declare_field("qword", "highest_vcn")
+            self.declare_field("word", "runlist_offset")
+            self.declare_field("byte", "compression_unit")
+            self.declare_field("byte", "reserved1")
+            self.declare_field("byte", "reserved2")
+            self.declare_field("byte", "reserved3")
+            self.declare_field("byte", "reserved4")
+            self.declare_field("byte", "reserved5")
+            self.declare_field("qword", "allocated_size")
+            self.declare_field("qword", "data_size")
+            self.declare_field("qword", "initialized_size")
+            self.declare_field("qword", "compressed_size")
+        else:
+            self.declare_field("dword", "value_length", 0x10)
+            self.declare_field("word", "value_offset")
+            self.declare_field("byte", "value_flags")
+            self.declare_field("byte", "reserved")
+            self.declare_field("binary", "value",
+                               self.value_offset(), self.value_length())
+
+    def __len__(self):
+        return self.size()
+
+class LegacyFilenameAttribute(Block, Nestable):
+    def __init__(self, buf, offset, parent):
+        super(LegacyFilenameAttribute, self).__init__(buf, offset)
+        self.declare_field("qword", "mft_parent_reference", 0x0)
+        self.declare_field("filetime", "created_time")
+        self.declare_field("filetime", "modified_time")
+        self.declare_field("filetime", "changed_time")
+        self.declare_field("filetime", "accessed_time")
+        self.declare_field("qword", "physical_size")
+        self.declare_field("qword", "logical_size")
+        self.declare_field("dword", "flags")
+        self.declare_field("dword", "reparse_value")
+        self.declare_field("byte", "filename_length")
+        self.declare_field("byte", "filename_type")
+        self.declare_field("wstring", "filename", 0x42, self.filename_length())
+
+class LegacyMFTRecord(FixupBlock):
+    def __init__(self, buf, offset, parent, inode=None):
+        super(LegacyMFTRecord, self).__init__(buf, offset, parent)
+        self.declare_field("dword", "magic")
+        self.declare_field("word", "usa_offset")
+        self.declare_field("word", "usa_count")
+        self.declare_field("qword", "lsn")
+        self.declare_field("word", "sequence_number")
+        self.declare_field("word", "link_count")
+        self.declare_field("word", "attrs_offset")
+        self.declare_field("word", "flags")
+        self.declare_field("dword", "bytes_in_use")
+        self.declare_field("dword", "bytes_allocated")
+        self.declare_field("qword", "base_mft_record")
+        self.declare_field("word", "next_attr_instance")
+        self.declare_field("word", "reserved")
+        self.declare_field("dword", "mft_record_number")
+        self.inode = inode or self.mft_record_number()
+        self.fixup(self.usa_count(), self.usa_offset())
+
+    def attributes(self):
+        offset = self.attrs_offset()
+        right_border = self.offset() + self.bytes_in_use()
+        while (self.unpack_dword(offset) != 0 and
+               self.unpack_dword(offset) != 0xFFFFFFFF and
+               offset + self.unpack_dword(offset + 4) <= right_border):
+            a = LegacyAttribute(self._buf, offset, self)
+            offset += len(a)
+            yield a
+
+####################################################################################
+# read_records: Returns the buffers of the records of the $MFT of the image
+####################################################################################
+def read_records( image ):
+    with open( image, 'rb' ) as fd:
+        boot = fd.read( 512 )
+        bps = struct.unpack_from( '<H', boot, 0x0b )[0]
+        bpc = bps * ord( boot[0x0d] )
+        mft_lcn = struct.unpack_from( '<Q', boot, 0x30 )[0]
+        size = struct.unpack_from( '<b', boot, 0x40 )[0]
+        record_size = size * bpc if size > 0 else 1 << -size
+        fd.seek( mft_lcn * bpc )
+        mft = MFTRecord( fd.read( record_size ), 0, None )
+        data = []
+        for lcn, length in mft.data_attribute().runlist().runs():
+            fd.seek( lcn * bpc )
+            data.append( fd.read( length * bpc ))
+    # With small clusters a record can be split between two runs
+    data = ''.join( data )
+    records = []
+    for offset in xrange( 0, len(data) - record_size + 1, record_size ):
+        buf = data[offset:offset + record_size]
+        if buf[:4] == 'FILE':
+            records.append( buf )
+    return records
+
+####################################################################################
+# parse: Parses every record like the lookups do. Returns the number of fields read
+####################################################################################
+def parse( records, record_class, filename_class ):
+    nfields = 0
+    for buf in records:
+        record = record_class( buf, 0, None )
+        record.sequence_number()
+        record.flags()
+        for attribute in record.attributes():
+            if attribute.type() == ATTR_TYPE.FILENAME_INFORMATION:
+                fn = filename_class( attribute.value(), 0, record )
+                fn.mft_parent_reference()
+                fn.filename()
+                nfields += 3
+            elif attribute.type() == ATTR_TYPE.DATA and attribute.non_resident() > 0:
+                attribute.data_size()
+                attribute.runlist_offset()
+                nfields += 2
+            nfields += 1
+        nfields += 2
+    return nfields
+
+def values( block, fields ):
+    return [ getattr( block, name )() for name in fields ]
+
+####################################################################################
+# compare: Checks that both versions read the same values. Returns the differences
+####################################################################################
+def compare( records ):
+    problems = []
+    for buf in records:
+        new, old = MFTRecord( buf, 0, None ), LegacyMFTRecord( buf, 0, None )
+        if not values( new, RECORD_FIELDS ) == values( old, RECORD_FIELDS ):
+            problems.append( 'record %d header' % old.mft_record_number() )
+        for a, b in zip( new.attributes(), old.attributes() ):
+            fields = ATTRIBUTE_FIELDS + ( NON_RESIDENT_FIELDS if b.non_resident() > 0 else RESIDENT_FIELDS )
+            if not values( a, fields ) == values( b, fields ):
+                problems.append( 'record %d attribute 0x%x' % ( old.mft_record_number(), b.type() ))
+            elif b.type() == ATTR_TYPE.FILENAME_INFORMATION and not \
+                    values( FilenameAttribute( a.value(), 0, new ), FILENAME_FIELDS ) == \
+                    values( LegacyFilenameAttribute( b.value(), 0, old ), FILENAME_FIELDS ):
+                problems.append( 'record %d filename' % old.mft_record_number() )
+    return problems
+
+def timed( name, records, record_class, filename_class, repeat ):
+    best = None
+    for n in range( repeat ):
+        start = time.time()
+        nfields = parse( records, record_class, filename_class )
+        elapsed = time.time() - start
+        best = elapsed if best == None else min( best, elapsed )
+    print "%-22s: %8.3f s  %8.0f records/s  %d fields" % ( name, best, len(records) / best, nfields )
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="MFT record parsing benchmark")
+    parser.add_argument('--files', type=int, default=5000, help="Number of files in the synthetic volume")
+    parser.add_argument('--profile', choices=sorted( ntfs_image.PROFILES ), default='default')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    builder = ntfs_image.NTFSImageBuilder( seed=args.seed, **ntfs_image.PROFILES[args.profile] )
+    for n in range( args.files ):
+        builder.add_file( 'dir%02d\\file%05d.txt' % ( n % 50, n ), 'x' * ( n % 3000 ))
+    fd, image = tempfile.mkstemp( suffix='.img' )
+    os.close( fd )
+    try:
+        builder.build( image )
+        records = read_records( image )
+    finally:
+        os.remove( image )
+    print "%d MFT records" % len(records)
+
+    problems = compare( records )
+    if len(problems) > 0:
+        for problem in problems[:10]:
+            print "MISMATCH %s" % problem
+        sys.exit(1)
+    legacy = timed( "declare_field", records, LegacyMFTRecord, LegacyFilenameAttribute, args.repeat )
+    layout = timed( "Layout", records, MFTRecord, FilenameAttribute, args.repeat )
+    print "speedup               : %8.1fx" % ( legacy / layout )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of tscopy.py against synthetic NTFS images.
+
+Builds (or reuses) an image with bench/ntfs_image.py and times the tscopy.py command
+line on it for these scenarios, each with and without --scan:
+    resolve: One file at the bottom of a 30 level deep path and one in a directory
+          of thousands of entries
+    wildcard: c:\\users\\*\\ntuser.dat* and the *.lnk files of every user
+    recursive: -r of c:\\users and c:\\windows
+    large: The large fragmented and sparse file, reported in MB/s
+Every run is a new process, the times include the start of the interpreter and the
+parsing of the boot sector and $MFT record 0. The best and median of --repeat runs
+are reported. --verify checks every copied file against the content the generator
+wrote. The JSON results keep the performance summary tscopy.py logged for the first
+run of every scenario.
+
+    python bench/bench_e2e.py --profile default --scale 1 --repeat 3 --verify --json e2e.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TSCOPY = os.path.join(BENCH_DIR, '..', 'tscopy.py')
+sys.path.insert(0, BENCH_DIR)
+import ntfs_image
+
+DEEP_PATH = 'c:\\deep\\' + '\\'.join( 'level%02d' % n for n in range( 30 )) + '\\deep.txt'
+SCENARIOS = [ ( 'resolve', [ DEEP_PATH,
+                             'c:\\windows\\winsxs\\manifests\\amd64_microsoft-windows-component00042_31bf3856ad364e35.manifest' ], False ),
+              ( 'wildcard', [ 'c:\\users\\*\\ntuser.dat*',
+                              'c:\\users\\*\\appdata\\roaming\\microsoft\\windows\\recent\\*.lnk' ], False ),
+              ( 'recursive', [ 'c:\\users', 'c:\\windows' ], True ),
+              ( 'large', [ 'c:\\data\\large.bin' ], False ) ]
+
+####################################################################################
+# image_path: Builds the image of the profile/scale/seed in workdir unless it is
+#       already there. Returns (image, builder), the builder is None for a cached image
+#       and is then only rebuilt in memory when --verify needs it
+####################################################################################
+def image_path( workdir, profile, scale, large_size, seed, rebuild ):
+    filename = os.path.join( workdir, 'bench_%s_x%d_%dm_s%d.img' % ( profile, scale, large_size, seed ))
+    if os.path.exists( filename ) and rebuild == False:
+        return filename, None
+    start = time.time()
+    builder = ntfs_image.build_bench_image( filename, profile, scale, large_size, seed )
+    print "built %s in %.1f s" % ( filename, time.time() - start )
+    return filename, builder
+
+####################################################################################
+# run_tscopy: Runs one copy. Returns (seconds, output directory, error lines, the
+#       performance summary logged by tscopy.py or None)
+####################################################################################
+def run_tscopy( image, files, recursive, scan, extra, workdir ):
+    outdir = tempfile.mkdtemp( prefix='e2e_', dir=workdir )
+    cmd = [ sys.executable, TSCOPY, '--image', image, '-o', outdir, '-i', '-f', ','.join( files ) ] + extra
+    if recursive == True:
+        cmd.append( '-r' )
+    if scan == True:
+        cmd.append( '--scan' )
+    start = time.time()
+    proc = subprocess.Popen( cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT )
+    output = proc.communicate()[0]
+    elapsed = time.time() - start
+    errors = [ line for line in output.splitlines() if ' - ERROR - ' in line ]
+    if not proc.returncode == 0:
+        errors.append( 'exit code %d' % proc.returncode )
+    summary = None
+    for line in output.splitlines():
+        if ' - Performance summary ' in line:
+            summary = json.loads( line.split( ' - Performance summary ', 1 )[1] )
+    return elapsed, outdir, errors, summary
+
+####################################################################################
+# verify: Compares the copied files with the expected content. Returns (files,
+#       bytes, problems)
+####################################################################################
+def verify( outdir, expected ):
+    problems = []
+    nfiles = 0
+    nbytes = 0
+    for root, dirs, files in os.walk( outdir ):
+        for name in files:
+            path = os.path.join( root, name )
+            rel = path[len(outdir):].replace( os.sep, '/' ).lower()
+            if rel.endswith( '.pickle' ):
+                continue
+            with open( path, 'rb' ) as fd:
+                data = fd.read()
+            nfiles += 1
+            nbytes += len(data)
+            if not rel in expected:
+                problems.append( 'unexpected %s' % rel )
+            elif not data == expected[rel]:
+                problems.append( 'content of %s' % rel )
+    return nfiles, nbytes, problems
+
+def median( values ):
+    values = sorted( values )
+    return values[len(values) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description="tscopy.py end-to-end benchmark on synthetic NTFS images")
+    parser.add_argument('--image', help="Existing image built by ntfs_image.py. --verify is not available")
+    parser.add_argument('--profile', choices=sorted( ntfs_image.PROFILES ), default='default')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--large_size', type=int, default=32, help="Size of the large file in MB at scale 1")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', default=tempfile.gettempdir(), help="Where images are cached and copies written")
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild the image even if it is cached")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scenario', action='append', choices=[ s[0] for s in SCENARIOS ], help="Default all")
+    parser.add_argument('--mode', choices=[ 'lookup', 'scan', 'both' ], default='both')
+    parser.add_argument('--extra', default='', help="Extra tscopy.py arguments, e.g. \"--workers 4 --disk_order\"")
+    parser.add_argument('--verify', action='store_true', help="Check the copied files against the generator")
+    parser.add_argument('--json', help="Write the results to this file")
+    args = parser.parse_args()
+
+    if args.image == None:
+        image, builder = image_path( args.workdir, args.profile, args.scale, args.large_size, args.seed, args.rebuild )
+    else:
+        image, builder = args.image, None
+    expected = None
+    if args.verify == True:
+        if not args.image == None:
+            parser.error( "--verify needs the image to be built by this script" )
+        if builder == None:
+            builder = ntfs_image.build_bench_image( os.path.join( args.workdir, 'e2e_verify.img' ), args.profile,
+                                                    args.scale, args.large_size, args.seed )
+            os.remove( os.path.join( args.workdir, 'e2e_verify.img' ))
+        expected = ntfs_image.expected_files( builder )
+
+    modes = { 'lookup': [ False ], 'scan': [ True ], 'both': [ False, True ] }[args.mode]
+    results = []
+    failed = False
+    for name, files, recursive in SCENARIOS:
+        if not args.scenario == None and not name in args.scenario:
+            continue
+        for scan in modes:
+            times = []
+            errors = []
+            nfiles = nbytes = 0
+            summary = None
+            for n in range( args.repeat ):
+                elapsed, outdir, run_errors, run_summary = run_tscopy( image, files, recursive, scan, args.extra.split(), args.workdir )
+                times.append( elapsed )
+                errors += run_errors
+                if n == 0:
+                    summary = run_summary
+                    nfiles, nbytes, problems = verify( outdir, expected or {} )
+                    if not expected == None:
+                        errors += problems
+                shutil.rmtree( outdir, ignore_errors=True )
+            result = { 'scenario': name, 'scan': scan, 'best': min( times ), 'median': median( times ),
+                       'files': nfiles, 'bytes': nbytes, 'errors': len(errors), 'tscopy': summary }
+            if name == 'large':
+                result['mb_per_s'] = nbytes / 1048576.0 / min( times )
+            results.append( result )
+            print "%-10s %-7s best %7.3f s  median %7.3f s  %5d files %10d bytes%s%s" % ( name,
+                    'scan' if scan == True else 'lookup', result['best'], result['median'], nfiles, nbytes,
+                    '  %.1f MB/s' % result['mb_per_s'] if 'mb_per_s' in result else '',
+                    '  %d ERRORS' % len(errors) if len(errors) > 0 else '' )
+            for error in errors[:5]:
+                print "    %s" % error
+            if len(errors) > 0:
+                failed = True
+
+    if not args.json == None:
+        with open( args.json, 'w' ) as fd:
+            json.dump( { 'image': image, 'profile': args.profile, 'scale': args.scale, 'extra': args.extra,
+                         'results': results }, fd, indent=2, sort_keys=True )
+    if failed == True:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the update sequence fixups of MFT records and INDX blocks.
+
+Compares the previous fixups with Fixup.apply_fixups_batch on synthetic records and
+index blocks:
+    records: The array('b') copy and pack_word loop FixupBlock used to do for every
+          MFT record against one bytearray copy of the chunk fixed in place
+    indx: The eight slices and concatenations of INDX.update_seq_arr for every 4K
+          block against the same batch call on the whole INDX run
+Both must give the same bytes.
+
+    python bench/bench_fixup.py --records 20000 --blocks 5000
+"""
+import os
+import sys
+import time
+import array
+import random
+import struct
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'TScopy'))
+sys.path.insert(0, BENCH_DIR)
+from ntfs_image import apply_fixups as protect
+from Fixup import apply_fixups_batch
+
+####################################################################################
+# protected_structures: count structures of size bytes with random content and the
+#       update sequence applied the way NTFS writes them to disk
+####################################################################################
+def protected_structures( count, size, magic, usa_offset, seed ):
+    rnd = random.Random( seed )
+    buf = bytearray( count * size )
+    for i in xrange( count ):
+        offset = i * size
+        buf[offset:offset + size] = os.urandom( size )
+        struct.pack_into( '<4sHH', buf, offset, magic, usa_offset, size // 512 + 1 )
+        protect( buf, offset, size, usa_offset, rnd.randint( 1, 0xfffe ))
+    return str( buf )
+
+####################################################################################
+# legacy_record_fixup: The previous FixupBlock.fixup, on a copy of every record
+####################################################################################
+def legacy_record_fixup( buf, count, size ):
+    ret = []
+    for i in xrange( count ):
+        record = array.array( "b", buf[i * size:(i + 1) * size] )
+        usa_offset, usa_count = struct.unpack_from( '<HH', record, 4 )
+        fixup_value = struct.unpack_from( '<H', record, usa_offset )[0]
+        for n in range( usa_count - 1 ):
+            end = 512 * (n + 1) - 2
+            if struct.unpack_from( '<H', record, end )[0] == fixup_value:
+                struct.pack_into( '<H', record, end, struct.unpack_from( '<H', record, usa_offset + 2 + 2*n )[0] )
+        ret.append( record.tostring() )
+    return ''.join( ret )
+
+####################################################################################
+# legacy_update_seq_arr: The previous INDX.update_seq_arr, 4K blocks only
+####################################################################################
+def legacy_update_seq_arr( buf, count, size ):
+    ret = []
+    for i in xrange( count ):
+        idx_buf = buffer( buf, i * size, size )
+        usa_offset, usa_count = struct.unpack_from( '<HH', idx_buf, 4 )
+        seq_arr = idx_buf[usa_offset+2:usa_offset+2+usa_count*2]
+        block  = idx_buf[0x0000:0x01fe] + seq_arr[0x00:0x2]
+        block += idx_buf[0x0200:0x03fe] + seq_arr[0x02:0x4]
+        block += idx_buf[0x0400:0x05fe] + seq_arr[0x04:0x6]
+        block += idx_buf[0x0600:0x07fe] + seq_arr[0x06:0x8]
+        block += idx_buf[0x0800:0x09fe] + seq_arr[0x08:0xa]
+        block += idx_buf[0x0a00:0x0bfe] + seq_arr[0x0a:0xc]
+        block += idx_buf[0x0c00:0x0dfe] + seq_arr[0x0c:0xe]
+        block += idx_buf[0x0e00:0x0ffe] + seq_arr[0x0e:0x10]
+        block += idx_buf[0x1000:      ]
+        ret.append( block )
+    return ''.join( ret )
+
+def batch_fixup( buf, count, size ):
+    raw = bytearray( buf )
+    apply_fixups_batch( raw, count, size )
+    return str( raw )
+
+def timed( name, fixup, buf, count, size, expected=None ):
+    start = time.time()
+    ret = fixup( buf, count, size )
+    elapsed = time.time() - start
+    if not expected == None and not ret == expected:
+        print "MISMATCH in %s" % name
+        sys.exit(1)
+    print "%-22s: %8.3f s  %8.0f per s" % ( name, elapsed, count / elapsed )
+    return elapsed, ret
+
+def main():
+    parser = argparse.ArgumentParser(description="Update sequence fixup benchmark")
+    parser.add_argument('--records', type=int, default=20000, help="Number of 1K MFT records")
+    parser.add_argument('--blocks', type=int, default=5000, help="Number of 4K INDX blocks")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    records = protected_structures( args.records, 1024, 'FILE', 0x30, args.seed )
+    legacy, expected = timed( "FixupBlock array copy", legacy_record_fixup, records, args.records, 1024 )
+    batch, ret = timed( "records in place", batch_fixup, records, args.records, 1024, expected )
+    print "speedup               : %8.1fx" % ( legacy / batch )
+
+    blocks = protected_structures( args.blocks, 4096, 'INDX', 0x28, args.seed )
+    legacy, expected = timed( "update_seq_arr", legacy_update_seq_arr, blocks, args.blocks, 4096 )
+    batch, ret = timed( "INDX run in place", batch_fixup, blocks, args.blocks, 4096, expected )
+    print "speedup               : %8.1fx" % ( legacy / batch )
+
+if __name__ == '__main__':
+    main()
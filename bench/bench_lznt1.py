@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Benchmark of the LZNT1 decompression of NTFS compression units.
+
+Builds synthetic 64K compression units, log like text, zero filled and random
+units that NTFS would store uncompressed, compresses them with LZNT1.compress and
+times LZNT1.decompress against a byte at a time reference decoder. On Windows the
+RtlDecompressBuffer path is timed as well.
+
+    python bench/bench_lznt1.py --units 256
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TScopy'))
+import LZNT1
+
+UNIT_SIZE = 0x10000
+
+####################################################################################
+# synthetic_units: Returns count compression units. Mostly event log like text with
+#       some sparse like and incompressible units mixed in
+####################################################################################
+def synthetic_units( count, seed ):
+    rnd = random.Random( seed )
+    words = [ 'EventID', 'Security', 'Logon', 'S-1-5-18', 'NT AUTHORITY', 'SYSTEM', 'svchost.exe',
+              'C:\\Windows\\System32', 'Success', 'Audit', '0x3e7', 'Kerberos', 'NTLM', '4624', '4672' ]
+    units = []
+    for i in range( count ):
+        kind = rnd.random()
+        if kind < 0.05:
+            units.append( '\x00' * UNIT_SIZE )
+        elif kind < 0.10:
+            units.append( ''.join( chr( rnd.getrandbits( 8 )) for n in xrange( UNIT_SIZE )))
+        else:
+            text = []
+            size = 0
+            while size < UNIT_SIZE:
+                line = '%d %s\r\n' % ( rnd.randint( 0, 99999 ), ' '.join( rnd.choice( words ) for n in range( rnd.randint( 3, 12 ))))
+                text.append( line )
+                size += len( line )
+            units.append( ''.join( text )[:UNIT_SIZE] )
+    return units
+
+####################################################################################
+# reference_decompress: Straightforward decoder, one byte and one token at a time
+####################################################################################
+def reference_decompress( buf, size ):
+    buf = bytearray( buf )
+    out = bytearray()
+    pos = 0
+    while pos + 2 <= len(buf):
+        header = buf[pos] | buf[pos+1] << 8
+        if header == 0:
+            break
+        chunk_end = pos + 3 + (header & 0xfff)
+        pos += 2
+        if len(out) % LZNT1.CHUNK_SIZE > 0:
+            out += '\x00' * ( LZNT1.CHUNK_SIZE - len(out) % LZNT1.CHUNK_SIZE )
+        if not header & LZNT1.CHUNK_COMPRESSED:
+            out += buf[pos:chunk_end]
+            pos = chunk_end
+            continue
+        start = len(out)
+        while pos < chunk_end:
+            flags = buf[pos]
+            pos += 1
+            for bit in range( 8 ):
+                if pos >= chunk_end:
+                    break
+                if flags & ( 1 << bit ) == 0:
+                    out.append( buf[pos] )
+                    pos += 1
+                    continue
+                token = buf[pos] | buf[pos+1] << 8
+                pos += 2
+                length_mask, offset_shift = 0xfff, 12
+                n = len(out) - start - 1
+                while n >= 0x10:
+                    length_mask >>= 1
+                    offset_shift -= 1
+                    n >>= 1
+                length = (token & length_mask) + 3
+                src = len(out) - ((token >> offset_shift) + 1)
+                for n in range( length ):
+                    out.append( out[src + n] )
+    out += '\x00' * ( size - len(out) )
+    return str( out[:size] )
+
+def timed( name, decompress, compressed, units ):
+    start = time.time()
+    for buf, unit in zip( compressed, units ):
+        if not decompress( buf, UNIT_SIZE ) == unit:
+            print "MISMATCH in %s" % name
+            sys.exit(1)
+    elapsed = time.time() - start
+    mb = len(units) * UNIT_SIZE / 1048576.0
+    print "%-22s: %8.3f s  %8.1f MB/s" % ( name, elapsed, mb / elapsed )
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="LZNT1 decompression benchmark")
+    parser.add_argument('--units', type=int, default=256, help="Number of 64K compression units")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    units = synthetic_units( args.units, args.seed )
+    start = time.time()
+    compressed = [ LZNT1.compress( unit ) for unit in units ]
+    print "%d units, %d bytes compressed to %d (%.1f%%) in %.1f s" % ( len(units), len(units) * UNIT_SIZE,
+            sum( len(x) for x in compressed ), 100.0 * sum( len(x) for x in compressed ) / ( len(units) * UNIT_SIZE ),
+            time.time() - start )
+
+    reference = timed( "reference decoder", reference_decompress, compressed, units )
+    python = timed( "LZNT1 python decoder", LZNT1._decompress_python, compressed, units )
+    print "speedup               : %8.1fx" % ( reference / python )
+    if not LZNT1._rtl_decompress == None:
+        timed( "RtlDecompressBuffer", LZNT1._decompress_rtl, compressed, units )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of the MFT record number -> volume offset lookup.
+
+Compares the linear walk of the $MFT data runs that __calcOffset used to do for
+every record with the RunMap binary search, on a fragmented $MFT layout.
+
+    python bench/bench_mft_lookup.py --runs 4096 --lookups 20000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TScopy'))
+from RunMap import RunMap
+
+####################################################################################
+# fragmented_runs: Builds a {index: (lcn, length)} $MFT runlist like __getMFT returns.
+#       Every run holds a whole number of records so both lookups are comparable
+####################################################################################
+def fragmented_runs( nruns, clusters_per_record, seed ):
+    rnd = random.Random( seed )
+    runs = {}
+    lcn = 0x10000
+    for i in range( nruns ):
+        length = rnd.randint( 1, 64 ) * max( clusters_per_record, 1 )
+        lcn += rnd.randint( 1, 0x4000 )
+        runs[i] = ( lcn, length )
+        lcn += length
+    return runs
+
+####################################################################################
+# linear_offset: The previous __calcOffset lookup, walks the runs from the start and
+#       steps cluster by cluster through the run holding the record
+####################################################################################
+def linear_offset( mft_vcn, target_seq_num, bytes_per_cluster, sectors_per_cluster, mft_record_size ):
+    counter = 0
+    offset = 0
+    recordsdivisor = mft_record_size / 512
+    for indx in mft_vcn:
+        current_cluster = mft_vcn[indx][1]
+        offset = mft_vcn[indx][0]
+        records_in_currentrun = (current_cluster * sectors_per_cluster) / recordsdivisor
+        counter += records_in_currentrun
+        if counter > target_seq_num:
+            break
+    tryat = counter - records_in_currentrun
+    records_per_cluster = sectors_per_cluster / recordsdivisor
+    final = 0
+    counter2 = 0
+    record_jmp = 0
+    while final < target_seq_num:
+        record_jmp += records_per_cluster
+        counter2 += 1
+        final = tryat + record_jmp
+    records_to_much = final - target_seq_num
+    return offset * bytes_per_cluster + ( counter2 * bytes_per_cluster ) - ( records_to_much * mft_record_size )
+
+def main():
+    parser = argparse.ArgumentParser(description="MFT record lookup micro-benchmark")
+    parser.add_argument('--runs', type=int, default=4096, help="Number of $MFT data runs")
+    parser.add_argument('--lookups', type=int, default=20000, help="Number of random record lookups")
+    parser.add_argument('--cluster', type=int, default=4096, help="Bytes per cluster")
+    parser.add_argument('--record', type=int, default=1024, help="Bytes per MFT record")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    clusters_per_record = args.record // args.cluster
+    runs = fragmented_runs( args.runs, clusters_per_record, args.seed )
+    runmap = RunMap( [ runs[x] for x in sorted( runs ) ], args.cluster )
+    nrecords = runmap.size // args.record
+    rnd = random.Random( args.seed )
+    targets = [ rnd.randrange( 1, nrecords ) for i in range( args.lookups ) ]
+    print "%d runs, %d records, %d lookups" % ( len(runmap), nrecords, len(targets) )
+
+    start = time.time()
+    for target in targets:
+        extents = runmap.extents( target * args.record, args.record )
+    bisect_time = time.time() - start
+    print "RunMap bisect : %8.3f s  %10.0f lookups/s" % ( bisect_time, len(targets) / bisect_time )
+
+    # The cluster stepping loop never ends when a record is larger than a cluster
+    if args.record > args.cluster:
+        print "linear walk   : skipped, it does not terminate when records span clusters"
+        return
+    start = time.time()
+    for target in targets:
+        linear_offset( runs, target, args.cluster, args.cluster // 512, args.record )
+    linear_time = time.time() - start
+    print "linear walk   : %8.3f s  %10.0f lookups/s" % ( linear_time, len(targets) / linear_time )
+    print "speedup       : %8.1fx" % ( linear_time / bisect_time )
+
+    for target in targets[:1000]:
+        if not runmap.extents( target * args.record, args.record )[0][0] == \
+                linear_offset( runs, target, args.cluster, args.cluster // 512, args.record ):
+            print "MISMATCH for record %d" % target
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,934 @@
+#!/usr/bin/env python
+"""
+Deterministic synthetic NTFS image generator.
+
+Builds raw NTFS volumes, optionally behind an MBR partition table, holding the
+structures TScopy parses: fragmented $MFT runs, MFT records split across runs,
+attribute lists, directories whose $I30 B+-tree spans many INDX blocks, sparse,
+resident, LZNT1 compressed, WOF compressed and alternate data streams and deep
+paths. The same
+seed always gives the same image.
+
+Only the metadata TScopy reads is written, the images are not meant to be mounted
+by Windows. The builder keeps the content of every stream so the copied files can
+be checked, see expected_files().
+
+    python bench/ntfs_image.py /tmp/bench.img --profile fragmented --scale 2
+"""
+import os
+import sys
+import struct
+import random
+import binascii
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TScopy'))
+import LZNT1
+
+FILETIME_EPOCH = 116444736000000000
+# Clusters of an LZNT1 compression unit
+COMPRESSION_UNIT_CLUSTERS = 16
+WOF_STREAM_NAME = 'WofCompressedData'
+WOF_CHUNK_SIZE = 0x1000
+# 'abc' * 100 compressed by Windows with XPRESS Huffman, the example of MS-XCA 3.2.
+#   There is no XPRESS compressor here so the WOF file uses this chunk
+XPRESS_ABC_CHUNK = binascii.unhexlify( ''.join( """
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000302300000000000000000000000000000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000000000000000000002000000000000000000000000000020
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+00000000a8dc0000ff2601
+""".split() ))
+
+def unix_to_filetime( ts ):
+    return int( ts * 10000000 ) + FILETIME_EPOCH
+
+def align( value, alignment ):
+    if value % alignment == 0:
+        return value
+    return value + alignment - ( value % alignment )
+
+####################################################################################
+# encode_runlist: Encodes the data runs of a non resident attribute
+#       runs: [(lcn, length in clusters)]. An lcn of None is a sparse run
+####################################################################################
+def encode_runlist( runs ):
+    out = ''
+    last = 0
+    for lcn, length in runs:
+        length_bytes = _unsigned_bytes( length )
+        if lcn == None:
+            out += chr( len(length_bytes) ) + length_bytes
+            continue
+        offset_bytes = _signed_bytes( lcn - last )
+        last = lcn
+        out += chr( (len(offset_bytes) << 4) | len(length_bytes) ) + length_bytes + offset_bytes
+    return out + '\x00'
+
+def _signed_bytes( value ):
+    for size in range( 1, 9 ):
+        if -(1 << (8 * size - 1)) <= value < (1 << (8 * size - 1)):
+            return struct.pack( '<q', value )[:size]
+    raise ValueError( value )
+
+def _unsigned_bytes( value ):
+    for size in range( 1, 9 ):
+        if value < (1 << (8 * size - 1)):
+            return struct.pack( '<Q', value )[:size]
+    raise ValueError( value )
+
+####################################################################################
+# build_upcase: $UpCase table. Identity with the ASCII and Latin-1 lower case letters
+#       folded
+####################################################################################
+def build_upcase( ):
+    table = range( 0x10000 )
+    for c in range( ord('a'), ord('z') + 1 ):
+        table[c] = c - 0x20
+    for c in range( 0xe0, 0xff ):
+        if not c == 0xf7:
+            table[c] = c - 0x20
+    table[0xff] = 0x178
+    return table
+
+####################################################################################
+# apply_fixups: Writes the update sequence array of a multi sector record. The last
+#       two bytes of every 512 byte stride are saved in the array and replaced by usn
+####################################################################################
+def apply_fixups( buf, offset, size, usa_offset, usn ):
+    struct.pack_into( '<H', buf, offset + usa_offset, usn )
+    for i in range( size // 512 ):
+        end = offset + (i + 1) * 512 - 2
+        buf[offset + usa_offset + 2 + 2 * i:offset + usa_offset + 4 + 2 * i] = buf[end:end + 2]
+        struct.pack_into( '<H', buf, end, usn )
+
+####################################################################################
+# Stream: A data stream of a file
+#       name: '' for the unnamed $DATA stream
+#       resident: None lets the builder decide from the size
+#       sparse: [(byte offset, byte length)] holes
+#       fragments: Number of runs the allocated clusters are spread over
+#       size: Size of the stream when larger than data, the rest reads as zeros
+####################################################################################
+class Stream( object ):
+    def __init__( self, name, data, resident=None, sparse=None, fragments=1, compressed=False, size=None ):
+        self.name = name
+        self.data = data
+        self.size = len(data) if size == None else size
+        self.resident = resident
+        self.sparse = sparse or []
+        self.fragments = fragments
+        self.compressed = compressed
+        self.runs = None
+        self.alloc_clusters = 0
+        self.compressed_size = 0
+
+####################################################################################
+# Node: A file or directory of the volume
+####################################################################################
+class Node( object ):
+    def __init__( self, recnum, name, parent, is_dir, times ):
+        self.recnum = recnum
+        self.seq = 1
+        self.name = name
+        self.parent = parent
+        self.is_dir = is_dir
+        self.children = []
+        self.streams = []
+        self.times = times
+        self.attribute_list = False
+        self.short_name = None
+        # (type, name, value) extra resident attributes
+        self.extra_attrs = []
+        self.file_attributes = 0x20
+        # (parent, name) hard links
+        self.links = []
+        self.dir_fragments = 1
+        # Content of a WOF compressed file once decompressed, see add_wof_file
+        self.wof = None
+
+####################################################################################
+# NTFSImageBuilder: Collects the namespace with mkdir/add_file/add_stream and writes
+#       the volume with build()
+#       cluster_size, record_size, index_block_size, sector_size: Volume geometry
+#       partition_offset: Byte offset of the volume. Non zero adds an MBR
+#       mft_fragments: Number of runs of the $MFT. With clusters smaller than records
+#                      the runs have odd lengths so records are split across runs
+#       mft_records: Minimum number of MFT records
+####################################################################################
+class NTFSImageBuilder( object ):
+    def __init__( self, cluster_size=4096, record_size=1024, index_block_size=4096, sector_size=512,
+                  partition_offset=0, mft_fragments=1, mft_records=64, seed=0, timestamp=1600000000 ):
+        self.bpc = cluster_size
+        self.record_size = record_size
+        self.index_block_size = index_block_size
+        self.sector_size = sector_size
+        self.partition_offset = partition_offset
+        self.mft_fragments = mft_fragments
+        self.min_mft_records = mft_records
+        self.random = random.Random( seed )
+        self.timestamp = timestamp
+        self.upcase = build_upcase()
+        self.nodes = {}
+        self.next_recnum = 24
+        self.clusters = {}
+        self.next_cluster = 16
+        self.__init_system()
+
+    def __times( self, ts=None ):
+        if ts == None:
+            ts = self.timestamp
+        ft = unix_to_filetime( ts )
+        return ( ft, ft, ft, ft )
+
+    ####################################################################################
+    # __init_system: The root directory and the system files. Records 16 to 23 are
+    #       reserved
+    ####################################################################################
+    def __init_system( self ):
+        root = Node( 5, '.', 5, True, self.__times() )
+        root.file_attributes = 0x06
+        self.nodes[5] = root
+        names = { 0: '$MFT', 1: '$MFTMirr', 2: '$LogFile', 3: '$Volume', 4: '$AttrDef', 6: '$Bitmap',
+                  7: '$Boot', 8: '$BadClus', 9: '$Secure', 10: '$UpCase', 11: '$Extend' }
+        for rec in range( 0, 24 ):
+            if rec == 5:
+                continue
+            if not rec in names:
+                self.nodes[rec] = None
+                continue
+            node = Node( rec, names[rec], 5, rec == 11, self.__times() )
+            node.file_attributes = 0x06
+            node.seq = rec if rec > 0 else 1
+            self.nodes[rec] = node
+            root.children.append( rec )
+        self.nodes[10].streams.append( Stream( '', ''.join( struct.pack( '<H', c ) for c in self.upcase )))
+        self.nodes[2].streams.append( Stream( '', '\xff' * 0x4000 ))
+
+    def __lookup( self, path, create_dirs=False ):
+        parts = [ p for p in path.replace( '/', '\\' ).split( '\\' ) if p ]
+        cur = 5
+        for part in parts:
+            found = None
+            for c in self.nodes[cur].children:
+                if not isinstance( c, tuple ) and self.nodes[c].name.lower() == part.lower():
+                    found = c
+                    break
+            if found == None:
+                if create_dirs == False:
+                    raise KeyError( path )
+                found = self.__new_node( part, cur, True )
+            cur = found
+        return cur
+
+    def __parent( self, path ):
+        parts = [ p for p in path.replace( '/', '\\' ).split( '\\' ) if p ]
+        if len(parts) == 1:
+            return 5, parts[-1]
+        return self.__lookup( '\\'.join( parts[:-1] ), create_dirs=True ), parts[-1]
+
+    def __new_node( self, name, parent, is_dir, ts=None ):
+        rec = self.next_recnum
+        self.next_recnum += 1
+        node = Node( rec, name, parent, is_dir, self.__times( ts ))
+        node.seq = 1 + (rec % 7)
+        if is_dir == True:
+            node.file_attributes = 0x10
+        self.nodes[rec] = node
+        self.nodes[parent].children.append( rec )
+        return rec
+
+    ####################################################################################
+    # mkdir: Creates the directory and its parents. Returns its record number
+    #       fragments: Number of runs of the $INDEX_ALLOCATION of the directory
+    ####################################################################################
+    def mkdir( self, path, timestamp=None, fragments=1 ):
+        parent, name = self.__parent( path )
+        for c in self.nodes[parent].children:
+            if not isinstance( c, tuple ) and self.nodes[c].name.lower() == name.lower():
+                self.nodes[c].dir_fragments = fragments
+                return c
+        rec = self.__new_node( name, parent, True, timestamp )
+        self.nodes[rec].dir_fragments = fragments
+        return rec
+
+    ####################################################################################
+    # add_file: Adds a file, its parent directories are created. Returns its record number
+    #       data, resident, sparse, fragments, compressed, size: The unnamed stream. See Stream
+    #       ads: {stream name: data} alternate data streams
+    #       attribute_list: True moves the attributes into extension records behind an
+    #                       $ATTRIBUTE_LIST, 'split' also puts every data run of the
+    #                       stream in its own extension record
+    ####################################################################################
+    def add_file( self, path, data='', resident=None, sparse=None, fragments=1, ads=None, attribute_list=False,
+                  compressed=False, timestamp=None, short_name=None, size=None ):
+        parent, name = self.__parent( path )
+        rec = self.__new_node( name, parent, False, timestamp )
+        node = self.nodes[rec]
+        node.streams.append( Stream( '', data, resident, sparse, fragments, compressed, size ))
+        for stream_name, value in sorted( (ads or {}).items() ):
+            node.streams.append( Stream( stream_name, value ))
+        node.attribute_list = attribute_list
+        node.short_name = short_name
+        if sparse:
+            node.file_attributes |= 0x200
+        if compressed == True:
+            node.file_attributes |= 0x800
+        return rec
+
+    ####################################################################################
+    # add_stream: Adds an alternate data stream to an existing file. See Stream
+    ####################################################################################
+    def add_stream( self, path, name, data, **kwargs ):
+        rec = self.__lookup( path )
+        self.nodes[rec].streams.append( Stream( name, data, **kwargs ))
+        return rec
+
+    ####################################################################################
+    # add_attribute: Adds a resident attribute of any type to an existing file
+    ####################################################################################
+    def add_attribute( self, path, attr_type, value, name='' ):
+        rec = self.__lookup( path )
+        self.nodes[rec].extra_attrs.append( (attr_type, name, value) )
+        return rec
+
+    ####################################################################################
+    # add_wof_file: Adds an XPRESS4K WOF compressed file. The unnamed stream is sparse,
+    #       the WOF reparse point names the algorithm and the chunk table and chunks are
+    #       in the WofCompressedData stream
+    #       chunks: [(compressed chunk, data)], a chunk as large as its data is stored
+    #               as is
+    ####################################################################################
+    def add_wof_file( self, path, chunks, timestamp=None ):
+        data = ''.join( x[1] for x in chunks )
+        rec = self.add_file( path, '', sparse=[ (0, align( len(data), 0x10000 )) ], timestamp=timestamp, size=len(data) )
+        ends = []
+        for compressed, chunk in chunks[:-1]:
+            ends.append( (ends[-1] if len(ends) > 0 else 0) + len(compressed) )
+        table = struct.pack( '<%dI' % len(ends), *ends )
+        self.add_stream( path, WOF_STREAM_NAME, table + ''.join( x[0] for x in chunks ))
+        # WOF_EXTERNAL_INFO then FILE_PROVIDER_EXTERNAL_INFO_V1 of the XPRESS4K algorithm
+        self.add_attribute( path, 0xc0, struct.pack( '<IHHIIIII', 0x80000017, 20, 0, 1, 2, 1, 0, 0 ))
+        node = self.nodes[rec]
+        node.wof = data
+        node.file_attributes |= 0x400
+        return rec
+
+    ####################################################################################
+    # add_link: Adds a hard link named path to the file target_path
+    ####################################################################################
+    def add_link( self, path, target_path ):
+        rec = self.__lookup( target_path )
+        parent, name = self.__parent( path )
+        self.nodes[rec].links.append( (parent, name) )
+        self.nodes[parent].children.append( ('link', rec, name) )
+        return rec
+
+    ####################################################################################
+    # __alloc: Allocates count clusters in up to fragments runs with gaps between them
+    ####################################################################################
+    def __alloc( self, count, fragments=1 ):
+        runs = []
+        if count == 0:
+            return runs
+        fragments = max( 1, min( fragments, count ))
+        sizes = [ count // fragments ] * fragments
+        for i in range( count % fragments ):
+            sizes[i] += 1
+        for size in sizes:
+            runs.append( (self.next_cluster, size) )
+            self.next_cluster += size
+            if fragments > 1:
+                self.next_cluster += 1 + self.random.randint( 0, 3 )
+        return runs
+
+    ####################################################################################
+    # __place: Writes data over the clusters of runs
+    ####################################################################################
+    def __place( self, runs, data ):
+        pos = 0
+        for lcn, length in runs:
+            if not lcn == None:
+                chunk = data[pos:pos + length * self.bpc]
+                for i in range( length ):
+                    piece = chunk[i * self.bpc:(i + 1) * self.bpc]
+                    if len(piece) > 0:
+                        self.clusters[lcn + i] = piece
+            pos += length * self.bpc
+
+    ####################################################################################
+    # __layout_stream: Decides whether the stream is resident, allocates its clusters
+    #       and writes its data
+    ####################################################################################
+    def __layout_stream( self, stream ):
+        if stream.resident == None:
+            stream.resident = stream.size <= 400 and not stream.sparse and stream.compressed == False
+        if stream.resident == True:
+            return
+        clusters = (stream.size + self.bpc - 1) // self.bpc
+        stream.alloc_clusters = clusters
+        if stream.compressed == True:
+            self.__layout_compressed( stream, clusters )
+            return
+        holes = set()
+        for offset, length in stream.sparse:
+            for c in range( (offset + self.bpc - 1) // self.bpc, (offset + length) // self.bpc ):
+                holes.add( c )
+        runs = []
+        vcn = 0
+        while vcn < clusters:
+            sparse = vcn in holes
+            start = vcn
+            while vcn < clusters and (vcn in holes) == sparse:
+                vcn += 1
+            if sparse == True:
+                runs.append( (None, vcn - start) )
+            else:
+                runs.extend( self.__alloc( vcn - start, stream.fragments ))
+        stream.runs = runs
+        if len(holes) > 0:
+            data = bytearray( stream.data.ljust( stream.size, '\x00' ))
+            for c in holes:
+                hole = data[c * self.bpc:(c + 1) * self.bpc]
+                data[c * self.bpc:(c + 1) * self.bpc] = '\x00' * len(hole)
+            stream.data = str( data )
+        self.__place( runs, stream.data )
+
+    ####################################################################################
+    # __layout_compressed: LZNT1 compresses the stream one compression unit at a time.
+    #       Zero units become sparse runs, units that do not shrink are stored as is
+    ####################################################################################
+    def __layout_compressed( self, stream, clusters ):
+        unit = COMPRESSION_UNIT_CLUSTERS
+        runs = []
+        stream.compressed_size = 0
+        for vcn in range( 0, clusters, unit ):
+            raw = stream.data[vcn * self.bpc:(vcn + unit) * self.bpc].ljust( unit * self.bpc, '\x00' )
+            if raw.strip( '\x00' ) == '':
+                runs.append( (None, unit) )
+                continue
+            compressed = LZNT1.compress( raw )
+            used = (len(compressed) + self.bpc - 1) // self.bpc
+            if used >= unit:
+                allocated = self.__alloc( unit )
+                self.__place( allocated, raw )
+                runs.extend( allocated )
+                stream.compressed_size += unit * self.bpc
+            else:
+                allocated = self.__alloc( used )
+                self.__place( allocated, compressed )
+                runs.extend( allocated )
+                runs.append( (None, unit - used) )
+                stream.compressed_size += used * self.bpc
+        merged = []
+        for lcn, length in runs:
+            if len(merged) > 0 and lcn == None and merged[-1][0] == None:
+                merged[-1] = ( None, merged[-1][1] + length )
+            else:
+                merged.append( (lcn, length) )
+        stream.runs = merged
+        stream.alloc_clusters = sum( length for lcn, length in merged )
+
+    ####################################################################################
+    # __resident_attr, __nonresident_attr: Attribute encoders
+    ####################################################################################
+    def __resident_attr( self, attr_type, value, name='', instance=0, indexed=False ):
+        name_raw = name.encode( 'utf-16le' )
+        value_off = align( 0x18 + len(name_raw), 8 )
+        length = align( value_off + len(value), 8 )
+        out = struct.pack( '<IIBBHHHIHBB', attr_type, length, 0, len(name), 0x18, 0, instance, len(value),
+                           value_off, 1 if indexed == True else 0, 0 )
+        out += name_raw
+        out = out.ljust( value_off, '\x00' ) + value
+        return out.ljust( length, '\x00' )
+
+    def __nonresident_attr( self, attr_type, stream, name='', instance=0, runs=None, lowest_vcn=0 ):
+        runs = stream.runs if runs == None else runs
+        name_raw = name.encode( 'utf-16le' )
+        header_len = 0x48 if stream.compressed == True else 0x40
+        runlist = encode_runlist( runs )
+        runlist_off = align( header_len + len(name_raw), 8 )
+        length = align( runlist_off + len(runlist), 8 )
+        highest_vcn = lowest_vcn + sum( length for lcn, length in runs ) - 1
+        flags = 0
+        compression_unit = 0
+        if stream.compressed == True:
+            flags |= 0x0001
+            compression_unit = 4
+        if stream.sparse:
+            flags |= 0x8000
+        out = struct.pack( '<IIBBHHH', attr_type, length, 1, len(name), header_len, flags, instance )
+        out += struct.pack( '<QQHB5x', lowest_vcn, highest_vcn, runlist_off, compression_unit )
+        if lowest_vcn > 0:
+            out += struct.pack( '<QQQ', 0, 0, 0 )
+        else:
+            out += struct.pack( '<QQQ', stream.alloc_clusters * self.bpc, stream.size, stream.size )
+        if stream.compressed == True:
+            out += struct.pack( '<Q', stream.compressed_size )
+        out += name_raw
+        out = out.ljust( runlist_off, '\x00' ) + runlist
+        return out.ljust( length, '\x00' )
+
+    def __si_value( self, node ):
+        c, m, ch, a = node.times
+        return struct.pack( '<QQQQIIIIIIQQ', c, m, ch, a, node.file_attributes & 0xffff, 0, 0, 0, 0, 0x100, 0, 0 )
+
+    def __fn_value( self, node, name, parent, name_type ):
+        ref = parent | (self.nodes[parent].seq << 48)
+        c, m, ch, a = node.times
+        size = 0
+        if node.is_dir == False and len(node.streams) > 0:
+            size = node.streams[0].size
+        raw = name.encode( 'utf-16le' )
+        return struct.pack( '<QQQQQQQIIBB', ref, c, m, ch, a, align( size, self.bpc ), size, node.file_attributes, 0,
+                            len(name), name_type ) + raw
+
+    ####################################################################################
+    # __fn_names: The (parent, name, namespace) of every $FILE_NAME of the node. A short
+    #       name gives a Win32 and a DOS name, hard links are POSIX names
+    ####################################################################################
+    def __fn_names( self, node ):
+        if node.recnum == 5:
+            return [ (5, '.', 3) ]
+        names = []
+        if node.short_name == None:
+            names.append( (node.parent, node.name, 3) )
+        else:
+            names.append( (node.parent, node.name, 1) )
+            names.append( (node.parent, node.short_name, 2) )
+        for parent, name in node.links:
+            names.append( (parent, name, 1) )
+        return names
+
+    def __index_entry( self, child, name, name_type, parent, child_vcn=None ):
+        node = self.nodes[child]
+        key = self.__fn_value( node, name, parent, name_type )
+        length = align( 0x10 + len(key), 8 )
+        flags = 0
+        if not child_vcn == None:
+            length += 8
+            flags |= 1
+        out = struct.pack( '<QHHHH', child | (node.seq << 48), length, len(key), flags, 0 ) + key
+        if child_vcn == None:
+            return out.ljust( length, '\x00' )
+        return out.ljust( length - 8, '\x00' ) + struct.pack( '<Q', child_vcn )
+
+    def __end_entry( self, child_vcn=None ):
+        if child_vcn == None:
+            return struct.pack( '<QHHHH', 0, 0x10, 0, 2, 0 )
+        return struct.pack( '<QHHHHQ', 0, 0x18, 0, 3, 0, child_vcn )
+
+    ####################################################################################
+    # __dir_entries: (record, name, namespace) of the entries of a directory in $UpCase
+    #       collation order
+    ####################################################################################
+    def __dir_entries( self, node ):
+        entries = []
+        for c in node.children:
+            if isinstance( c, tuple ):
+                entries.append( (c[1], c[2], 1) )
+                continue
+            for parent, name, name_type in self.__fn_names( self.nodes[c] ):
+                if parent == node.recnum:
+                    entries.append( (c, name, name_type) )
+        entries.sort( key=lambda e: ( [ self.upcase[ord(c)] for c in e[1] ], e[1] ))
+        return entries
+
+    def __vcn_of_block( self, block ):
+        if self.index_block_size >= self.bpc:
+            return block * (self.index_block_size // self.bpc)
+        return block * (self.index_block_size // 512)
+
+    ####################################################################################
+    # __build_index: Returns the $INDEX_ROOT value and the INDX blocks of a directory,
+    #       None when everything fits in the root. The B+-tree is built bottom up, each
+    #       level is packed into blocks and the entry following every full block moves
+    #       up a level with the block as its child, until a level fits in the root
+    ####################################################################################
+    def __build_index( self, node, root_capacity ):
+        parent = node.recnum
+        items = [ (c, n, t, None) for c, n, t in self.__dir_entries( node ) ]
+        end_vcn = None
+        blocks = []
+        usa_count = self.index_block_size // 512 + 1
+        block_capacity = self.index_block_size - align( 0x28 + 2 * usa_count, 8 )
+        while True:
+            raw = [ self.__index_entry( c, n, t, parent, v ) for c, n, t, v in items ]
+            end_size = 0x10 if end_vcn == None else 0x18
+            if 0x20 + sum( len(r) for r in raw ) + end_size <= root_capacity:
+                body = ''.join( raw ) + self.__end_entry( end_vcn )
+                return self.__index_root( body, len(blocks) > 0 ), blocks or None
+            leaf = end_vcn == None
+            promoted = []
+            cur = []
+            cur_size = 0
+            for i, item in enumerate( items ):
+                if len(cur) > 0 and cur_size + len(raw[i]) + end_size > block_capacity:
+                    if i + 1 < len(items):
+                        vcn = self.__vcn_of_block( len(blocks) )
+                        blocks.append( ( [ x[1] for x in cur ], item[3], leaf, vcn ))
+                        promoted.append( (item[0], item[1], item[2], vcn) )
+                        cur = []
+                        cur_size = 0
+                        continue
+                    last = cur.pop()
+                    vcn = self.__vcn_of_block( len(blocks) )
+                    blocks.append( ( [ x[1] for x in cur ], last[0][3], leaf, vcn ))
+                    promoted.append( (last[0][0], last[0][1], last[0][2], vcn) )
+                    cur = []
+                    cur_size = 0
+                cur.append( (item, raw[i]) )
+                cur_size += len(raw[i])
+            vcn = self.__vcn_of_block( len(blocks) )
+            blocks.append( ( [ x[1] for x in cur ], end_vcn, leaf, vcn ))
+            items = promoted
+            end_vcn = vcn
+
+    def __index_root( self, body, large ):
+        if self.index_block_size >= self.bpc:
+            clusters_per_block = self.index_block_size // self.bpc
+        else:
+            clusters_per_block = self.index_block_size // 512
+        header = struct.pack( '<IIIB3x', 0x30, 1, self.index_block_size, clusters_per_block )
+        index = struct.pack( '<IIIB3x', 0x10, 0x10 + len(body), 0x10 + len(body), 1 if large == True else 0 )
+        return header + index + body
+
+    def __index_block( self, entries, end_vcn, leaf, vcn ):
+        size = self.index_block_size
+        usa_count = size // 512 + 1
+        entries_start = align( 0x28 + 2 * usa_count, 8 )
+        body = ''.join( entries ) + self.__end_entry( end_vcn )
+        buf = bytearray( size )
+        struct.pack_into( '<4sHHQQ', buf, 0, 'INDX', 0x28, usa_count, 0, vcn )
+        struct.pack_into( '<IIIB3x', buf, 0x18, entries_start - 0x18, entries_start - 0x18 + len(body), size - 0x18,
+                          0 if leaf == True else 1 )
+        buf[entries_start:entries_start + len(body)] = body
+        apply_fixups( buf, 0, size, 0x28, 0x0101 + (vcn % 0x100) )
+        return str( buf )
+
+    def __record( self, recnum, seq, flags, attrs, base_ref=0 ):
+        size = self.record_size
+        usa_count = size // 512 + 1
+        attrs_off = align( 0x30 + 2 * usa_count, 8 )
+        body = ''.join( attrs ) + '\xff\xff\xff\xff'
+        used = align( attrs_off + len(body), 8 )
+        if used > size:
+            raise ValueError( 'record %d overflow (%d bytes)' % ( recnum, used ))
+        buf = bytearray( size )
+        struct.pack_into( '<4sHHQHHHHIIQHHI', buf, 0, 'FILE', 0x30, usa_count, 0, seq, 1, attrs_off, flags, used,
+                          size, base_ref, len(attrs) + 1, 0, recnum & 0xffffffff )
+        buf[attrs_off:attrs_off + len(body)] = body
+        apply_fixups( buf, 0, size, 0x30, 0x0001 + (recnum % 0x7f) )
+        return buf
+
+    def __record_capacity( self ):
+        usa_count = self.record_size // 512 + 1
+        return self.record_size - align( 0x30 + 2 * usa_count, 8 ) - 8
+
+    def __file_attributes( self, node ):
+        attrs = [ (0x10, '', self.__resident_attr( 0x10, self.__si_value( node ))) ]
+        for parent, name, name_type in self.__fn_names( node ):
+            attrs.append( (0x30, '', self.__resident_attr( 0x30, self.__fn_value( node, name, parent, name_type ), indexed=True )) )
+        for attr_type, name, value in node.extra_attrs:
+            attrs.append( (attr_type, name, self.__resident_attr( attr_type, value, name )) )
+        for stream in node.streams:
+            self.__layout_stream( stream )
+            if stream.resident == True:
+                attrs.append( (0x80, stream.name, self.__resident_attr( 0x80, stream.data, stream.name )) )
+            elif node.attribute_list == 'split' and len(stream.runs) > 1:
+                # One extent per run, each in its own extension record
+                vcn = 0
+                for run in stream.runs:
+                    attrs.append( (0x80, stream.name, self.__nonresident_attr( 0x80, stream, stream.name, runs=[ run ], lowest_vcn=vcn )) )
+                    vcn += run[1]
+            else:
+                attrs.append( (0x80, stream.name, self.__nonresident_attr( 0x80, stream, stream.name )) )
+        return attrs
+
+    def __dir_attributes( self, node ):
+        attrs = [ (0x10, '', self.__resident_attr( 0x10, self.__si_value( node ))) ]
+        for parent, name, name_type in self.__fn_names( node ):
+            attrs.append( (0x30, '', self.__resident_attr( 0x30, self.__fn_value( node, name, parent, name_type ), indexed=True )) )
+        for stream in node.streams:
+            self.__layout_stream( stream )
+            if stream.resident == True:
+                attrs.append( (0x80, stream.name, self.__resident_attr( 0x80, stream.data, stream.name )) )
+            else:
+                attrs.append( (0x80, stream.name, self.__nonresident_attr( 0x80, stream, stream.name )) )
+        root_capacity = self.__record_capacity() - sum( len(a[2]) for a in attrs ) - 0x20 - 0x60
+        root, blocks = self.__build_index( node, root_capacity )
+        attrs.append( (0x90, '$I30', self.__resident_attr( 0x90, root, '$I30' )) )
+        if not blocks == None:
+            data = ''.join( self.__index_block( *block ) for block in blocks )
+            stream = Stream( '$I30', data )
+            stream.alloc_clusters = (len(data) + self.bpc - 1) // self.bpc
+            stream.runs = self.__alloc( stream.alloc_clusters, node.dir_fragments )
+            self.__place( stream.runs, data )
+            attrs.append( (0xa0, '$I30', self.__nonresident_attr( 0xa0, stream, '$I30' )) )
+            bitmap = '\xff' * ((len(blocks) + 7) // 8)
+            attrs.append( (0xb0, '$I30', self.__resident_attr( 0xb0, bitmap.ljust( 8, '\x00' ), '$I30' )) )
+        return attrs
+
+    def __attribute_list_value( self, entries ):
+        out = ''
+        for attr_type, name, rec, seq, instance in entries:
+            raw = name.encode( 'utf-16le' )
+            length = align( 0x1a + len(raw), 8 )
+            entry = struct.pack( '<IHBBQQH', attr_type, length, len(name), 0x1a, 0, rec | (seq << 48), instance ) + raw
+            out += entry.ljust( length, '\x00' )
+        return out
+
+    ####################################################################################
+    # __node_records: Returns {record number: record} of a node. Attributes that do not
+    #       fit the base record, or every attribute when attribute_list is set, are
+    #       moved into extension records listed by an $ATTRIBUTE_LIST
+    ####################################################################################
+    def __node_records( self, node ):
+        if node.is_dir == True:
+            attrs = self.__dir_attributes( node )
+        else:
+            attrs = self.__file_attributes( node )
+        attrs = [ (t, n, r[:0xe] + struct.pack( '<H', i ) + r[0x10:]) for i, (t, n, r) in enumerate( attrs ) ]
+        flags = 0x1 | (0x2 if node.is_dir == True else 0)
+        capacity = self.__record_capacity()
+        if node.attribute_list == False and sum( len(a[2]) for a in attrs ) <= capacity:
+            return { node.recnum: self.__record( node.recnum, node.seq, flags, [ a[2] for a in attrs ] ) }
+        keep = [ a for a in attrs if a[0] in (0x10, 0x30) ]
+        move = [ a for a in attrs if not a[0] in (0x10, 0x30) ]
+        ext_records = {}
+        placement = []
+        cur = []
+        cur_size = 0
+        ext_recnum = None
+        for a in move:
+            if ext_recnum == None or cur_size + len(a[2]) > capacity or node.attribute_list == 'split':
+                if not ext_recnum == None:
+                    ext_records[ext_recnum] = cur
+                ext_recnum = self.next_recnum
+                self.next_recnum += 1
+                self.nodes[ext_recnum] = 'ext'
+                cur = []
+                cur_size = 0
+            cur.append( a )
+            cur_size += len(a[2])
+            placement.append( (a[0], a[1], ext_recnum) )
+        if not ext_recnum == None:
+            ext_records[ext_recnum] = cur
+        entries = [ (t, n, node.recnum, node.seq, i) for i, (t, n, r) in enumerate( keep ) ]
+        entries += [ (t, n, rec, 1, 0) for t, n, rec in placement ]
+        entries.sort( key=lambda e: e[0] )
+        attribute_list = self.__resident_attr( 0x20, self.__attribute_list_value( entries ))
+        out = { node.recnum: self.__record( node.recnum, node.seq, flags, [ keep[0][2], attribute_list ] + [ k[2] for k in keep[1:] ] ) }
+        for rec, extension in ext_records.items():
+            out[rec] = self.__record( rec, 1, 0x1, [ a[2] for a in extension ], base_ref=node.recnum | (node.seq << 48) )
+        return out
+
+    ####################################################################################
+    # build: Writes the image to filename. Returns filename
+    ####################################################################################
+    def build( self, filename ):
+        records = {}
+        for rec in sorted( k for k, v in self.nodes.items() if isinstance( v, Node )):
+            if rec > 0:
+                records.update( self.__node_records( self.nodes[rec] ))
+
+        nrecords = align( max( max( records ) + 1, self.min_mft_records ), 4 )
+        mft_clusters = (nrecords * self.record_size + self.bpc - 1) // self.bpc
+        mft_stream = Stream( '', '', resident=False )
+        mft_stream.size = mft_clusters * self.bpc
+        mft_stream.alloc_clusters = mft_clusters
+        mft_stream.runs = self.__mft_runs( mft_clusters )
+        self.nodes[0].streams = [ mft_stream ]
+        records[0] = self.__record( 0, 1, 0x1, self.__mft_attributes( self.nodes[0], mft_stream ))
+
+        mft_data = bytearray( mft_clusters * self.bpc )
+        for rec, raw in records.items():
+            mft_data[rec * self.record_size:(rec + 1) * self.record_size] = raw
+        mft_stream.data = str( mft_data )
+        self.__place( mft_stream.runs, mft_stream.data )
+        mirror = self.__alloc( max( 1, (4 * self.record_size) // self.bpc ))
+        self.__place( mirror, str( mft_data[:4 * self.record_size] ))
+
+        total_clusters = self.next_cluster + 16
+        with open( filename, 'wb' ) as fd:
+            if self.partition_offset > 0:
+                fd.write( self.__mbr( total_clusters ))
+            fd.seek( self.partition_offset )
+            fd.write( self.__boot_sector( total_clusters, mft_stream.runs[0][0], mirror[0][0] ))
+            # Contiguous clusters are written together
+            lcns = sorted( self.clusters )
+            start = 0
+            while start < len(lcns):
+                end = start + 1
+                while end < len(lcns) and lcns[end] == lcns[end-1] + 1 and len(self.clusters[lcns[end-1]]) == self.bpc:
+                    end += 1
+                fd.seek( self.partition_offset + lcns[start] * self.bpc )
+                fd.write( ''.join( self.clusters[lcn] for lcn in lcns[start:end] ))
+                start = end
+            fd.seek( self.partition_offset + total_clusters * self.bpc - 1 )
+            fd.write( '\x00' )
+        self.mft_runs = mft_stream.runs
+        self.nrecords = nrecords
+        return filename
+
+    ####################################################################################
+    # __mft_runs: Allocates the $MFT in mft_fragments runs. With clusters smaller than
+    #       records odd run lengths split records across runs
+    ####################################################################################
+    def __mft_runs( self, clusters ):
+        if self.mft_fragments <= 1:
+            return self.__alloc( clusters )
+        runs = []
+        remaining = clusters
+        per_run = max( 1, clusters // self.mft_fragments )
+        while remaining > 0:
+            size = remaining
+            if remaining > per_run:
+                size = min( remaining, per_run + self.random.randint( 0, 3 ))
+            if self.bpc < self.record_size and size > 1 and size % 2 == 0 and remaining > size:
+                size -= 1
+            runs.append( (self.next_cluster, size) )
+            self.next_cluster += size + 1 + self.random.randint( 0, 5 )
+            remaining -= size
+        return runs
+
+    def __mft_attributes( self, node, mft_stream ):
+        attrs = [ self.__resident_attr( 0x10, self.__si_value( node )),
+                  self.__resident_attr( 0x30, self.__fn_value( node, '$MFT', 5, 3 ), indexed=True ),
+                  self.__nonresident_attr( 0x80, mft_stream ),
+                  self.__resident_attr( 0xb0, '\xff' * 8 ) ]
+        return [ r[:0xe] + struct.pack( '<H', i ) + r[0x10:] for i, r in enumerate( attrs ) ]
+
+    def __boot_sector( self, total_clusters, mft_lcn, mirror_lcn ):
+        buf = bytearray( self.sector_size )
+        buf[0:3] = '\xeb\x52\x90'
+        buf[3:11] = 'NTFS    '
+        struct.pack_into( '<H', buf, 0x0b, self.sector_size )
+        struct.pack_into( '<B', buf, 0x0d, self.bpc // self.sector_size )
+        struct.pack_into( '<B', buf, 0x15, 0xf8 )
+        struct.pack_into( '<H', buf, 0x18, 63 )
+        struct.pack_into( '<H', buf, 0x1a, 255 )
+        struct.pack_into( '<I', buf, 0x1c, self.partition_offset // 512 )
+        struct.pack_into( '<Q', buf, 0x28, total_clusters * (self.bpc // self.sector_size) - 1 )
+        struct.pack_into( '<Q', buf, 0x30, mft_lcn )
+        struct.pack_into( '<Q', buf, 0x38, mirror_lcn )
+        # Sizes smaller than a cluster are stored as -log2(size)
+        if self.record_size >= self.bpc:
+            struct.pack_into( '<B', buf, 0x40, self.record_size // self.bpc )
+        else:
+            struct.pack_into( '<b', buf, 0x40, -(self.record_size.bit_length() - 1) )
+        if self.index_block_size >= self.bpc:
+            struct.pack_into( '<B', buf, 0x44, self.index_block_size // self.bpc )
+        else:
+            struct.pack_into( '<b', buf, 0x44, -(self.index_block_size.bit_length() - 1) )
+        struct.pack_into( '<Q', buf, 0x48, 0x1234567890abcdef )
+        buf[510:512] = '\x55\xaa'
+        return str( buf )
+
+    def __mbr( self, total_clusters ):
+        buf = bytearray( 512 )
+        struct.pack_into( '<B3sB3sII', buf, 0x1be, 0x80, '\x00\x00\x00', 0x07, '\x00\x00\x00',
+                          self.partition_offset // 512, total_clusters * self.bpc // 512 )
+        buf[510:512] = '\x55\xaa'
+        return str( buf )
+
+####################################################################################
+# expected_files: {output path: content} of every stream of the volume as TScopy
+#       writes it under the output directory. Paths are lower case, relative to the
+#       root of the volume and use / as separator
+####################################################################################
+def expected_files( builder ):
+    ret = {}
+    def walk( rec, path ):
+        for c in builder.nodes[rec].children:
+            if isinstance( c, tuple ):
+                continue
+            node = builder.nodes[c]
+            child_path = path + '/' + node.name
+            if node.is_dir == True:
+                walk( c, child_path )
+            if not node.wof == None:
+                ret[child_path.lower()] = node.wof
+                continue
+            for stream in node.streams:
+                name = child_path if len(stream.name) == 0 else child_path + '_ADS_' + stream.name
+                ret[name.lower()] = stream.data.ljust( stream.size, '\x00' )[:stream.size]
+    walk( 5, '' )
+    return ret
+
+####################################################################################
+# PROFILES: Volume geometry of the benchmark images
+#       default: 4K clusters and a fragmented $MFT
+#       small_clusters: 512 byte clusters, MFT records split across $MFT runs
+#       partitioned: The volume behind an MBR at 1MB
+####################################################################################
+PROFILES = { 'default': { 'cluster_size': 4096, 'mft_fragments': 8 },
+             'small_clusters': { 'cluster_size': 512, 'mft_fragments': 32 },
+             'partitioned': { 'cluster_size': 4096, 'mft_fragments': 8, 'partition_offset': 0x100000 } }
+
+####################################################################################
+# build_bench_image: Builds the benchmark volume. Returns the builder
+#       scale: Multiplies the number of users, files and the size of the large file
+#       large_size: Size of the large fragmented file in MB at scale 1
+#   Layout:
+#       users\userNNN\ntuser.dat (+ ADS), ntuser.dat.LOG1 and AppData\...\Recent\*.lnk
+#       windows\winsxs\manifests: One huge directory, hundreds of INDX blocks
+#       windows\system32\config: Hives, SYSTEM with an attribute list split across records
+#       windows\system32\winevt\logs: LZNT1 compressed and sparse event logs
+#       windows\system32\compact.exe: WOF compressed, a stored and an XPRESS chunk
+#       data\large.bin: The large file, fragmented with a sparse range
+#       deep\level00\...\level29\deep.txt: Deep path
+####################################################################################
+def build_bench_image( filename, profile='default', scale=1, large_size=32, seed=1 ):
+    builder = NTFSImageBuilder( seed=seed, **PROFILES[profile] )
+    rnd = random.Random( seed )
+    words = [ 'alpha', 'beta', 'gamma', 'delta', 'S-1-5-18', 'HKLM', 'SOFTWARE', 'Microsoft', 'Windows' ]
+    def text( size ):
+        ret = []
+        total = 0
+        while total < size:
+            line = '%d %s\r\n' % ( rnd.randint( 0, 99999 ), ' '.join( rnd.choice( words ) for n in range( 6 )))
+            ret.append( line )
+            total += len(line)
+        return ''.join( ret )[:size]
+    for user in range( 20 * scale ):
+        home = 'users\\user%03d' % user
+        builder.add_file( home + '\\ntuser.dat', text( 40000 ), fragments=3, ads={ 'Zone.Identifier': '[ZoneTransfer]\r\nZoneId=3\r\n' } )
+        builder.add_file( home + '\\ntuser.dat.LOG1', text( 300 ))
+        for n in range( 25 ):
+            builder.add_file( home + '\\AppData\\Roaming\\Microsoft\\Windows\\Recent\\recent%03d.lnk' % n, text( 600 ))
+    builder.mkdir( 'windows\\winsxs\\manifests', fragments=4 )
+    for n in range( 3000 * scale ):
+        builder.add_file( 'windows\\winsxs\\manifests\\amd64_microsoft-windows-component%05d_31bf3856ad364e35.manifest' % n, text( 200 + n % 700 ))
+    builder.add_file( 'windows\\system32\\config\\SYSTEM', text( 2000000 ), fragments=6, attribute_list='split' )
+    builder.add_file( 'windows\\system32\\config\\SOFTWARE', text( 1500000 ), fragments=4, attribute_list=True )
+    builder.add_file( 'windows\\system32\\config\\SAM', text( 65536 ))
+    builder.add_file( 'windows\\system32\\winevt\\logs\\Security.evtx', text( 1000000 ), compressed=True )
+    builder.add_file( 'windows\\system32\\winevt\\logs\\System.evtx', text( 1000000 ), sparse=[ (262144, 524288) ] )
+    large = large_size * scale * 0x100000
+    builder.add_file( 'data\\large.bin', text( 0x100000 ) * (large // 0x100000), fragments=16,
+                      sparse=[ (large // 2, 0x100000) ] )
+    builder.add_file( 'deep\\' + '\\'.join( 'level%02d' % n for n in range( 30 )) + '\\deep.txt', text( 5000 ))
+    stored = text( WOF_CHUNK_SIZE )
+    builder.add_wof_file( 'windows\\system32\\compact.exe', [ (stored, stored), (XPRESS_ABC_CHUNK, 'abc' * 100) ] )
+    builder.build( filename )
+    return builder
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds a synthetic NTFS image for the benchmarks")
+    parser.add_argument('filename', help="Image to write")
+    parser.add_argument('--profile', choices=sorted( PROFILES ), default='default')
+    parser.add_argument('--scale', type=int, default=1, help="Multiplies the number of files and the size of the large file")
+    parser.add_argument('--large_size', type=int, default=32, help="Size of the large file in MB at scale 1")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    builder = build_bench_image( args.filename, args.profile, args.scale, args.large_size, args.seed )
+    print "%s: %d MFT records, %d clusters of %d bytes, $MFT in %d runs" % ( args.filename, builder.nrecords,
+            builder.next_cluster + 16, builder.bpc, len(builder.mft_runs) )
+
+if __name__ == '__main__':
+    main()
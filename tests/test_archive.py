@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Tests of the tar and zip archive writers.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.join( os.path.dirname( os.path.abspath( __file__ )), '..' )
+sys.path.insert( 0, os.path.join( ROOT, 'bench' ))
+sys.path.insert( 0, os.path.join( ROOT, 'TScopy' ))
+import ntfs_image
+import Archive
+import Compress
+
+TSCOPY = os.path.join( ROOT, 'tscopy.py' )
+
+####################################################################################
+# read_members: {member name: data} of a tar, compressed tar or zip file
+####################################################################################
+def read_members( filename ):
+    if filename.endswith( '.zip' ):
+        with zipfile.ZipFile( filename ) as archive:
+            return dict( ( name, archive.read( name )) for name in archive.namelist() )
+    archive = tarfile.open( filename )
+    try:
+        return dict( ( member.name, archive.extractfile( member ).read() ) for member in archive.getmembers() )
+    finally:
+        archive.close()
+
+class ArchiveFilenameTest( unittest.TestCase ):
+    def test_compressed_tar( self ):
+        self.assertEqual( Archive.archive_filename( 'out.tar', 'gzip' ), 'out.tar.gz' )
+        self.assertEqual( Archive.archive_filename( 'out.tar', 'zstd' ), 'out.tar.zst' )
+        self.assertEqual( Archive.archive_filename( 'out', 'gzip' ), 'out.gz' )
+
+    def test_suffix_kept( self ):
+        self.assertEqual( Archive.archive_filename( 'out.tar', None ), 'out.tar' )
+        self.assertEqual( Archive.archive_filename( 'OUT.TAR.GZ', 'gzip' ), 'OUT.TAR.GZ' )
+        self.assertEqual( Archive.archive_filename( 'out.tgz', 'gzip' ), 'out.tgz' )
+        self.assertEqual( Archive.archive_filename( 'out.tar.zst', 'zstd' ), 'out.tar.zst' )
+        self.assertEqual( Archive.archive_filename( 'out.zip', 'gzip' ), 'out.zip' )
+
+    def test_open_archive( self ):
+        tmpdir = tempfile.mkdtemp()
+        pool = Compress.compression_pool( 1 )
+        try:
+            archive = Archive.open_archive( os.path.join( tmpdir, 'out.tar' ), 'gzip', pool )
+            archive.add_bytes( 'a.txt', 'abc' )
+            archive.close()
+            self.assertEqual( archive.filename, os.path.join( tmpdir, 'out.tar.gz' ))
+            self.assertEqual( os.listdir( tmpdir ), [ 'out.tar.gz' ] )
+        finally:
+            pool.close()
+            shutil.rmtree( tmpdir )
+
+class ArchiveMemberTest( unittest.TestCase ):
+    def setUp( self ):
+        self.workdir = tempfile.mkdtemp()
+        self.pool = Compress.compression_pool( 2 )
+
+    def tearDown( self ):
+        self.pool.close()
+        shutil.rmtree( self.workdir )
+
+    # Separators become '/', leading ones are dropped, the ADS suffix is kept as is
+    def test_member_names( self ):
+        for filename, compression in ( ('out.tar', None), ('out.tar', 'gzip'), ('out.zip', None), ('out.zip', 'gzip') ):
+            archive = Archive.open_archive( os.path.join( self.workdir, filename ), compression, self.pool )
+            archive.add_bytes( os.sep + os.path.join( 'users', 'alice', 'ntuser.dat' ), 'hive' )
+            archive.add_bytes( 'users/alice/ntuser.dat_ADS_Zone.Identifier', '[ZoneTransfer]' )
+            archive.add_bytes( 'users/alice/report.docx_ADS_my stream', '' )
+            archive.close()
+            self.assertEqual( read_members( archive.filename ), { 'users/alice/ntuser.dat': 'hive',
+                              'users/alice/ntuser.dat_ADS_Zone.Identifier': '[ZoneTransfer]',
+                              'users/alice/report.docx_ADS_my stream': '' }, archive )
+            os.remove( archive.filename )
+
+    # A member closed short, a read failed, is padded with zeros to its declared size
+    def test_short_member( self ):
+        for filename in ( 'out.tar', 'out.zip' ):
+            archive = Archive.open_archive( os.path.join( self.workdir, filename ))
+            entry = archive.open_entry( 'a.bin', 1000 )
+            entry.write( 'x' * 10 )
+            entry.close()
+            archive.add_bytes( 'b.txt', 'next' )
+            archive.close()
+            self.assertEqual( read_members( archive.filename ), { 'a.bin': 'x' * 10 + '\x00' * 990, 'b.txt': 'next' } )
+
+    def test_member_too_large( self ):
+        archive = Archive.open_archive( os.path.join( self.workdir, 'out.tar' ))
+        entry = archive.open_entry( 'a.bin', 4 )
+        self.assertRaises( Exception, entry.write, 'abcde' )
+        entry.close()
+        archive.close()
+
+class ArchiveCopyTest( unittest.TestCase ):
+    @classmethod
+    def setUpClass( cls ):
+        cls.workdir = tempfile.mkdtemp( prefix='tscopy_test_' )
+        cls.image = os.path.join( cls.workdir, 'archive.img' )
+        builder = ntfs_image.NTFSImageBuilder( seed=1 )
+        builder.add_file( 'Users\\alice\\NTUSER.DAT', 'hive of alice\r\n' * 500,
+                          ads={ 'Zone.Identifier': '[ZoneTransfer]\r\nZoneId=3\r\n', 'my stream': 'ads data' * 100 } )
+        builder.add_file( 'Users\\alice\\notes.txt', 'notes' )
+        builder.build( cls.image )
+
+    @classmethod
+    def tearDownClass( cls ):
+        shutil.rmtree( cls.workdir, ignore_errors=True )
+
+    def run_tscopy( self, archive, *args ):
+        outdir = tempfile.mkdtemp( dir=self.workdir )
+        cmd = [ sys.executable, TSCOPY, '--image', self.image, '-o', outdir, '-i', '-r', '-f', 'c:\\users',
+                '--archive', os.path.join( outdir, archive ) ] + list( args )
+        proc = subprocess.Popen( cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT )
+        output = proc.communicate()[0]
+        self.assertEqual( proc.returncode, 0, output )
+        self.assertEqual( [ line for line in output.splitlines() if ' - ERROR - ' in line ], [] )
+        return outdir
+
+    # The ADS of a file are members named <file>_ADS_<stream>, next to the file. The
+    #   paths are those requested, the stream names keep their case
+    def test_ads_members( self ):
+        for archive, args, filename in ( ('out.tar', [], 'out.tar'), ('out.zip', [], 'out.zip'),
+                                         ('out.tar', [ '--compress', 'gzip' ], 'out.tar.gz'),
+                                         ('out.zip', [ '--compress', 'gzip' ], 'out.zip') ):
+            outdir = self.run_tscopy( archive, *args )
+            members = read_members( os.path.join( outdir, filename ))
+            self.assertEqual( sorted( members ), [ 'users/alice/notes.txt', 'users/alice/ntuser.dat',
+                                                   'users/alice/ntuser.dat_ADS_Zone.Identifier',
+                                                   'users/alice/ntuser.dat_ADS_my stream' ], filename )
+            self.assertEqual( members['users/alice/ntuser.dat_ADS_my stream'], 'ads data' * 100 )
+            self.assertEqual( members['users/alice/ntuser.dat_ADS_Zone.Identifier'], '[ZoneTransfer]\r\nZoneId=3\r\n' )
+            self.assertEqual( members['users/alice/ntuser.dat'], 'hive of alice\r\n' * 500 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Tests of the file filter, on a small synthetic image like tests/test_targets.py.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.join( os.path.dirname( os.path.abspath( __file__ )), '..' )
+sys.path.insert( 0, os.path.join( ROOT, 'bench' ))
+sys.path.insert( 0, os.path.join( ROOT, 'TScopy' ))
+import ntfs_image
+import Filter
+
+TSCOPY = os.path.join( ROOT, 'tscopy.py' )
+USERS = 3
+
+class ParseTest( unittest.TestCase ):
+    def test_parse_size( self ):
+        for text, size in ( ('1024', 1024), ('0', 0), ('4k', 4096), ('4KB', 4096), (' 500 MB ', 500 << 20),
+                            ('2g', 2 << 30), ('1TB', 1 << 40), ('7b', 7) ):
+            self.assertEqual( Filter.parse_size( text ), size, text )
+
+    def test_invalid_size( self ):
+        for text in ( '', 'MB', '-1', '1.5G', '10x', '10 k b', '4kib' ):
+            self.assertRaises( Exception, Filter.parse_size, text )
+
+    def test_parse_age( self ):
+        for text, seconds in ( ('45s', 45), ('30m', 1800), ('12h', 43200), ('7d', 604800), ('2w', 1209600),
+                               ('3', 259200), ('3D', 259200), (' 0h ', 0) ):
+            self.assertEqual( Filter.parse_age( text ), seconds, text )
+
+    def test_invalid_age( self ):
+        for text in ( '', 'd', '-2d', '1.5h', '1y', '7 days' ):
+            self.assertRaises( Exception, Filter.parse_age, text )
+
+    # Dates are UTC whatever the time zone of the host
+    def test_parse_date( self ):
+        for text, seconds in ( ('1970-01-01', 0), ('2024-02-29', 1709164800), ('2024-01-02T03:04:05', 1704164645),
+                               ('2024-01-02 03:04:05', 1704164645), (' 2024-01-02 ', 1704153600) ):
+            self.assertEqual( Filter.parse_date( text ), seconds, text )
+
+    def test_invalid_date( self ):
+        for text in ( '', '2023-02-29', '2024-13-01', '2024/01/02', '2024-01-02T25:00:00', '02-01-2024' ):
+            self.assertRaises( Exception, Filter.parse_date, text )
+
+    def test_extensions( self ):
+        file_filter = Filter.FileFilter( extensions=[ '.EVTX', 'lnk', ' ' ] )
+        self.assertEqual( file_filter.extensions, ( '.evtx', '.lnk' ))
+        self.assertTrue( file_filter.match_name( 'Security.Evtx' ))
+        self.assertFalse( file_filter.match_name( 'notes.txt' ))
+        self.assertFalse( file_filter.match_name( 'archive.lnk.bak' ))
+        self.assertFalse( file_filter.needs_record() )
+        self.assertTrue( Filter.FileFilter().match_name( 'anything' ))
+        self.assertTrue( Filter.FileFilter( min_size=0 ).needs_record() )
+
+class FilterCopyTest( unittest.TestCase ):
+    @classmethod
+    def setUpClass( cls ):
+        cls.workdir = tempfile.mkdtemp( prefix='tscopy_test_' )
+        cls.image = os.path.join( cls.workdir, 'filter.img' )
+        builder = ntfs_image.NTFSImageBuilder( seed=1 )
+        for user in range( USERS ):
+            home = 'users\\user%03d' % user
+            builder.add_file( home + '\\ntuser.dat', 'hive of user %d\r\n' % user * 100 )
+            builder.add_file( home + '\\recent\\report.docx.lnk', 'link %d' % user )
+            builder.add_file( home + '\\recent\\notes.txt', 'notes %d' % user )
+            builder.mkdir( home + '\\recent\\empty' )
+        builder.build( cls.image )
+
+    @classmethod
+    def tearDownClass( cls ):
+        shutil.rmtree( cls.workdir, ignore_errors=True )
+
+    # Returns (the copied files relative to the output directory, the performance summary)
+    def run_tscopy( self, *args ):
+        outdir = tempfile.mkdtemp( dir=self.workdir )
+        cmd = [ sys.executable, TSCOPY, '--image', self.image, '-o', outdir, '-i' ] + list( args )
+        proc = subprocess.Popen( cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT )
+        output = proc.communicate()[0]
+        self.assertEqual( proc.returncode, 0, output )
+        self.assertEqual( [ line for line in output.splitlines() if ' - ERROR - ' in line ], [] )
+        files = []
+        for root, dirs, names in os.walk( outdir ):
+            files.extend( os.path.relpath( os.path.join( root, name ), outdir ).replace( os.sep, '/' ) for name in names )
+        summary = None
+        for line in output.splitlines():
+            if ' - Performance summary ' in line:
+                summary = json.loads( line.split( ' - Performance summary ', 1 )[1] )
+        return sorted( files ), summary
+
+    # Directories are walked, only the files left out are counted
+    def test_extension_recursive( self ):
+        for scan in ( [], [ '--scan' ] ):
+            files, summary = self.run_tscopy( '-r', '-f', 'c:\\users', '--ext', 'lnk', *scan )
+            self.assertEqual( files, [ 'users/user%03d/recent/report.docx.lnk' % user for user in range( USERS ) ] )
+            self.assertEqual( summary['counters']['files_filtered'], 2 * USERS )
+
+    # The size is read from the MFT record of the file
+    def test_size( self ):
+        files, summary = self.run_tscopy( '-r', '-f', 'c:\\users', '--min_size', '1k' )
+        self.assertEqual( files, [ 'users/user%03d/ntuser.dat' % user for user in range( USERS ) ] )
+        files, summary = self.run_tscopy( '-r', '-f', 'c:\\users', '--max_size', '6' )
+        self.assertEqual( files, [ 'users/user%03d/recent/report.docx.lnk' % user for user in range( USERS ) ] )
+
+if __name__ == '__main__':
+    unittest.main()
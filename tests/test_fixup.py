@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Tests of the update sequence fixups of MFT records and INDX blocks.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import struct
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TScopy'))
+import Fixup
+
+FILE_MAGIC = struct.unpack( '<I', 'FILE' )[0]
+USA_OFFSET = 0x30
+
+####################################################################################
+# protected: Returns (the structure as written on disk, the structure once fixed)
+#       stride: Bytes covered by one update sequence array entry
+####################################################################################
+def protected( size, usn, stride=512, magic='FILE', seed=0 ):
+    count = size // stride + 1
+    data = bytearray( chr( ( n * 7 + seed ) % 251 ) for n in xrange( size ))
+    data[0:4] = magic
+    struct.pack_into( '<HH', data, 4, USA_OFFSET, count )
+    struct.pack_into( '<H', data, USA_OFFSET, usn )
+    for n in xrange( 1, count ):
+        data[USA_OFFSET+2*n:USA_OFFSET+2*n+2] = data[n*stride-2:n*stride]
+    fixed = bytearray( data )
+    for n in xrange( 1, count ):
+        struct.pack_into( '<H', data, n*stride - 2, usn )
+    return data, fixed
+
+class FixupTest( unittest.TestCase ):
+    def test_record( self ):
+        raw, fixed = protected( 1024, 0x0102 )
+        self.assertTrue( Fixup.apply_fixups( raw, 0, 1024 ))
+        self.assertEqual( raw, fixed )
+
+    # 4096 byte records of 4Kn disks, with the 512 byte strides Windows writes and with
+    #   one stride covering the whole record
+    def test_4k_record( self ):
+        for stride in ( 512, 4096 ):
+            raw, fixed = protected( 4096, 0x0203, stride=stride )
+            self.assertTrue( Fixup.apply_fixups( raw, 0, 4096 ))
+            self.assertEqual( raw, fixed )
+
+    def test_memoryview( self ):
+        raw, fixed = protected( 1024, 0x0304 )
+        buf = bytearray( 16 ) + raw
+        self.assertTrue( Fixup.apply_fixups( memoryview( buf ), 16, 1024 ))
+        self.assertEqual( buf[16:], fixed )
+
+    # A torn write: the strides still holding the sequence number are fixed, the
+    #   other one is left as read
+    def test_mismatched_usn( self ):
+        raw, fixed = protected( 1024, 0x0405 )
+        struct.pack_into( '<H', raw, 1022, 0x0404 )
+        self.assertFalse( Fixup.apply_fixups( raw, 0, 1024 ))
+        self.assertEqual( raw[:1022], fixed[:1022] )
+        self.assertEqual( raw[1022:], '\x04\x04' )
+
+    def test_invalid_usa( self ):
+        raw, fixed = protected( 1024, 0x0506 )
+        for usa_offset, usa_count in ( (USA_OFFSET, 1), (USA_OFFSET + 1, 3), (1020, 3), (USA_OFFSET, 4) ):
+            buf = bytearray( raw )
+            struct.pack_into( '<HH', buf, 4, usa_offset, usa_count )
+            before = bytearray( buf )
+            self.assertFalse( Fixup.apply_fixups( buf, 0, 1024 ))
+            self.assertEqual( buf, before )
+        self.assertFalse( Fixup.apply_fixups( bytearray( raw[:1000] ), 0, 1024 ))
+
+    def test_batch( self ):
+        records = [ protected( 1024, 0x0607, seed=n ) for n in xrange( 4 ) ]
+        raw = bytearray( ''.join( str( x[0] ) for x in records ))
+        self.assertEqual( Fixup.apply_fixups_batch( raw, 4, 1024, magic=FILE_MAGIC ), [ True ] * 4 )
+        self.assertEqual( raw, ''.join( str( x[1] ) for x in records ))
+
+    # Different sequence numbers, a torn record and an unused record go one at a time
+    def test_batch_mixed( self ):
+        records = [ protected( 1024, 0x0700 + n, seed=n ) for n in xrange( 4 ) ]
+        raw = bytearray( ''.join( str( x[0] ) for x in records ))
+        struct.pack_into( '<H', raw, 1024 + 510, 0 )
+        raw[3*1024:3*1024+4] = 'BAAD'
+        self.assertEqual( Fixup.apply_fixups_batch( raw, 4, 1024, magic=FILE_MAGIC ), [ True, False, True, False ] )
+        self.assertEqual( raw[:1024], records[0][1] )
+        self.assertEqual( raw[2*1024:3*1024], records[2][1] )
+
+    def test_indx_blocks( self ):
+        blocks = [ protected( 4096, 0x0809, magic='INDX', seed=n ) for n in xrange( 3 ) ]
+        raw = bytearray( ''.join( str( x[0] ) for x in blocks ))
+        self.assertEqual( Fixup.apply_fixups_batch( raw, 3, 4096, magic=struct.unpack( '<I', 'INDX' )[0] ), [ True ] * 3 )
+        self.assertEqual( raw, ''.join( str( x[1] ) for x in blocks ))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Tests of the glob patterns matched against a directory tree.
+
+GlobTest walks an in memory tree the way tscopy walks a volume, GlobCopyTest runs
+tscopy.py on a small synthetic image for the case folding of the callers.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.join( os.path.dirname( os.path.abspath( __file__ )), '..' )
+sys.path.insert( 0, os.path.join( ROOT, 'bench' ))
+sys.path.insert( 0, os.path.join( ROOT, 'TScopy' ))
+import ntfs_image
+from Glob import GlobTrie, is_glob
+
+TSCOPY = os.path.join( ROOT, 'tscopy.py' )
+
+# Directories end with '/'
+TREE = [ 'users/', 'users/alice/', 'users/alice/ntuser.dat', 'users/alice/ntuser.dat.log1',
+         'users/alice/appdata/', 'users/alice/appdata/recent/', 'users/alice/appdata/recent/a.lnk',
+         'users/alice/appdata/recent/b.lnk', 'users/bob/', 'users/bob/ntuser.dat', 'users/bob/notes1.txt',
+         'users/bob/notes2.txt', 'users/bob/notesa.txt', 'users/bob/[draft].txt', 'windows/',
+         'windows/system32/', 'windows/system32/config/', 'windows/system32/config/sam' ]
+
+####################################################################################
+# walk: The paths of TREE matched by the patterns, {path: sorted tags}
+####################################################################################
+def walk( patterns ):
+    trie = GlobTrie()
+    for tag, pattern in enumerate( patterns ):
+        trie.add( [ x for x in pattern.split( '/' ) if not x == '' ], tag )
+    children = {}
+    for entry in TREE:
+        parent, name = os.path.split( entry.rstrip( '/' ))
+        children.setdefault( parent, [] ).append( ( name, entry.endswith( '/' )))
+    ret = {}
+    def visit( path, state ):
+        for name, is_directory in children.get( path, [] ):
+            c_state = trie.step( state, name )
+            if len(c_state) == 0:
+                continue
+            c_path = name if path == '' else path + '/' + name
+            tags = trie.matches( c_state, is_directory )
+            if len(tags) > 0:
+                ret[c_path] = sorted( tags )
+            if is_directory == True and trie.has_children( c_state ):
+                visit( c_path, c_state )
+    visit( '', trie.start() )
+    return ret
+
+class GlobTest( unittest.TestCase ):
+    def test_is_glob( self ):
+        for name in ( '*.lnk', 'notes?.txt', 'notes[0-9].txt', '**' ):
+            self.assertTrue( is_glob( name ), name )
+        for name in ( 'ntuser.dat', 'a[.txt', '[]' ):
+            self.assertFalse( is_glob( name ), name )
+
+    def test_star( self ):
+        self.assertEqual( walk( [ 'users/*/ntuser.dat' ] ), { 'users/alice/ntuser.dat': [0], 'users/bob/ntuser.dat': [0] } )
+        self.assertEqual( sorted( walk( [ 'users/alice/ntuser.dat*' ] )), [ 'users/alice/ntuser.dat', 'users/alice/ntuser.dat.log1' ] )
+
+    def test_question_mark( self ):
+        self.assertEqual( sorted( walk( [ 'users/bob/notes?.txt' ] )), [ 'users/bob/notes1.txt', 'users/bob/notes2.txt', 'users/bob/notesa.txt' ] )
+
+    def test_class( self ):
+        self.assertEqual( sorted( walk( [ 'users/bob/notes[0-9].txt' ] )), [ 'users/bob/notes1.txt', 'users/bob/notes2.txt' ] )
+        self.assertEqual( sorted( walk( [ 'users/bob/notes[!1].txt' ] )), [ 'users/bob/notes2.txt', 'users/bob/notesa.txt' ] )
+        self.assertEqual( sorted( walk( [ 'users/bob/notes[a2].txt' ] )), [ 'users/bob/notes2.txt', 'users/bob/notesa.txt' ] )
+        self.assertEqual( sorted( walk( [ 'users/bob/[[]draft].txt' ] )), [ 'users/bob/[draft].txt' ] )
+
+    # '**' matches zero or more directories, at the end every file below
+    def test_recursive( self ):
+        self.assertEqual( sorted( walk( [ 'users/**/*.lnk' ] )), [ 'users/alice/appdata/recent/a.lnk', 'users/alice/appdata/recent/b.lnk' ] )
+        self.assertEqual( sorted( walk( [ '**/ntuser.dat' ] )), [ 'users/alice/ntuser.dat', 'users/bob/ntuser.dat' ] )
+        self.assertEqual( sorted( walk( [ 'users/alice/**/ntuser.dat' ] )), [ 'users/alice/ntuser.dat' ] )
+        self.assertEqual( sorted( walk( [ 'users/alice/appdata/**' ] )), [ 'users/alice/appdata/recent/a.lnk', 'users/alice/appdata/recent/b.lnk' ] )
+        self.assertEqual( sorted( walk( [ 'windows/**/**/sam' ] )), [ 'windows/system32/config/sam' ] )
+        self.assertEqual( sorted( walk( [ '**/config/**' ] )), [ 'windows/system32/config/sam' ] )
+
+    # Patterns sharing directories share the walk and return every tag
+    def test_shared_patterns( self ):
+        ret = walk( [ 'users/*/ntuser.dat', 'users/bob/ntuser.dat', 'users/**' ] )
+        self.assertEqual( ret['users/bob/ntuser.dat'], [ 0, 1, 2 ] )
+        self.assertEqual( ret['users/alice/ntuser.dat'], [ 0, 2 ] )
+        self.assertFalse( 'users/alice' in ret )
+
+    def test_literal_names( self ):
+        trie = GlobTrie()
+        trie.add( [ 'users', 'alice', 'ntuser.dat' ], 0 )
+        trie.add( [ 'users', 'bob', '*.txt' ], 1 )
+        state = trie.step( trie.start(), 'users' )
+        self.assertEqual( trie.literal_names( state ), [ 'alice', 'bob' ] )
+        self.assertEqual( trie.literal_names( trie.step( state, 'bob' )), None )
+
+    # The trie matches as given, the callers lower case the patterns and the names
+    def test_case( self ):
+        self.assertEqual( walk( [ 'USERS/*/NTUSER.DAT' ] ), {} )
+        self.assertEqual( len( walk( [ 'USERS/*/NTUSER.DAT'.lower() ] )), 2 )
+
+class GlobCopyTest( unittest.TestCase ):
+    @classmethod
+    def setUpClass( cls ):
+        cls.workdir = tempfile.mkdtemp( prefix='tscopy_test_' )
+        cls.image = os.path.join( cls.workdir, 'glob.img' )
+        builder = ntfs_image.NTFSImageBuilder( seed=1 )
+        builder.add_file( 'Users\\Alice\\NTUSER.DAT', 'hive of alice' )
+        builder.add_file( 'Users\\Alice\\AppData\\Recent\\Report.LNK', 'link' )
+        builder.add_file( 'Users\\bob\\ntuser.dat', 'hive of bob' )
+        builder.add_file( 'Users\\bob\\Notes1.TXT', 'notes' )
+        builder.build( cls.image )
+
+    @classmethod
+    def tearDownClass( cls ):
+        shutil.rmtree( cls.workdir, ignore_errors=True )
+
+    def run_tscopy( self, *args ):
+        outdir = tempfile.mkdtemp( dir=self.workdir )
+        cmd = [ sys.executable, TSCOPY, '--image', self.image, '-o', outdir, '-i' ] + list( args )
+        proc = subprocess.Popen( cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT )
+        output = proc.communicate()[0]
+        self.assertEqual( proc.returncode, 0, output )
+        self.assertEqual( [ line for line in output.splitlines() if ' - ERROR - ' in line ], [] )
+        files = []
+        for root, dirs, names in os.walk( outdir ):
+            files.extend( os.path.relpath( os.path.join( root, name ), outdir ).replace( os.sep, '/' ).lower() for name in names )
+        return sorted( files )
+
+    def test_case_folding( self ):
+        self.assertEqual( self.run_tscopy( '-f', 'C:\\USERS\\*\\NtUser.dat,c:\\users\\**\\*.lnk,c:\\users\\BOB\\notes[0-9].txt' ),
+                          [ 'users/alice/appdata/recent/report.lnk', 'users/alice/ntuser.dat', 'users/bob/notes1.txt', 'users/bob/ntuser.dat' ] )
+
+if __name__ == '__main__':
+    unittest.main()
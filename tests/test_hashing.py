@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Tests of the inline hashing of the copied streams and of the hash manifest.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import tempfile
+import unittest
+import subprocess
+from StringIO import StringIO
+
+ROOT = os.path.join( os.path.dirname( os.path.abspath( __file__ )), '..' )
+sys.path.insert( 0, os.path.join( ROOT, 'bench' ))
+sys.path.insert( 0, os.path.join( ROOT, 'TScopy' ))
+import ntfs_image
+from Hashing import StreamHash, HashingWriter, Manifest
+
+TSCOPY = os.path.join( ROOT, 'tscopy.py' )
+
+def digests( data ):
+    return dict( ( name, hashlib.new( name, data ).hexdigest() ) for name in ( 'md5', 'sha1', 'sha256' ))
+
+class StreamHashTest( unittest.TestCase ):
+    # Holes at the start, in the middle and at the end are hashed as zeros once the
+    #   data before them is in
+    def test_holes( self ):
+        stream_hash = StreamHash( { 0: 100, 300: 50, 400: 1000 } )
+        stream_hash.update_at( 100, 'a' * 200 )
+        stream_hash.update_at( 350, 'b' * 50 )
+        self.assertTrue( stream_hash.complete( 1400 ))
+        self.assertEqual( stream_hash.hexdigests(), digests( '\x00' * 100 + 'a' * 200 + '\x00' * 50 + 'b' * 50 + '\x00' * 1000 ))
+
+    def test_out_of_order( self ):
+        stream_hash = StreamHash()
+        stream_hash.update_at( 0, 'a' * 10 )
+        stream_hash.update_at( 20, 'c' * 10 )
+        stream_hash.update_at( 10, 'b' * 10 )
+        self.assertFalse( stream_hash.complete( 30 ))
+        self.assertFalse( StreamHash().complete( 1 ))
+
+    def test_writer( self ):
+        fd = StringIO()
+        stream_hash = StreamHash( { 4: 4 } )
+        writer = HashingWriter( fd, stream_hash, 0 )
+        writer.write( 'abcd' )
+        writer.seek( 8 )
+        writer = HashingWriter( fd, stream_hash, 8 )
+        writer.write( 'efgh' )
+        self.assertEqual( fd.getvalue(), 'abcd\x00\x00\x00\x00efgh' )
+        self.assertTrue( stream_hash.complete( 12 ))
+        self.assertEqual( stream_hash.hexdigests(), digests( fd.getvalue() ))
+
+    def test_manifest( self ):
+        workdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join( workdir, 'manifest.jsonl' )
+            manifest = Manifest( filename )
+            manifest.add( 'c/a.txt', 42, 3, digests( 'abc' ))
+            manifest.add( 'c/a.txt_ADS_Zone.Identifier', 42, 0, digests( '' ), 'Zone.Identifier' )
+            manifest.close()
+            with open( filename ) as fd:
+                entries = [ json.loads( line ) for line in fd ]
+            self.assertEqual( entries[0], dict( path='c/a.txt', record=42, stream='', size=3, **digests( 'abc' )))
+            self.assertEqual( entries[1]['stream'], 'Zone.Identifier' )
+        finally:
+            shutil.rmtree( workdir )
+
+class ManifestCopyTest( unittest.TestCase ):
+    @classmethod
+    def setUpClass( cls ):
+        cls.workdir = tempfile.mkdtemp( prefix='tscopy_test_' )
+        cls.image = os.path.join( cls.workdir, 'hashing.img' )
+        cls.builder = ntfs_image.NTFSImageBuilder( seed=1 )
+        data = ''.join( 'event %06d\r\n' % n for n in xrange( 40000 ))
+        cls.builder.add_file( 'logs\\sparse.evtx', data, sparse=[ (0x8000, 0x20000), (len(data) - 0x3000, 0x3000) ], fragments=3 )
+        cls.builder.add_file( 'logs\\compressed.evtx', data, compressed=True, ads={ 'Zone.Identifier': 'ZoneId=3' } )
+        cls.builder.build( cls.image )
+        cls.expected = ntfs_image.expected_files( cls.builder )
+
+    @classmethod
+    def tearDownClass( cls ):
+        shutil.rmtree( cls.workdir, ignore_errors=True )
+
+    # Returns the manifest entries by path, relative to the output directory
+    def run_tscopy( self, *args ):
+        outdir = tempfile.mkdtemp( dir=self.workdir )
+        manifest = os.path.join( outdir, 'manifest.jsonl' )
+        cmd = [ sys.executable, TSCOPY, '--image', self.image, '-o', outdir, '-i', '-r', '-f', 'c:\\logs', '--manifest', manifest ] + list( args )
+        proc = subprocess.Popen( cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT )
+        output = proc.communicate()[0]
+        self.assertEqual( proc.returncode, 0, output )
+        self.assertEqual( [ line for line in output.splitlines() if ' - ERROR - ' in line ], [] )
+        ret = {}
+        with open( manifest ) as fd:
+            for line in fd:
+                entry = json.loads( line )
+                ret[ entry['path'].replace( '\\', '/' ).lower() ] = entry
+        return ret
+
+    # The holes of the sparse stream are hashed as zeros, in copy order and in disk order
+    def test_sparse_stream( self ):
+        for extra in ( [], [ '--disk_order' ], [ '--workers', '2' ] ):
+            entries = self.run_tscopy( *extra )
+            self.assertEqual( len(entries), 3, extra )
+            for name in ( '/logs/sparse.evtx', '/logs/compressed.evtx', '/logs/compressed.evtx_ads_zone.identifier' ):
+                entry = [ entries[x] for x in entries if x.endswith( name ) ][0]
+                self.assertEqual( entry['size'], len(self.expected[name]) )
+                for algorithm, digest in digests( self.expected[name] ).items():
+                    self.assertEqual( entry[algorithm], digest, '%s %s %s' % ( extra, name, algorithm ))
+
+if __name__ == '__main__':
+    unittest.main()
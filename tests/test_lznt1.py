@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Tests of the LZNT1 decompression of NTFS compression units.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import random
+import struct
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TScopy'))
+import LZNT1
+
+UNIT_SIZE = 0x10000
+
+def random_bytes( size, seed=1 ):
+    rnd = random.Random( seed )
+    return ''.join( chr( rnd.randint( 0, 255 )) for n in xrange( size ))
+
+class LZNT1Test( unittest.TestCase ):
+    def test_round_trip( self ):
+        data = ''.join( 'Event %d logged by svchost.exe\r\n' % n for n in xrange( 3000 ))[:UNIT_SIZE]
+        self.assertEqual( LZNT1._decompress_python( LZNT1.compress( data ), UNIT_SIZE ), data )
+
+    # A compressed chunk giving fewer than 4096 bytes in the middle of the unit is
+    #   padded with zeros, the next chunk starts on the 4096 byte boundary
+    def test_short_middle_chunk( self ):
+        short = 'abcabcabc short chunk ' * 40
+        full = ''.join( 'line %04d of the second chunk\n' % n for n in xrange( 200 ))[:LZNT1.CHUNK_SIZE]
+        buf = LZNT1.compress( short ) + LZNT1.compress( full )
+        self.assertTrue( ord( LZNT1.compress( short )[1] ) & 0x80 )
+        expected = short + '\x00' * ( LZNT1.CHUNK_SIZE - len(short) ) + full
+        expected += '\x00' * ( UNIT_SIZE - len(expected) )
+        self.assertEqual( LZNT1._decompress_python( buf, UNIT_SIZE ), expected )
+
+    def test_short_last_chunk( self ):
+        data = 'x' * LZNT1.CHUNK_SIZE + 'tail of the unit ' * 10
+        out = LZNT1._decompress_python( LZNT1.compress( data ), UNIT_SIZE )
+        self.assertEqual( out, data + '\x00' * ( UNIT_SIZE - len(data) ))
+
+    # A chunk without the compressed flag holds its bytes as is
+    def test_raw_chunk( self ):
+        data = random_bytes( LZNT1.CHUNK_SIZE )
+        buf = struct.pack( '<H', LZNT1.CHUNK_SIGNATURE | ( LZNT1.CHUNK_SIZE - 1 )) + data
+        self.assertEqual( LZNT1._decompress_python( buf, UNIT_SIZE ), data + '\x00' * ( UNIT_SIZE - len(data) ))
+        self.assertEqual( LZNT1.compress( data )[:2], buf[:2] )
+
+    def test_raw_and_compressed_chunks( self ):
+        raw = random_bytes( LZNT1.CHUNK_SIZE, seed=2 )
+        text = ''.join( 'record %05d of the log\n' % n for n in xrange( 400 ))[:LZNT1.CHUNK_SIZE]
+        buf = LZNT1.compress( text + raw + text )
+        self.assertFalse( ord( buf[len(LZNT1.compress( text )) + 1] ) & 0x80 )
+        out = LZNT1._decompress_python( buf, UNIT_SIZE )
+        self.assertEqual( out, text + raw + text + '\x00' * ( UNIT_SIZE - 3 * LZNT1.CHUNK_SIZE ))
+
+    # The short last chunk of a unit of several chunks is padded to the end of the unit,
+    #   compressed or stored raw
+    def test_short_last_chunk_of_many( self ):
+        text = ''.join( 'entry %05d of the journal\r\n' % n for n in xrange( 1000 ))
+        for tail in ( 'short compressed tail ' * 20, random_bytes( 700, seed=3 )):
+            data = text[:5 * LZNT1.CHUNK_SIZE] + random_bytes( LZNT1.CHUNK_SIZE, seed=4 ) + tail
+            out = LZNT1._decompress_python( LZNT1.compress( data ), UNIT_SIZE )
+            self.assertEqual( out, data + '\x00' * ( UNIT_SIZE - len(data) ))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+"""
+Tests of the LZX decompression of WOF LZX chunks.
+
+The compressed vector is the last chunk of a WOF LZX compressed executable written
+by Windows, taken from the libfwnt test suite. The 28672 bytes of the executable
+hold E8 call instructions, their translation is undone by the decoder.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import hashlib
+import binascii
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TScopy'))
+import LZX
+
+EXECUTABLE_SIZE = 28672
+EXECUTABLE_SHA256 = 'efbc2a1e000ffb483defe83987085916fa1559950a7a193449bd841ecb98e1fa'
+EXECUTABLE_CHUNK = binascii.unhexlify( ''.join( """
+002700005307242200700000fd6f75773d752957432909239940ea58ddf97c4f6aa5ca64
+b29cc5d766ae6aba513edddd0a2c738ce3621ef9ec77bc1ff11e5fb67ec8ddf71bbc6c63
+30b86f51e12af30181bd4ddef084b907bdd510a1d6648038d000cdcc80411800df03d27b
+6d4f4757a895e7e40570f093b0156d040c2734daed1d729c2b6ded4edda1b5667dc7ebea
+da2eae3648d6b5eeafb8cdb6b5dbdde8b1365b4a51121b6d56eaa1e08fb46ba185680681
+8013a0e108040801bf10404000000900515115807783bb77eede336ee42c2bb3ac988c23
+229c89b078895e1ce8e5b55e17fc05a951fb410aa917c2f585f148084548c867211085c4
+adfc244130da72448fc52ce0cb05f3aae6db45243dbf3cba9a3c7f5efd32327df8e8eabc
+fae8fcfa7a6d61f8c978d5c79ee7d7d6b7c13eaf3b3f611857575f5626fbbf69d55c7bf8
+3303fb9f5f4657795233c35339fb1478256d64f8a56ca3cc2f6481c2cc685fc98cf4e7ce
+8f7ae16bd765dc11dacc8f327388d104787bd3fc8146de5c5e5dd527a1ae9bc5db102ac4
+6e0571f95f4ecaeba50457be2c0445519469f7c97b7b9f1de2f694c08c3e85a4c14fa16f
+0d052bf8e2f723d4f348f47db22f359c0ff19c3298583c241260e1b8bb2adf084ccbaa59
+bb7f64213b0bdab3b65d7d534f831ae1845d6cc2fcc538d85f263d15c26d7bbe212fb0bd
+7699367486e85ff5bef147b068b49a9a6bbbdc0ce4cf7e5eadff37ffd174433dbc30dccd
+55f4fe66583d1a0e9088eef1f7ae15da0344d90bf4de4651194d0b753ef07fc3f235b342
+6f0f57d382fb2b69d778e83dad9e6761317fb2e86fa1d9b1775ecf7f0afe842f0d8b0263
+f2e6750872e0d872888d151d1d9080650b0cf58049fac0dea6d43908146301baa00a281a
+b21f1724348d579931c01e605cf1391770bffcedf9446db83232f553d37d9e0f3196a79a
+086d5cb932d70fa8618b8e051f5b015b374d463e548e81b38b7da7ea27e8b3e0e5a66cde
+363e6cabfe9c9bb238f01cad11d9fb591c7be6b1e7bb5c91b602cb72e39c9cb3909a603f
+3850ffb926dae3c380efaeb086cfc25886e99172ff26f037661aabf1ae7a79fb63a9d196
+bca357ddd7347df6e4bf058d507d0119f520b9b97a333f071136c0b55b145ca40fa6209a
+2703d0c3e7adb527ce8f9f8450178ee20dbe7110015588c1f52bc15066decbc11b9cb2b2
+7edf1d112beacfd97e019e76ad508b83043d6a849f7ad1fd4961e2af0f90f24d48d0fc4e
+b7258d28c25c706f0f7130024e86010d63bb7129daa6b803830d1bc743284aad600600b8
+a3ed154341cb1bc32c5c65f126bbc82d91fd933d692cc4d82a18d7f4c90995360cbf74c0
+dc4588c3cebc45828d3b2541ae6be4ca601bdbc9804ec8f114d759d971c2c5da5f19c8c6
+a3e1871c0589a3025368e7e13a44320bb4832fe2f4cf3212a8dda012aab96b3983909bc8
+836b4deb42ada9b687157435c677680a56578b3bc552c1c8203dd9b9f8b91e5959e4d840
+d4d2f35d3438534b39ae1367643b2bf41ad532b2b4354428e3227542aab0e06cab3d176c
+e15f542578b83bb77dc88c47d15ff93135dd4f9986148e3a00110dcbe6a1cacea9a1febd
+8188b58131f105b3ef6fa7d94b653c6c256dcadc4111cec384f25d4dece0066132e4260f
+c6a10e1490016250c24d3600a1d1c7d73d6bd1506c9c3c93d2d619084a70b022d477266e
+359fe57e5750a391364b527a693b975964c008e76971d3b1658628fa3995bf47d6be7648
+a39ed72698a189e154ef0463fc8522ea05547b79b0c4022316a223be825afe8295392a9e
+03b4aaa8b29d7d094f98f6e655dc64698b1d5c54f7cbcd52aab3660dd19bd432784e7215
+f1418d35040add48126d60c05d2a903da33695e7f9030b0f7fd40b9c341fef2b1cfd200e
+dc59545b784d3faf557e510debdc7033c546d587c71dfb2035499a6a0b6f28f810223eca
+7a1b7f85596fd2b14e76e56ddf67b58dd1bbbadec34c0105492d6bc57034b95336e2a2b6
+06b14b7a82ca0beacd26fb1a2a427f5e1d8418e74aa9fbe36a0c892ffffe32f56d70a43b
+1576a3f233d09a6a75d623a02f8d5a4b5cb48f57d69b796d0ccf9dda6e1e8c15196a2aaa
+1b450ed87944cc4fb94cecec89a4d30b652c1b1a6200b60a380d1db254a8388ca7e27ce3
+28c4b7a715856e0c3b3534382158dc81f84669fe7cb7d71a65072387f376a3cd827139b1
+05af10139776f79523941fbbd40da30d7e14c3db6987948ed0528b6d9b47f532ad2f50a2
+c89090b79ec9c6ba729e858c35bcdd324b4610968d07857044e16271582d63489b993e37
+e17a5615a9fc59fe0c9ab73ea239bdd9bbb82ef9425b85fc4e1a07e5a291e656218349d9
+f9d1c40ecd38e7b152b9fca99ecbc6c01ff9276e458effec91b34588ea0947e2c515aadf
+6d7ea2a898f5b37db21d78ce1c7457cd7e86402bde38861ae86867ba4d7526eb33d4056a
+456d4860de56dac29c87d23344d51f03fd55a4a6d672b4f4b4e1749314ec9828df714228
+871aae79b13cf55242718eda8f457fcdf0286adb21448af2a647ec74a9302f1268631d72
+e6422a2575f2e8f63d0718e1cc66517adc9451075ac3b5852d0ad473a93045e1daa53388
+64671e39a2cca26715a8a118543b9b043b9243d3881daa6a42aea8f635dad574c3e2221a
+194428b2315f27168fc7859261156dd7950a225ddb8fd3a95b6c3e51f2aedee279e02bca
+7cf31983fab8c71d4e08b78bfbe6e22e7f900e3dd06d61e59cea08110a571ac4a759da3c
+6012b742a95012190ba71176e1b18a811df3f50a5b22b2eead0c73da9ef132bab9b2ed61
+c49c25d8a83148fb219146b9c44c406d7628a7a1a98883482e8f38a9dcc4e029526d3698
+e8e4970c4a9a5ce8c97b17296df353df6b680275847bde5ed992f390f3bb1e729ddf2132
+3c8e2ba31885afcb23a059dc875bb71b8956618d1d9ccbf95fd6c544fd7d01e90a6757c1
+a2d1600758a79f57f9a6d5f94065dce125e9ee551876fed289f9186946ef96a98be8821c
+d3a1df6689a847e2bddd561a415e9755e56bb1e29d62c805c6b39ce73c9f269d81575a5f
+9df2098ed1f3bd5d21f7acd9176566bb1639133134870ad4a4d49da0b2b51edc3a3a28cf
+87b885991171aac56a5b14ef6c6c71dd1b67f6915ed1cb854c819969031442a5b738b6f7
+3f6fffc9067e66211f0f1757b7b0729e9fcbd0824811e8fdf50a40f5c15ca5de2d0e660b
+3b5ccac8fadac8dfd546be00d906ae20665996d92cacbcfcbf7d86bb08d4d8e5fae83134
+5cb507272f1fe3a38b168e1690da61d5d15f260760c1fc62fbb311dfa238bbe2522ca724
+06e72f73da54803d46a212b64467587bfcf7c6ece8a2e9bff85f4d46d2cde064efbaa134
+88bc5405826f8baa5cd41af2a049007bd7dd9cb06e15d09557abea5d4d9c9fce68ba7ea6
+debcba9ff8f2e5d480a3cbbed33dd475e406964bb5a47131f589ec3f9aad1e7a2324951e
+19de21aa46e181ea7efb0f13d038ae94cf46804b94984e06be694d6bf95922ea17dd26a0
+6b1d63e4e6551b15b043d6fb149efecac704bea965a7e7e4242dcb9ce0f1e1a3f123769a
+0588981aee29a7d24fe28f044915beccdc6925f42939f46d5cc7519221a0ef8e754d4fe0
+3a37b40dfcf461953b9e3e2a0a96015abfd8771e28e2f5c1762779fc11c37dcccdbf03dd
+eb06918123058c18316ad6c8e681462c3e9db211e8196b83abc885a88690896a7d1e5ecc
+28e2fd2c49def759d1d03f366830ff30ddafdb9c48bcb8e3d2118fe798868f85cbf3b772
+e2d25efa3c87740c819d42f151eab5cf9a0b25ec974180ef1fff212a3a1b786f1122f8cb
+98ce088d3eeb850f3e09f9e0b78abe8811eb5e371ecc9b031fb815763a2adeee2bb7065e
+85b71b3c1998c9ac77f5f2a98a3fdf15f3faabc0d0945804d104e6e906a49c3cf6f4dfb9
+de94da7ce1dcce640f5bab95c53e43ee76e303379ff8b312556b97522da581670f93dd9f
+9c8d142a0a1d6301b2d3529116cf7299a6ff853f8dd1ea67ac7f02a1e921fd505794d5ea
+3d69780debb261dfe9e71645d10911bb1fddef81b04f0a372e47d82779a514f47988bfaa
+05c30f2dd4f8734513621b631495ba0fb4fee95a79ff3239a7eb76d74f0fbb95f5b07107
+96c57d56fc54a24265670456d5213c51b1d2d586a08eac529ce3448706b6f74abe546b94
+2134a867898d6f5da17160832b7a6a34f305e05c7448ff18a8acd080f6910be91783ced8
+418029c23de4b7bc4dd51feef05ef2f35e9db552d088f1006dbf54b705b91e0389077839
+bad4db8d4a7ce0d36c4b4d49cd5bbe12c21d3d28b8c2c77bbe03bea58989c0fb6a37209e
+073375c8dba945f88b07c3a5f2b77e3ffb8b53ee61e514efe62533fce57e7bee7d6a9d2c
+2bcb7cd605ca417d345c8147faa7179ac6b5b53143c4757434e974125fc6bf71c8cb81b1
+0a6e882c239b2508937b29e10366711776b53713341568ede1e2116e12a4d7ae4322eded
+86c239ae74fff3e91e77aba5e69857bd579e36a00f2a399f1fbf58be527752fa5371c115
+78cc8995ac805dafa1b6ca87ae0e4f633369fb31e4e5a075ea390f60950c741391074704
+4f78d5a9b3889b5822b0023db81dd1518f82874851fa4c5f022960237062eff340a0e586
+e9b27f6c1b131de359f5a5dce98def7ac66614eef8b2b980366b8a9eb5454f9107832dff
+b160eff69f1027ecdb0909b3acc6fbfbd452c92d4e6c4b42e153ec2272a27ac5631a9c33
+8257651a3b58c158b9361a37696472de2ecb7cce6f9a99dee7767322e73a2af3b0c25e10
+5489f6fbe12a4a78d95d1c46f05d0493eacba3c3388be09af88e96da0ace84e56326361c
+69cab05d7eebb99d3f70a1683ad5bb97cdb7286186dd5458a24803b95175fec05a1cbacf
+aa5845c925a69430d9ccdf30eaaff8872e996f25a06008a6019f83a9655c023fa9b4823b
+c70205e6f75dba071757a44f694efe06e82ba8c98bcc69e50f4fa5e1805e6a4bde5b2728
+3617de7e65516ac167acc1fdaf1aefbaa06bd76687f981547135d7f86a87eb9333daa2ee
+bee5f2e7461b5683e09aed6a55d9a5ce0f0270d48256588c4fb8deca02a5577d12ef932a
+f571bc6fb452c5e689a2eccafa440e50c10de0b3fc2a232a9ecc12562f9cbfa89dc5e8eb
+e296e43ef5fb4a50e2c97457ac4565e1ffe142bdb66d3177b73e6967730ae32e7151e8cd
+67c3597bfca7dbe3d86dafcd290773da856939deeec57af13025a9086df61eb6f98550dd
+a1370f8f691ecd1fe2188a7c50199c97c37249b35830eb9ed4d9f1db845ddc22b4d86a54
+bbe266ed2d873f725d8bb7d847dd6f87e1eb3760c9cfa07a2672e9c73a8d5ec99109693e
+7197e1d0d5c33fe8d4acdb0a9be522dab5291e9c92c608a9566c0fd8118aafe5322d4438
+736a352c7a0da4ae722eaf24ed1ef1dfdb5c50b9c45e512d6b5e81696bd61b15f62e5760
+793c84978c59de950dc3c898b46fe95ea8cf6fb186fd0a9d596ee5560c6f203ff1168eb4
+cf1947d51667c2877a26fddd8967ea37299a82a25f8ab8133dad276f7bf928357b71cb90
+e09e841e5a9f33d6148cbabfe192fa60da3d7a28ecda060d8ce00f7af98c59a958e8e04e
+f0e3bd880d8ebd1722c037f83bf09cf1277fb0dc82bc623f1c6dfa1b513e1fed78b92507
+10fb907c6c039b14705c7b210c8f670ca1857601daa05ea3258b5ef83dfcdca771324f28
+25c6f975aa39f745b315e6115dce7c05e07e3229b7f019649c8cd4e07def6f86335904d5
+133165252c042db85926bac12b737123369e7ff7804be5a3b57035bdc3ced89929243d51
+f0e5ad759d959a42bfcf8a6c1289adf4d47684d3a2215b37ef9246e9ed08d5cb12eb892d
+d721c08e589b1a801477d57ea5bec4a64ad5aa6a737ebfce726c2f2bff6120764c50a68e
+329f1887df0e09c76339d5519d695f785cb06137df67853bb2285722516791b7d7a1c577
+c1391f41d9bff0b63a1c85c117dbf3a7877b1b35937a88792cd7aff46956c4718a3681c6
+3e58f2833a68b82352b1cee872576ae38dce8a24012eb4576b994f9e3d74b20b5f02e3a3
+5f6b791c3cef0585289bae9b653bd33a873416ef603c03fa8191dfc975905a5216d988ed
+d6d1205a843b799aba5fe5ae4cff72d1e44bfe23abad895eef2d6b0592bb7dcaeb47ffd1
+29e311c5e5af7f2d60a9f5d5a8af05b7e0998393c6f294fc0e46923ad891fda5a4df2ab6
+97d8e9535be9696baae6fc5e62fe072cfb55a4ea1d43e8bb2d96421b7ae0f536f39fd507
+4fde1e2a0abfc13d6efac7d1b07730fa3df0573d0be2fa30c36c52da937ce9cb768bf9b3
+2837da4af46118e2c9daebef2b6c46974d78531a85c63157cd95efc08cd6de3ce5343ab1
+221850dab32c29c30888fade7bcf52535791df5957d1cbd98929b142e32b23d5cea34357
+e467d82a00bddd8312cff4a707dea82ef499462918e095ded42eea125f5fa16a65b91133
+4e013e811993b14b2e13e9227b8faa50eef37cffac10be60ff3bfc1008c2bb61708f378e
+4d6d91c50919c5d4dd1e79e19f12dc0199a2c5d88c337d389d1c8cc6d6fa18246989c4d6
+1b2f4bafee955fc0a064dfe69380e1e7264e3c231665ffbc21b4be52397e389696a5cb88
+5a65427e1f0429f216ab41590551dbf80a6f82a29386c1567154076e359d9a37db00fda7
+4ae987ee861158332b0b5df25fc101e49d50259a4485c6cfdf01af8c7be25f9523dc42b1
+1723468483c1684703c0ddfe7cf17cb487729fdc0a737bc442400cb672c4cbf2cdccc7a8
+0a165ebfbe1f8ff82a71ec12353049a29f9c0fa8b9e3c56e55e884db4a867cb014b81792
+1ce95b0fc6c5c34700e5d8b53bbcb65dd9b148115a76a4bd30dacafb2677be66e852e63c
+c8a3747ad8e0816e08fe12961e9253c3a1f49297e57a7312ac1d6070bd15e835517003d3
+926505c40052716bf2ec6a4952c4d826154d8d6d3413adf16348926434b3bf6a7f256282
+c89d2cded8f04d3c3f5ad8a3336b44f5e302c211c223e623dd5191a03b5db29044381163
+468a351263a48d91b646378e2aecfd3374194871d1e2a3b5466a8dcc19916314d9d1d9d1
+af515ea3ba466d8d701b082bf6bf842cc336fcc448800412208112488104482004122081
+124881044820fcffa3fb00292490020990400924583f6f0299fed2ecb0bac71832b131b1
+b231f87f57839ee03642c41360a03d23fbb1b43e8cca7aeb7eb03e2f17efcaffa4cc7c0b
+127e9bf368b70d5bd0020832a363c1f0746775f50e6eeaf19cc917de2bc508e776d440e6
+f02468fd20836d2e6ded7fe3c992f77feffcdd0cfbc7d7401ccacef53355cb36e84d97b1
+a3e7a60e5ecdde9e8e6f0ca606a54f6fa0863a0dbfbfaede1e663acc311a38a1fec27ced
+56ffdbf33dbb26e182f424400209ff4fd4fc73b62521aa7717a01cc27f91458365320660
+d1a2ef40fbd2df901ba49124db37713cf83ce82c7a4967008e2c83beab62d8fce2dba018
+980ec34e97900e8f86ba0ece525647bc38fb28f8b8f8f3f1725599cde001207be07b307c
+a07402cc8a7c09415008c24209532150798162c77b76ef7b174c92fee8f8c2eb331b989e
+ee2e65fef4e58bdecd8cb12443df3269c760fd7ad0f1abdb83c1175a8c461c6a9a7a7da3
+729912f0a769e7970add50038d267c9813d356eb46d07fc8976d17a470ffee813997bcb6
+8fd02448df39d3a8cbb14478f92b18f3001a1c5814b792870c06a00f022c5e20b002fd22
+1f7207e107c2eeb62b2ee9e753fbc2d2dfe6e7d06277b9f4c5924b0df4791a64921f880c
+e02d03683f18176839f0df83ce21acf5544e0b5dc15fcdab2eeb39a7f13507329f7c0d76
+370e4dbd83cb0008a48efd35dc677fcc911c401b095a3d0e3b221082d2032024b0221672
+026d4f32d1756f0d9d268f2f2e66068f3a4c5b3b6fde5d86c00c1ddbde1e05cd126a96dc
+dabfd7a450e7be9b738ddd31c486b56d0d85453e692b6583cb8c0683228d394b0d41c6af
+0a6b849ba57bc3f41f8ad95ab8735bb631c8a8d69c3e2e52d15c62b7e0e6cc5f7917777d
+2e7e61ec4c2a12486fef3032ae53f009e1c312a32981319c4d7ff3b7de651f1d0e7c6430
+7789e757cac7fdc2d9c2ba736edceb96638311117cfa0a19eafc6486862f7d93ae28a3fd
+bf3c2678005efbd543cff7dd4b647643e0d18e94e0efeedf914fd5f504fe40267aa83679
+c56c2115ff32d451a817156c92625df0e5dd55eed597b8367512ffbefaa6cd700f1695ae
+158bbcf87d89d680f541e5b18bd21b9e5442ecc3cc03fa8c86f8118c143d5c921f28a827
+b17350632fe14e93a1faf29cacbe39770141d7ba7e75d1915387f4867bb3091d64c663fa
+d8b2ef2d05bc53f82e8f21bca57fdec2076687fbb5a0d0ab38075321795a53b4b416925f
+448b67e3b38962007b4ab462af7607eda2a2c55272d11d15ee7b4f8944454433118505ea
+9568455b8e5ce64eb604ef78c9528145638bd4f421252a582d6214875045c9ebb78f053b
+68bd7950721c2ebc38a3e7dfd7dee1498ddabc363da801dd89396cb78b0bbe7df38ee274
+c385834b664d872fb72fd5d9f2a66c6ef24eee82beafb34465b3254d9427d5e9111a6d81
+a2f35cd1ff380a0c54621c52b77f7f5485b83c05172f266a671b6e68b3a00afea337830b
+b1f3ccc4d36e6c4b5fa155d758707741c44fbcbbd0b9249082cbfeae20a002a4524387d9
+21afadc19281904a1d613caa86b69012121ea842a7af23e4080a3a6c5c1ecf4fff3b8728
+e903dd094a27c487e0407813e445c08672aeb8850c2e8c2bb7aadb662f65f8e8be225f5f
+2fe9f4a99e2650cc9214684ddc4c9126c5bae489d027a9af25a1843d376143254fb8f1d1
+536a3c6c39222ff33673ec47116f5f989a5ce3f33a4185fda63f90941ffd16fd4af930f9
+339d1ae8c38711736b7a4d8efc5366a42f56f3686b365ab60526a560ef1e83df2de0e39f
+042d31bd4f0ed7014a5206349530687586938d90d06a3aa6981f84a898cf26a5a54f8299
+9c586d6df4c62565273ac6057c4841955a4a9daf297510e6a69ddc03e3c62542d639fbf8
+92ee932dff4425454428e1b12b35297bc081e550e13fd6f36ab48bc8c03ca7e0d2110f78
+fa112eda9d091c399934d34286d68759ec3c93da527afb7430b413cda8f4fd6897313bdd
+f1837942f5ec9fe4dc7511eb5809b4052e09493960933484f5b5906da5abd9760d309f85
+0db9c2615c294f3e628bfb1b36651cfe9dcf62ccd650e49d3a872e7e0ad34c02359f154a
+2e27ffd8b49bc085efe604ba42f1f395ab5ef737818238a56b94049d96ba4050a970f2b2
+43e05fb493f2952e953a952fdb3579498a2a85e5d76c6f9a8fefde6b91a5df6798d8ef47
+c6eb5d1f9d5f31aba6b474ebb46d25328d663fd68f2e9e755b4a6002fed6ffd373df3a33
+341af261f7f8bc026f9ca5a6c3d9b62f4e9309af7574f1a1d4e5f1cbe7a7de7af29d95d2
+30be31c04d265e66eff25ab9351c042b5eed665e6436bae4a3adcc3e892c2130d264e654
+dc1aa68c4d5ef7c05a6a31199cc2419e6287ead2b302be58fac9a20fb6a0827e848279bb
+00850694ee7b050a43a74c40f7034109062d1e474e6db6b55e4245efeafcbe925207e067
+37756322d16a636927ae52e5af5129759d850209d9418e0e0784421a841c06493d121839
+5d322e2192a431a1d8c48f09ca269c4fd227f913c4448214082994536029b16462323a99
+4f06c88e9629cbbc99ed267aa15eae972965e269276d3fadd31ab494dac4d672c295c5ab
+1278caa425f2c570b97d765fa4577d2b7c6681663c66fecd6f46cd7019ef86ba8b7b0a47
+edd1219a785a9fe6d36676fe8a9fe8d3f84e26f93edc3ff68fdc07e687e4a3f5b1c6d859
+18a02cb3184386f7c6357235c11bc2053216040cc42c1239bc1f2243ab431821ba42c046
+7d476022e18b8a1fa4479523f323ef08b004b8045ed297ec4a3a4fc8bcb47e93c4275293
+ba288753c529f694300539c582d216d937194bf62143463643c6812c7bb24c262b13a465
+a7cd68f7b07ef5955985dbcadd8abdcac1158795d02bf8957ae5bd62546178056f86cd60
+99f0f4b13340b32bd9d70ced8cee2dedda055a1e863a9685ed921a269a61d679839c4d4f
+38ad157a08b187540faa87de87da8fb91f871f8b1e9878802de6f5ef0bba165b8b4962a5
+b1ca3130b1b231b5b1bfb1c02cf15678453ebd8e81ac859485ac85c086d0860887104316
+430aa4fc22398218d81eba878921cd21c590e7907c881f52871c435021aa10d740401559
+2b9278842c026da46ec47164716472e472247e443c459288623992395321244a4ab04abe
+49c4958093a02621567257c24e029e243f89f812b264ba045d122f1924e2977c25cb92d6
+a4f9138513ae13af275c13be09e013b12766276a276d277293c3c9e2b2fba278e56a8237
+858b652c0a188a59143119ed5bca5b0a708a2e652fa51d255f0a3e4a3414045210a70c52
+65a0793dd94fec29624a7b0a9c524fa9537a2998530e5318299e0eba80d6c8ecc9f0b2d3
+f71f6c6e9db2bbefcccb4c4da657db2b0116068bbac5c60685c7a0ffd2c3601e
+""".split() ))
+
+class LZXTest( unittest.TestCase ):
+    def test_executable( self ):
+        out = LZX.decompress( EXECUTABLE_CHUNK, EXECUTABLE_SIZE )
+        self.assertEqual( len(out), EXECUTABLE_SIZE )
+        self.assertEqual( out[:2], 'MZ' )
+        self.assertEqual( hashlib.sha256( out ).hexdigest(), EXECUTABLE_SHA256 )
+
+    def test_invalid_block_size( self ):
+        self.assertRaises( Exception, LZX.decompress, EXECUTABLE_CHUNK, 0x100 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Tests of the VCN to volume offset mapping of data runs.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TScopy'))
+from RunMap import RunMap
+
+BPC = 4096
+# Clusters 0-3 at lcn 100, 4-5 sparse, 6 at lcn 50, 7-9 at lcn 200
+RUNS = [ (100, 4), (0, 2), (50, 1), (200, 3) ]
+
+class RunMapTest( unittest.TestCase ):
+    def setUp( self ):
+        self.runmap = RunMap( RUNS, BPC )
+
+    def test_size( self ):
+        self.assertEqual( len(self.runmap), 4 )
+        self.assertEqual( self.runmap.size, 10 * BPC )
+        self.assertEqual( len(RunMap( [ (100, 4), (7, 0), (0, 2) ], BPC )), 2 )
+
+    # The first and last byte of every run
+    def test_locate_boundaries( self ):
+        for offset, idx in ( (0, 0), (4*BPC - 1, 0), (4*BPC, 1), (6*BPC - 1, 1), (6*BPC, 2),
+                             (7*BPC - 1, 2), (7*BPC, 3), (10*BPC - 1, 3) ):
+            self.assertEqual( self.runmap.locate( offset ), idx, offset )
+
+    def test_locate_outside( self ):
+        self.assertEqual( self.runmap.locate( -1 ), -1 )
+        self.assertEqual( self.runmap.locate( 10*BPC ), -1 )
+        self.assertEqual( RunMap( [], BPC ).locate( 0 ), -1 )
+
+    def test_extents_in_run( self ):
+        self.assertEqual( self.runmap.extents( 100, 200 ), [ (100*BPC + 100, 200) ] )
+        self.assertEqual( self.runmap.extents( 7*BPC, BPC ), [ (200*BPC, BPC) ] )
+
+    # A range ending on a run boundary stays in the run, one starting on it is in the next
+    def test_extents_boundaries( self ):
+        self.assertEqual( self.runmap.extents( 3*BPC, BPC ), [ (103*BPC, BPC) ] )
+        self.assertEqual( self.runmap.extents( 4*BPC - 1, 2 ), [ (104*BPC - 1, 1), (None, 1) ] )
+        self.assertEqual( self.runmap.extents( 6*BPC, 2*BPC ), [ (50*BPC, BPC), (200*BPC, BPC) ] )
+
+    def test_extents_sparse( self ):
+        self.assertEqual( self.runmap.extents( 4*BPC + 10, 100 ), [ (None, 100) ] )
+        self.assertEqual( self.runmap.extents( 2*BPC, 6*BPC ), [ (102*BPC, 2*BPC), (None, 2*BPC), (50*BPC, BPC), (200*BPC, BPC) ] )
+
+    def test_extents_clipped( self ):
+        self.assertEqual( self.runmap.extents( 9*BPC, 5*BPC ), [ (202*BPC, BPC) ] )
+        self.assertEqual( self.runmap.extents( 10*BPC, 1 ), [] )
+        self.assertEqual( sum( x[1] for x in self.runmap.extents( 0, 20*BPC )), 10*BPC )
+
+    # Every offset agrees with a walk of the runlist from the start
+    def test_against_walk( self ):
+        for offset in xrange( 0, 10*BPC, 512 ):
+            vcn, skip = divmod( offset, BPC )
+            for lcn, length in RUNS:
+                if vcn < length:
+                    break
+                vcn -= length
+            expected = None if lcn == 0 else ( lcn + vcn ) * BPC + skip
+            self.assertEqual( self.runmap.extents( offset, 1 ), [ (expected, 1) ] )
+
+class SplitRecordsTest( unittest.TestCase ):
+    # 512 byte clusters: runs of 3, 1, 1 and 5 clusters. Record 1 (bytes 1024-2047)
+    #   crosses the first boundary, record 2 the third, the second is on a record
+    def test_split_records( self ):
+        runmap = RunMap( [ (10, 3), (40, 1), (60, 1), (80, 5) ], 512 )
+        self.assertEqual( runmap.split_records( 1024 ), { 1: [ (12*512, 512), (40*512, 512) ],
+                                                         2: [ (60*512, 512), (80*512, 512) ] } )
+
+    def test_record_over_three_runs( self ):
+        runmap = RunMap( [ (10, 1), (40, 1), (60, 2) ], 512 )
+        self.assertEqual( runmap.split_records( 2048 ), { 0: [ (10*512, 512), (40*512, 512), (60*512, 1024) ] } )
+
+    def test_sparse_run( self ):
+        runmap = RunMap( [ (10, 1), (0, 1), (60, 2) ], 512 )
+        self.assertEqual( runmap.split_records( 1024 ), { 0: [ (10*512, 512), (None, 512) ] } )
+
+    def test_aligned_runs( self ):
+        self.assertEqual( RunMap( [ (10, 2), (40, 4), (60, 2) ], 512 ).split_records( 1024 ), {} )
+        self.assertEqual( RunMap( RUNS, BPC ).split_records( 1024 ), {} )
+
+    # A record cut by the end of the attribute is not returned
+    def test_truncated_last_record( self ):
+        self.assertEqual( RunMap( [ (10, 2), (40, 1) ], 512 ).split_records( 1024 ), {} )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Tests of the planning of overlapping copy targets on a small synthetic image.
+
+Every case runs tscopy.py on the image like the end-to-end benchmark does and
+checks the files copied and the errors logged.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.join( os.path.dirname( os.path.abspath( __file__ )), '..' )
+sys.path.insert( 0, os.path.join( ROOT, 'bench' ))
+import ntfs_image
+
+TSCOPY = os.path.join( ROOT, 'tscopy.py' )
+USERS = 4
+
+class OverlappingTargetsTest( unittest.TestCase ):
+    @classmethod
+    def setUpClass( cls ):
+        cls.workdir = tempfile.mkdtemp( prefix='tscopy_test_' )
+        cls.image = os.path.join( cls.workdir, 'targets.img' )
+        builder = ntfs_image.NTFSImageBuilder( seed=1 )
+        for user in range( USERS ):
+            builder.add_file( 'users\\user%03d\\ntuser.dat' % user, 'hive of user %d\r\n' % user * 100 )
+            builder.add_file( 'users\\user%03d\\notes.txt' % user, 'notes %d' % user )
+        builder.build( cls.image )
+
+    @classmethod
+    def tearDownClass( cls ):
+        shutil.rmtree( cls.workdir, ignore_errors=True )
+
+    # Returns (the copied files relative to the output directory, the error lines)
+    def run_tscopy( self, *args ):
+        outdir = tempfile.mkdtemp( dir=self.workdir )
+        cmd = [ sys.executable, TSCOPY, '--image', self.image, '-o', outdir, '-i' ] + list( args )
+        proc = subprocess.Popen( cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT )
+        output = proc.communicate()[0]
+        self.assertEqual( proc.returncode, 0, output )
+        files = []
+        for root, dirs, names in os.walk( outdir ):
+            files.extend( os.path.relpath( os.path.join( root, name ), outdir ).replace( os.sep, '/' ) for name in names )
+        errors = [ line for line in output.splitlines() if ' - ERROR - ' in line ]
+        return sorted( files ), errors
+
+    def test_plain_path_under_wildcard( self ):
+        files, errors = self.run_tscopy( '-f', 'c:\\users\\*\\ntuser.dat,c:\\users\\user001\\ntuser.dat' )
+        self.assertEqual( errors, [] )
+        self.assertEqual( files, [ 'users/user%03d/ntuser.dat' % user for user in range( USERS ) ] )
+
+    def test_plain_path_under_recursive_directory( self ):
+        files, errors = self.run_tscopy( '-r', '-f', 'c:\\users,c:\\users\\user002\\notes.txt' )
+        self.assertEqual( errors, [] )
+        self.assertEqual( len(files), 2 * USERS )
+
+    def test_profile_overlap( self ):
+        profile = os.path.join( self.workdir, 'profile.json' )
+        with open( profile, 'wb' ) as fd:
+            json.dump( { 'targets': [ { 'path': 'C:\\Users\\%user%\\', 'file_mask': 'ntuser.dat' },
+                                      'c:\\users\\user003\\ntuser.dat' ] }, fd )
+        files, errors = self.run_tscopy( '--targets', profile )
+        self.assertEqual( errors, [] )
+        self.assertEqual( files, [ 'users/user%03d/ntuser.dat' % user for user in range( USERS ) ] )
+
+    def test_missing_plain_path( self ):
+        files, errors = self.run_tscopy( '-f', 'c:\\users\\*\\ntuser.dat,c:\\users\\nobody\\ntuser.dat' )
+        self.assertEqual( len(errors), 1 )
+        self.assertTrue( 'File Not Found' in errors[0] )
+        self.assertEqual( len(files), USERS )
+
+if __name__ == '__main__':
+    unittest.main()
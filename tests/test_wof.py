@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Tests of the WOF reparse point, chunk table and chunk writer.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import struct
+import unittest
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TScopy'))
+import WOF
+from test_xpress import ABC_CHUNK
+
+def reparse_point( algorithm, provider=WOF.WOF_PROVIDER_FILE ):
+    return struct.pack( '<IHHIIIII', WOF.IO_REPARSE_TAG_WOF, 20, 0, 1, provider, 1, algorithm, 0 )
+
+class WOFTest( unittest.TestCase ):
+    def test_reparse_algorithm( self ):
+        self.assertEqual( WOF.reparse_algorithm( reparse_point( WOF.ALGORITHM_LZX )), WOF.ALGORITHM_LZX )
+        self.assertEqual( WOF.reparse_algorithm( reparse_point( WOF.ALGORITHM_LZX, provider=1 )), None )
+        self.assertEqual( WOF.reparse_algorithm( reparse_point( 0 )[:16] ), None )
+        self.assertRaises( Exception, WOF.reparse_algorithm, reparse_point( 7 ))
+
+    def test_table_size( self ):
+        self.assertEqual( WOF.table_size( 0x1000, WOF.ALGORITHM_XPRESS4K ), 0 )
+        self.assertEqual( WOF.table_size( 0x1001, WOF.ALGORITHM_XPRESS4K ), 4 )
+        self.assertEqual( WOF.table_size( 0x20000, WOF.ALGORITHM_LZX ), 12 )
+        self.assertEqual( WOF.table_size( 0xffffffff, WOF.ALGORITHM_LZX ), ( 0x100000000 // 0x8000 - 1 ) * 4 )
+        self.assertEqual( WOF.table_size( 0x100000000, WOF.ALGORITHM_LZX ), ( 0x100000000 // 0x8000 - 1 ) * 8 )
+
+    # Offsets are relative to the end of the table, the last chunk ends with the stream
+    def test_chunk_table( self ):
+        table = struct.pack( '<II', 0x1000, 0x1000 + len(ABC_CHUNK) )
+        data_size = len(table) + 0x1000 + len(ABC_CHUNK) + 0x20
+        chunks = WOF.chunk_table( table, 0x2000 + 300, WOF.ALGORITHM_XPRESS4K, data_size )
+        self.assertEqual( chunks, [ (8, 0x1000, 0x1000), (8 + 0x1000, len(ABC_CHUNK), 0x1000),
+                                    (8 + 0x1000 + len(ABC_CHUNK), 0x20, 300) ] )
+
+    def test_chunk_table_large_file( self ):
+        size = 0x100000000 + 0x8000
+        table = struct.pack( '<%dQ' % ( size // 0x8000 - 1 ), *[ ( n + 1 ) * 100 for n in xrange( size // 0x8000 - 1 ) ] )
+        chunks = WOF.chunk_table( table, size, WOF.ALGORITHM_LZX, len(table) + ( size // 0x8000 ) * 100 )
+        self.assertEqual( len(chunks), size // 0x8000 )
+        self.assertEqual( chunks[-1], (len(table) + ( size // 0x8000 - 1 ) * 100, 100, 0x8000) )
+
+    def test_invalid_chunk_table( self ):
+        self.assertRaises( Exception, WOF.chunk_table, struct.pack( '<I', 0x1000 )[:2], 0x2000, WOF.ALGORITHM_XPRESS4K, 0x2004 )
+        self.assertRaises( Exception, WOF.chunk_table, struct.pack( '<I', 0x3000 ), 0x2000, WOF.ALGORITHM_XPRESS4K, 0x2004 )
+
+    # A chunk as large as its uncompressed size is stored as is
+    def test_chunk_writer( self ):
+        raw = ''.join( chr( n % 251 ) for n in xrange( 0x1000 ))
+        fd = StringIO()
+        writer = WOF.ChunkWriter( fd, WOF.ALGORITHM_XPRESS4K, None )
+        writer.write( raw, 0x1000 )
+        writer.write( ABC_CHUNK, 300 )
+        writer.close()
+        self.assertEqual( fd.getvalue(), raw + 'abc' * 100 )
+
+    # More than WOF_TASK_SIZE bytes are written in order across several batches
+    def test_chunk_writer_batches( self ):
+        fd = StringIO()
+        writer = WOF.ChunkWriter( fd, WOF.ALGORITHM_XPRESS4K, None )
+        count = WOF.WOF_TASK_SIZE // 300 + 10
+        for n in xrange( count ):
+            writer.write( ABC_CHUNK, 300 )
+        self.assertTrue( len(fd.getvalue()) > 0 )
+        writer.close()
+        self.assertEqual( fd.getvalue(), 'abc' * 100 * count )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Tests of the XPRESS Huffman decompression of WOF XPRESS4K, 8K and 16K chunks.
+
+The compressed vectors are the LZ77+Huffman examples of MS-XCA 3.2, as produced by
+Windows, taken from the libfwnt test suite.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import binascii
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'TScopy'))
+import XPRESS
+
+# abcdefghijklmnopqrstuvwxyz, literals only
+ALPHABET_CHUNK = binascii.unhexlify( ''.join( """
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000505555555555555555555545440400000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000000000000000000004000000000000000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+00000000d8523ed794115be9195ff9d67cdf8d0400000000
+""".split() ))
+
+# abc repeated 100 times, three literals and one overlapping match
+ABC_CHUNK = binascii.unhexlify( ''.join( """
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000302300000000000000000000000000000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000000000000000000002000000000000000000000000000020
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+000000000000000000000000000000000000000000000000000000000000000000000000
+00000000a8dc0000ff2601
+""".split() ))
+
+class XPRESSTest( unittest.TestCase ):
+    def test_literals( self ):
+        self.assertEqual( XPRESS._decompress_python( ALPHABET_CHUNK, 26 ), 'abcdefghijklmnopqrstuvwxyz' )
+
+    def test_overlapping_match( self ):
+        self.assertEqual( XPRESS._decompress_python( ABC_CHUNK, 300 ), 'abc' * 100 )
+
+    # The output ends at size even when the bitstream goes on
+    def test_size( self ):
+        self.assertEqual( XPRESS._decompress_python( ABC_CHUNK, 10 ), 'abcabcabca' )
+
+    def test_decompress( self ):
+        self.assertEqual( XPRESS.decompress( ABC_CHUNK, 300 ), 'abc' * 100 )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,9 +13,12 @@ import os
 import argparse
 import traceback
 import time
+import json
 import ctypes
+import multiprocessing
 
 from TScopy.tscopy import TScopy
+from TScopy.Filter import FileFilter, parse_size, parse_age, parse_date
 
 log = logging.getLogger("tscopy")
 log.setLevel(logging.INFO)
@@ -33,6 +36,21 @@ def check_administrative_rights( ):
         return False
     return True
 
+def parseFilter( args ):
+    modified_after = None
+    if args.modified_within:
+        modified_after = time.time() - parse_age( args.modified_within )
+    if args.modified_after and ( modified_after == None or parse_date( args.modified_after ) > modified_after ):
+        modified_after = parse_date( args.modified_after )
+    filters = { 'extensions': args.ext.split(',') if args.ext else None,
+                'modified_after': modified_after,
+                'modified_before': parse_date( args.modified_before ) if args.modified_before else None,
+                'min_size': parse_size( args.min_size ) if args.min_size else None,
+                'max_size': parse_size( args.max_size ) if args.max_size else None }
+    if len( [ x for x in filters.values() if not x == None ] ) == 0:
+        return None
+    return FileFilter( **filters )
+
 def parseArgs():
     parser = argparse.ArgumentParser( description="Copy protected files by parsing the MFT. Must be run with Administrator privileges", usage="""\
 
@@ -44,23 +62,76 @@ def parseArgs():
         Description: Copies all files and subdirectories in the config directory.  
     TScopy_x64.exe -r -o c:\\test -f c:\\users\\*\\ntuser*,c:\\Windows\\system32\\config 
         Description: Uses Wildcards and listings to copy any file beginning with ntuser under users accounts and recursively copies the registry hives.
+    python tscopy.py --image /cases/disk.raw -o /cases/out -f c:\\Windows\\system32\\config\\SYSTEM
+        Description: Copies the SYSTEM hive out of the first NTFS partition of a raw disk image.
+    TScopy_x64.exe -o c:\\test --targets triage.json
+        Description: Copies every target of the collection profile, each file once.
+    python tscopy.py --image /cases/disk.raw -o /cases/out --timeline /cases/out/body.txt
+        Description: Writes the mactime bodyfile of the volume without copying any file.
+    TScopy_x64.exe -r -o c:\\test -f c:\\users --ext evtx,pf,lnk --modified_within 7d --max_size 500MB
+        Description: Copies the event logs, prefetch files and shortcuts under the user profiles modified in the last 7 days and under 500MB.
     """)
-    parser.add_argument('-f', '--file', help="Full path of the file or directory to be copied. Filenames can be grouped in a comma ',' seperated list. Wildcard '*' is accepted." )   
+    parser.add_argument('-f', '--file', help="Full path of the file or directory to be copied. Filenames can be grouped in a comma ',' seperated list. Wildcards '*', '?', '[...]' and '**' (any number of directories) are accepted." )   
+    parser.add_argument('--targets', help="JSON or YAML collection profile, such as a KAPE .tkape file, listing the files to copy. Copied with the --file targets. YAML needs the PyYAML module." )
     parser.add_argument('-o', '--outputdir', help="Directory to copy files too. Copy will keep paths" )   
     parser.add_argument('-i', '--ignore_saved_ref_nums', action='store_true', help="Script stores the Reference numbers and path info to speed up internal run. This option will ignore and not save the stored MFT reference numbers and path")
     parser.add_argument('-r', '--recursive', action='store_true', help="Recursively copies directory. Note this only works with directories.")
+    parser.add_argument('--image', help="Raw disk or volume image (or block device) to copy from instead of the live volumes. Required on non Windows hosts.")
+    parser.add_argument('--image_offset', type=int, help="Byte offset of the NTFS volume in the image. By default the boot sector and the MBR/GPT partition table are searched.")
+    parser.add_argument('--scan', action='store_true', help="Read the entire $MFT sequentially once and resolve every path and wildcard from memory. Faster when copying many files.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of files extracted at the same time. Each worker keeps its own reads in flight. Default 1")
+    parser.add_argument('--disk_order', action='store_true', help="Resolve every requested file first and then read all of their data in volume order. Reduces seeking on spinning disks and network images.")
+    parser.add_argument('--runlist', action='store_true', help="Save the data runs of every copied stream next to it as <file>.runlist.json. Sparse runs are copied as holes.")
+    parser.add_argument('--manifest', help="Append the MD5, SHA-1 and SHA-256 of every copied stream to this JSON lines file. The hashes are computed while the data is copied.")
+    parser.add_argument('--archive', help="Write the copied files into this .tar or .zip file instead of a directory tree under the output directory. Paths and ADS names are kept.")
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], help="Compress the copied files, saved as <file>.gz or <file>.zst, on a thread pool while the next data is read. With --archive the tar file is compressed as a whole, out.tar is written as out.tar.gz or out.tar.zst, and zip members are deflated. zstd needs the zstandard module.")
+    parser.add_argument('--compress_workers', type=int, help="Number of compression threads. Default one per CPU")
+    parser.add_argument('--wof_workers', type=int, help="Number of processes decompressing WOF (CompactOS) compressed files. Default one per CPU")
+    parser.add_argument('--dir_cache', type=int, default=1024, help="Number of parsed directory listings kept in memory and shared by the lookups, wildcards and directory copies. 0 disables the cache. Default 1024")
+    parser.add_argument('--timeline', help="Write the $STANDARD_INFORMATION and $FILE_NAME timestamps of every file of the volume, deleted ones included, to this file. Streams the $MFT, memory use only grows with the number of directories." )
+    parser.add_argument('--timeline_format', choices=['bodyfile', 'csv'], help="Format of the --timeline file, a mactime bodyfile or CSV. Default csv for a .csv file, bodyfile otherwise")
+    parser.add_argument('--timeline_volume', default='c:', help="Drive of the --timeline volume. Images have one volume. Default c:")
+    parser.add_argument('--ext', help="Only copy the files with these extensions, a comma ',' seperated list such as evtx,pf,lnk")
+    parser.add_argument('--modified_within', help="Only copy the files modified in this last period, such as 7d, 12h or 30m. Days without a unit")
+    parser.add_argument('--modified_after', help="Only copy the files modified after this UTC date, YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS")
+    parser.add_argument('--modified_before', help="Only copy the files modified before this UTC date, YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS")
+    parser.add_argument('--min_size', help="Only copy the files of at least this size, such as 4k or 10MB")
+    parser.add_argument('--max_size', help="Only copy the files of at most this size, such as 500MB or 2G. The filters are checked on the MFT record, no data of the other files is read")
     parser.add_argument('--debug', action='store_true', help=argparse.SUPPRESS)
     
     args = parser.parse_args()
     if args.debug:
         log.setLevel(logging.DEBUG)
 
-    if args.file:
+    if args.file or args.targets or args.timeline:
         process_files = []
-        for name in args.file.split(','):
-            process_files.append( name ) 
+        if args.file:
+            for name in args.file.split(','):
+                process_files.append( name ) 
     else:
-        log.error("\nError select --file\n\n")
+        log.error("\nError select --file, --targets or --timeline\n\n")
+        parser.print_help()
+        sys.exit(1)
+
+    if args.targets and not os.path.isfile( args.targets ):
+        log.error("Error collection profile (%s) not found\n\n" % args.targets )
+        parser.print_help()
+        sys.exit(1)
+
+    if args.image and not os.path.exists( args.image ):
+        log.error("Error image (%s) not found\n\n" % args.image )
+        parser.print_help()
+        sys.exit(1)
+
+    if args.compress == 'zstd' and args.archive and args.archive.lower().endswith('.zip'):
+        log.error("Error zip archives can only be compressed with gzip\n\n" )
+        parser.print_help()
+        sys.exit(1)
+
+    try:
+        file_filter = parseFilter( args )
+    except Exception as e:
+        log.error("Error invalid filter %s\n\n" % e.args[-1] )
         parser.print_help()
         sys.exit(1)
 
@@ -75,35 +146,76 @@ def parseArgs():
             sys.exit(1)
         args.outputdir = tmp_dir
     return { 'files': process_files,
+               'targets': args.targets,
                'outputbasedir': args.outputdir,
                'debug': args.debug,
                'recursive': args.recursive,
-               'ignore_table': args.ignore_saved_ref_nums
+               'ignore_table': args.ignore_saved_ref_nums,
+               'image': args.image,
+               'image_offset': args.image_offset,
+               'bulk_scan': args.scan,
+               'workers': args.workers,
+               'disk_order': args.disk_order,
+               'runlist_sidecar': args.runlist,
+               'manifest': args.manifest,
+               'archive': args.archive,
+               'compression': args.compress,
+               'compress_workers': args.compress_workers,
+               'wof_workers': args.wof_workers,
+               'dir_cache_size': args.dir_cache,
+               'timeline': args.timeline,
+               'timeline_format': args.timeline_format,
+               'timeline_volume': args.timeline_volume,
+               'filter': file_filter
              }
 
 if __name__ == '__main__':
+    # The WOF decompression pool starts processes, needed by the frozen executable
+    multiprocessing.freeze_support()
     start = time.time()    
     args = parseArgs()
-    if check_administrative_rights( )  == False:
+    if args['image'] == None and check_administrative_rights( )  == False:
         sys.exit(1)
 
     config = {
                'pickledir': args['outputbasedir'],
                'debug': args['debug'],
                'logger': log,
-               'ignore_table': args['ignore_table']}
+               'ignore_table': args['ignore_table'],
+               'image': args['image'],
+               'image_offset': args['image_offset'],
+               'bulk_scan': args['bulk_scan'],
+               'workers': args['workers'],
+               'disk_order': args['disk_order'],
+               'runlist_sidecar': args['runlist_sidecar'],
+               'manifest': args['manifest'],
+               'archive': args['archive'],
+               'compression': args['compression'],
+               'compress_workers': args['compress_workers'],
+               'wof_workers': args['wof_workers'],
+               'dir_cache_size': args['dir_cache_size'],
+               'filter': args['filter']}
                                                                                 
+    tscopy = None
     try:                                                                        
         tscopy = TScopy()
         tscopy.setConfiguration( config )
         dst_path = args['outputbasedir']
-        for src in args['files']:
-            try:
-                tscopy.copy( src, dst_path, bRecursive=args['recursive'])
-            except:
-                log.error( traceback.format_exc() ) 
+        try:
+            if not args['timeline'] == None:
+                tscopy.timeline( args['timeline_volume'], args['timeline'], fmt=args['timeline_format'] )
+            if not args['targets'] == None:
+                tscopy.copyProfile( args['targets'], dst_path, bRecursive=args['recursive'], extra=args['files'] )
+            elif len( args['files'] ) > 0:
+                tscopy.copy( args['files'], dst_path, bRecursive=args['recursive'])
+        except:
+            log.error( traceback.format_exc() ) 
+        finally:
+            tscopy.close()
     except:
         log.error( traceback.format_exc() ) 
 
     log.info("Job Took %r seconds" % (time.time()-start))
+    if not tscopy == None and tscopy.isConfigured() == True:
+        log.info("Performance summary %s" % json.dumps( tscopy.getStats(), sort_keys=True ))
 